@@ -0,0 +1,19 @@
+from setuptools import find_packages, setup
+
+
+def read_requirements(path='requirements.txt'):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+setup(
+    name='kfc-bot',
+    version='1.0.0',
+    packages=find_packages(include=['src', 'src.*']),
+    install_requires=read_requirements(),
+    extras_require={
+        # REPRINT_LEDGER_BACKEND=redis: límite de reimpresiones compartido entre instancias
+        'redis': ['redis>=4.5'],
+    },
+    python_requires='>=3.9',
+)
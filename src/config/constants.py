@@ -8,6 +8,14 @@ DOCUMENT_TYPES = {
     'comanda': 'C'
 }
 
+# Valor exacto de imp_varchar1 en Canal_Movimiento por tipo de documento
+# (la búsqueda con LIKE '%valor%' queda como respaldo si no coincide exactamente)
+CANAL_MOVIMIENTO_TIPOS = {
+    'factura': 'factura',
+    'nota_credito': 'nota_credito',
+    'comanda': 'orden'
+}
+
 # Límites de re-impresión
 REPRINT_LIMITS = {
     'factura': 1,
@@ -15,6 +23,27 @@ REPRINT_LIMITS = {
     'comanda': 2
 }
 
+# Estados finales de una orden: ya no cambian, su consulta se cachea por más tiempo
+TERMINAL_ORDER_STATES = {
+    'ENTREGADO',
+    'ENTREGADA',
+    'FINALIZADO',
+    'COMPLETADO',
+    'ANULADO',
+    'ANULADA',
+    'CANCELADO',
+    'CANCELADA',
+    'RECHAZADO',
+    'DEVUELTO'
+}
+
+# Formato de códigos de orden por origen: los de kiosko son solo dígitos,
+# los de app (delivery/pickup) llevan letras o guiones
+ORDER_CODE_PATTERNS = {
+    'kiosko': r'^\d+$',
+    'app': r'^[A-Za-z0-9-]*[A-Za-z-][A-Za-z0-9-]*$'
+}
+
 # URL patterns
 URL_PATTERNS = {
     'factura': '/pos/facturacion/impresion/impresion_factura.php?cfac_id={cfac_id}&tipo_comprobante=F&',
@@ -33,5 +62,6 @@ USER_STATES = {
     'GET_CFAC_ID': 'get_cfac_id',  # ← Asegúrate de que esta constante exista
     'SUBREPRINT_MENU': 'subreprint_menu',
     'GET_REPRINT_ID': 'get_reprint_id',
-    'GET_REPRINT_REASON': 'get_reprint_reason'
+    'GET_REPRINT_REASON': 'get_reprint_reason',
+    'SEARCH_ALL_STORES': 'search_all_stores'
 }
\ No newline at end of file
@@ -9,6 +9,44 @@ class DatabaseConfig:
     password: str = os.getenv('DB_PASSWORD', 'T3rc3rn1*m4x')
     driver: str = os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
     timeout: int = int(os.getenv('DB_TIMEOUT', '15'))  # Reducido a 15s
+    # Verificación TCP previa al login ODBC (puerto de SQL Server y espera máxima)
+    port: int = int(os.getenv('DB_PORT', '1433'))
+    tcp_check_timeout: float = float(os.getenv('DB_TCP_CHECK_TIMEOUT', '0.8'))
+    # Pool de conexiones por tienda
+    pool_max_size: int = int(os.getenv('DB_POOL_MAX_SIZE', '4'))
+    pool_idle_timeout: int = int(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))  # 5min ociosa -> se cierra
+    pool_wait_timeout: int = int(os.getenv('DB_POOL_WAIT_TIMEOUT', '10'))
+    pool_health_check_after: int = int(os.getenv('DB_POOL_HEALTH_CHECK_AFTER', '30'))
+    # Ejecución asíncrona: hilos dedicados a BD y consultas simultáneas por tienda
+    executor_workers: int = int(os.getenv('DB_EXECUTOR_WORKERS', '16'))
+    store_concurrency: int = int(os.getenv('DB_STORE_CONCURRENCY', '4'))
+    # Reintentos: solo errores transitorios, backoff con jitter y plazo total por llamada
+    retry_base_delay: float = float(os.getenv('DB_RETRY_BASE_DELAY', '0.5'))
+    retry_max_delay: float = float(os.getenv('DB_RETRY_MAX_DELAY', '4'))
+    query_deadline: float = float(os.getenv('DB_QUERY_DEADLINE', '25'))
+    # Circuito por tienda: fallos de conexión seguidos para abrirlo y espera antes del sondeo
+    breaker_failure_threshold: int = int(os.getenv('DB_BREAKER_FAILURE_THRESHOLD', '3'))
+    breaker_reset_timeout: float = float(os.getenv('DB_BREAKER_RESET_TIMEOUT', '30'))
+    breaker_max_reset_timeout: float = float(os.getenv('DB_BREAKER_MAX_RESET_TIMEOUT', '300'))
+    # Monitor de tiendas en segundo plano: cada cuánto sondea, vigencia del resultado,
+    # sondeos simultáneos y cuánto tiempo sigue sondeando una tienda tras su último uso
+    health_interval: float = float(os.getenv('DB_HEALTH_INTERVAL', '60'))
+    health_max_age: float = float(os.getenv('DB_HEALTH_MAX_AGE', '90'))
+    health_concurrency: int = int(os.getenv('DB_HEALTH_CONCURRENCY', '8'))
+    health_recent_window: float = float(os.getenv('DB_HEALTH_RECENT_WINDOW', '3600'))
+    # Estado de varias órdenes a la vez: máximo de códigos por mensaje y por consulta IN
+    # (SQL Server admite ~2100 parámetros; cada código se pasa una vez por tabla)
+    status_batch_max_codes: int = int(os.getenv('DB_STATUS_BATCH_MAX_CODES', '100'))
+    status_batch_chunk: int = int(os.getenv('DB_STATUS_BATCH_CHUNK', '500'))
+    # Con más filas que esto la respuesta se envía como archivo en vez de tabla en el chat
+    status_batch_inline_rows: int = int(os.getenv('DB_STATUS_BATCH_INLINE_ROWS', '15'))
+    # Búsqueda de una orden en todas las tiendas: consultas simultáneas, plazo por tienda
+    # y cada cuántos segundos se actualiza el mensaje de progreso
+    search_concurrency: int = int(os.getenv('DB_SEARCH_CONCURRENCY', '8'))
+    search_store_deadline: float = float(os.getenv('DB_SEARCH_STORE_DEADLINE', '6'))
+    search_progress_interval: float = float(os.getenv('DB_SEARCH_PROGRESS_INTERVAL', '2'))
+    # Auditoría: permitir la búsqueda por subcadena (recorre toda la tabla) si exacta y prefijo no encuentran nada
+    audit_substring_fallback: bool = os.getenv('DB_AUDIT_SUBSTRING_FALLBACK', 'false').lower() == 'true'
 
 
 @dataclass
@@ -37,6 +75,32 @@ class LogConfig:
 class PrintConfig:
     base_url: str = os.getenv('PRINT_BASE_URL', 'http://{server_name}:880')
     api_url: str = os.getenv('PRINT_API_URL', 'http://192.168.101.96:5000/api/ImpresionTickets/Impresion')
+    # Cliente HTTP compartido: plazo total por petición, conexión, conexiones simultáneas y keep-alive
+    api_timeout: float = float(os.getenv('PRINT_API_TIMEOUT', '30'))
+    api_connect_timeout: float = float(os.getenv('PRINT_API_CONNECT_TIMEOUT', '5'))
+    api_max_connections: int = int(os.getenv('PRINT_API_MAX_CONNECTIONS', '10'))
+    api_keepalive: float = float(os.getenv('PRINT_API_KEEPALIVE', '30'))
+    # Cadena de reimpresión: segundos sin respuesta antes de lanzar la siguiente estrategia en paralelo
+    # (0 = estrictamente en secuencia) y cuántas estrategias pueden correr a la vez
+    hedge_delay: float = float(os.getenv('PRINT_HEDGE_DELAY', '5'))
+    max_parallel_strategies: int = int(os.getenv('PRINT_MAX_PARALLEL_STRATEGIES', '2'))
+    # Cola durable de trabajos de impresión (SQLite): workers, reintentos con backoff y retención
+    queue_db: str = os.getenv('PRINT_QUEUE_DB', 'C:/ChatBot/Cola/impresiones.db')
+    queue_workers: int = int(os.getenv('PRINT_QUEUE_WORKERS', '4'))
+    queue_max_attempts: int = int(os.getenv('PRINT_QUEUE_MAX_ATTEMPTS', '3'))
+    queue_retry_base_delay: float = float(os.getenv('PRINT_QUEUE_RETRY_BASE_DELAY', '15'))
+    queue_retry_max_delay: float = float(os.getenv('PRINT_QUEUE_RETRY_MAX_DELAY', '300'))
+    queue_poll_interval: float = float(os.getenv('PRINT_QUEUE_POLL_INTERVAL', '5'))
+    queue_retention_days: float = float(os.getenv('PRINT_QUEUE_RETENTION_DAYS', '7'))
+    # Registro persistente de reimpresiones por documento (límite max_reprints): 'sqlite' local
+    # o 'redis' para compartirlo entre instancias; los contadores vencen tras ledger_ttl_days
+    ledger_backend: str = os.getenv('REPRINT_LEDGER_BACKEND', 'sqlite')
+    ledger_db: str = os.getenv('REPRINT_LEDGER_DB', 'C:/ChatBot/Cola/reimpresiones.db')
+    ledger_redis_url: str = os.getenv('REPRINT_LEDGER_REDIS_URL', 'redis://localhost:6379/0')
+    ledger_ttl_days: float = float(os.getenv('REPRINT_LEDGER_TTL_DAYS', '30'))
+    ledger_compact_interval: float = float(os.getenv('REPRINT_LEDGER_COMPACT_INTERVAL', '3600'))
+    # Con Redis caído las reimpresiones se rechazan; cada cuánto se intenta reconectar
+    ledger_reconnect_interval: float = float(os.getenv('REPRINT_LEDGER_RECONNECT_INTERVAL', '5'))
     max_reprints: dict = None
 
     def __post_init__(self):
@@ -48,13 +112,53 @@ class PrintConfig:
             }
 
 
+@dataclass
+class RenderConfig:
+    # Pool de navegadores headless para imágenes de factura/comanda
+    browser_pool_size: int = int(os.getenv('RENDER_BROWSER_POOL_SIZE', '2'))
+    browser_max_renders: int = int(os.getenv('RENDER_BROWSER_MAX_RENDERS', '50'))
+    browser_lease_timeout: int = int(os.getenv('RENDER_BROWSER_LEASE_TIMEOUT', '60'))
+    # Motor de imágenes: 'auto' (ticket con Pillow y Selenium como respaldo), 'ticket' o 'selenium'
+    engine: str = os.getenv('RENDER_ENGINE', 'auto')
+    ticket_paper_mm: int = int(os.getenv('RENDER_TICKET_PAPER_MM', '80'))  # 58 u 80
+    # Espera de renderizado: 'readiness' (señales de la página) o 'fixed' (3s fijos, comportamiento anterior)
+    wait_mode: str = os.getenv('RENDER_WAIT_MODE', 'readiness')
+    wait_max: float = float(os.getenv('RENDER_WAIT_MAX', '8'))
+    wait_poll_interval: float = float(os.getenv('RENDER_WAIT_POLL_INTERVAL', '0.1'))
+    wait_stable_polls: int = int(os.getenv('RENDER_WAIT_STABLE_POLLS', '2'))
+    # Fila de renderizado: simultáneos en total, por tienda y máximo en espera
+    max_concurrent: int = int(os.getenv('RENDER_MAX_CONCURRENT', '4'))
+    max_concurrent_per_store: int = int(os.getenv('RENDER_MAX_CONCURRENT_PER_STORE', '2'))
+    max_queue: int = int(os.getenv('RENDER_MAX_QUEUE', '20'))
+    # Caché de imágenes generadas: LRU en memoria + disco con límite de tamaño
+    cache_enabled: bool = os.getenv('RENDER_CACHE_ENABLED', 'true').lower() == 'true'
+    cache_dir: str = os.getenv('RENDER_CACHE_DIR', 'C:/ChatBot/Cache/Imagenes')
+    cache_memory_items: int = int(os.getenv('RENDER_CACHE_MEMORY_ITEMS', '64'))
+    cache_disk_max_mb: int = int(os.getenv('RENDER_CACHE_DISK_MAX_MB', '200'))
+    cache_ttl: int = int(os.getenv('RENDER_CACHE_TTL', '86400'))  # 24h
+
+
+@dataclass
+class QueryCacheConfig:
+    # Caché de resultados de consultas a tiendas (segundos por tipo de consulta)
+    max_items: int = int(os.getenv('QUERY_CACHE_MAX_ITEMS', '2000'))
+    status_ttl_active: int = int(os.getenv('QUERY_CACHE_STATUS_TTL_ACTIVE', '10'))
+    status_ttl_terminal: int = int(os.getenv('QUERY_CACHE_STATUS_TTL_TERMINAL', '600'))
+    audit_ttl_active: int = int(os.getenv('QUERY_CACHE_AUDIT_TTL_ACTIVE', '15'))
+    audit_ttl_terminal: int = int(os.getenv('QUERY_CACHE_AUDIT_TTL_TERMINAL', '600'))
+    not_found_ttl: int = int(os.getenv('QUERY_CACHE_NOT_FOUND_TTL', '5'))
+    associated_code_ttl: int = int(os.getenv('QUERY_CACHE_ASSOCIATED_CODE_TTL', '3600'))
+    # Identidad de documentos (cfac_id -> odp_id/codigo_app): no cambia una vez facturado
+    document_ttl: int = int(os.getenv('QUERY_CACHE_DOCUMENT_TTL', '3600'))
+    document_max_items: int = int(os.getenv('QUERY_CACHE_DOCUMENT_MAX_ITEMS', '5000'))
+
+
 @dataclass
 class ServerConfig:
-    # Configuración de servidores por rango de tiendas
-    server_mapping = {
-        'K1': '192.168.101.27',  # K100, K101, etc. - Servidor de pruebas
-        'default': '10.101.{store_num}.20'  # Para otras tiendas
-    }
+    # Directorio de tiendas (servidor, IP, base de datos) y caché de DNS de los nombres SRV_
+    registry_file: str = os.getenv('STORE_REGISTRY_FILE', os.path.join(os.path.dirname(__file__), 'stores.json'))
+    dns_ttl: float = float(os.getenv('STORE_DNS_TTL', '300'))
+    dns_negative_ttl: float = float(os.getenv('STORE_DNS_NEGATIVE_TTL', '30'))
 
 
 class Settings:
@@ -64,6 +168,8 @@ class Settings:
         self.logging = LogConfig()
         self.print = PrintConfig()
         self.server = ServerConfig()
+        self.render = RenderConfig()
+        self.query_cache = QueryCacheConfig()
 
 
 settings = Settings()
\ No newline at end of file
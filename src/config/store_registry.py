@@ -0,0 +1,156 @@
+import ipaddress
+import json
+import re
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.utils.logger import logger
+from src.utils.ttl_cache import TTLCache
+
+
+@dataclass(frozen=True)
+class StoreAddress:
+    code: str
+    server: str  # nombre del servidor SQL (SRV_K001)
+    ip: str  # IP de la tienda para las URLs http://{ip}:880
+    database: str  # MAXPOINT_K001
+
+
+class StoreRegistry:
+    """
+    Directorio único de tiendas: servidor, IP y base de datos por código.
+    El archivo se lee una sola vez; las tiendas sin entrada propia se derivan de las plantillas
+    'defaults' y se memorizan en una caché LRU acotada (get() recibe texto escrito en el chat,
+    el índice de entradas explícitas no debe crecer con él). Los nombres SRV_ se resuelven
+    por DNS con caché para no pagar la resolución en cada conexión.
+    """
+
+    # Direcciones derivadas de las plantillas que se recuerdan (LRU) y por cuánto tiempo
+    _DERIVED_MAX_ITEMS = 1024
+    _DERIVED_TTL = 86400
+
+    def __init__(self, path: str, dns_ttl: float, dns_negative_ttl: float):
+        self.path = path
+        self.dns_ttl = dns_ttl
+        self.dns_negative_ttl = dns_negative_ttl
+
+        self._defaults = {'server': 'SRV_{code}', 'ip': '10.101.{number}.20', 'database': 'MAXPOINT_{code}'}
+        self._index: Dict[str, StoreAddress] = {}
+        self._derived = TTLCache(max_items=self._DERIVED_MAX_ITEMS)
+        self._search_codes: List[str] = []
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+        # server -> (ip o None si no resolvió, expira)
+        self._dns: Dict[str, Tuple[Optional[str], float]] = {}
+        self._dns_lock = threading.Lock()
+        self.stats = {'dns_hits': 0, 'dns_lookups': 0, 'dns_failures': 0}
+
+    def _load(self):
+        with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+                self._defaults.update(data.get('defaults', {}))
+                for code, entry in data.get('stores', {}).items():
+                    self._index[code.upper()] = self._build(code.upper(), entry)
+                self._search_codes = self._expand_ranges(data.get('search_ranges', []))
+                logger.info(f"🏬 Directorio de tiendas cargado: {len(self._index)} entradas explícitas ({self.path})")
+            except FileNotFoundError:
+                logger.warning(f"⚠️ No existe {self.path}; se usan solo las plantillas por defecto")
+            except (ValueError, OSError) as e:
+                logger.error(f"❌ Error leyendo el directorio de tiendas {self.path}: {str(e)}")
+            self._loaded = True
+
+    def _build(self, code: str, entry: Optional[dict] = None) -> StoreAddress:
+        digits = ''.join(filter(str.isdigit, code))
+        fields = {'code': code, 'number': int(digits) if digits else 0}
+        templates = dict(self._defaults, **(entry or {}))
+        return StoreAddress(
+            code=code,
+            server=templates['server'].format(**fields),
+            ip=templates['ip'].format(**fields),
+            database=templates['database'].format(**fields)
+        )
+
+    @staticmethod
+    def _expand_ranges(ranges: list) -> List[str]:
+        """[["K001", "K199"], ...] -> K001..K199 (mismo prefijo y ancho que el código inicial)"""
+        codes = []
+        for first, last in ranges:
+            prefix, start = re.match(r'^([A-Za-z]*)(\d+)$', first.strip().upper()).groups()
+            end = int(re.match(r'^[A-Za-z]*(\d+)$', last.strip()).group(1))
+            codes.extend(f"{prefix}{number:0{len(start)}d}" for number in range(int(start), end + 1))
+        return list(dict.fromkeys(codes))
+
+    def search_codes(self) -> List[str]:
+        """Tiendas a recorrer cuando no se sabe en cuál está una orden ('search_ranges' del archivo)"""
+        if not self._loaded:
+            self._load()
+        return list(self._search_codes)
+
+    def get(self, store_code: str) -> StoreAddress:
+        if not self._loaded:
+            self._load()
+
+        code = store_code.strip().upper()
+        address = self._index.get(code) or self._derived.get(code)
+        if address is None:
+            address = self._build(code)
+            self._derived.set(code, address, self._DERIVED_TTL)
+        return address
+
+    def resolve(self, store_code: str) -> Optional[str]:
+        """
+        IP del servidor SQL de la tienda (DNS en caché por dns_ttl segundos).
+        None si el nombre no resuelve; el fallo también se recuerda dns_negative_ttl segundos.
+        """
+        server = self.get(store_code).server
+        try:
+            ipaddress.ip_address(server)
+            return server
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        with self._dns_lock:
+            cached = self._dns.get(server)
+            if cached is not None and cached[1] > now:
+                self.stats['dns_hits'] += 1
+                return cached[0]
+
+        self.stats['dns_lookups'] += 1
+        try:
+            ip = socket.gethostbyname(server)
+            expires = now + self.dns_ttl
+        except OSError as e:
+            self.stats['dns_failures'] += 1
+            logger.warning(f"🔎 {server} no resuelve por DNS: {str(e)}")
+            ip, expires = None, now + self.dns_negative_ttl
+
+        with self._dns_lock:
+            self._dns[server] = (ip, expires)
+        return ip
+
+    def host(self, store_code: str) -> str:
+        """Destino para conectar: la IP resuelta o, si no resolvió, el nombre tal cual"""
+        return self.resolve(store_code) or self.get(store_code).server
+
+    def forget(self, store_code: str):
+        """Descarta la resolución en caché (p. ej. tras un fallo de red)"""
+        with self._dns_lock:
+            self._dns.pop(self.get(store_code).server, None)
+
+
+# Global store registry
+store_registry = StoreRegistry(
+    path=settings.server.registry_file,
+    dns_ttl=settings.server.dns_ttl,
+    dns_negative_ttl=settings.server.dns_negative_ttl
+)
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark de la búsqueda en Canal_Movimiento: clave exacta vs LIKE '%id%'.
+Usa una réplica local en SQLite (mismas columnas e índice) en lugar de la BD de tienda.
+
+Uso: python src/database/benchmark_print_lookup.py [filas] [búsquedas]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from src.config.constants import CANAL_MOVIMIENTO_TIPOS
+from src.utils.helpers import normalize_document_key
+
+# Mismas consultas que queries.py, sin las sugerencias propias de SQL Server (TOP, WITH(NOLOCK))
+EXACT_QUERY = """
+    SELECT imp_url, Canal_MovimientoVarchar1 FROM Canal_Movimiento
+    WHERE Canal_MovimientoVarchar3 = ? AND imp_varchar1 = ? LIMIT 1
+"""
+LIKE_QUERY = """
+    SELECT imp_url, Canal_MovimientoVarchar1 FROM Canal_Movimiento
+    WHERE Canal_MovimientoVarchar3 LIKE ? AND imp_varchar1 LIKE ? LIMIT 1
+"""
+
+
+def build_stand_in(rows: int) -> sqlite3.Connection:
+    """Crea Canal_Movimiento en memoria con el índice que tiene la tabla en tienda"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE Canal_Movimiento (
+            IDCanalMovimiento INTEGER PRIMARY KEY,
+            Canal_MovimientoVarchar1 TEXT,
+            Canal_MovimientoVarchar3 TEXT,
+            imp_varchar1 TEXT,
+            imp_url TEXT
+        )
+    """)
+    tipos = list(CANAL_MOVIMIENTO_TIPOS.values())
+    conn.executemany(
+        "INSERT INTO Canal_Movimiento VALUES (?, ?, ?, ?, ?)",
+        (
+            (i, f"DOC-{i}", f"K001F{i:09d}", tipos[i % len(tipos)], f"http://10.101.1.20:880/imp/{i}")
+            for i in range(rows)
+        )
+    )
+    conn.execute("CREATE INDEX IX_CanalMovimiento_Doc ON Canal_Movimiento (Canal_MovimientoVarchar3, imp_varchar1)")
+    conn.commit()
+    return conn
+
+
+def run(conn: sqlite3.Connection, rows: int, lookups: int):
+    tipos = list(CANAL_MOVIMIENTO_TIPOS.items())
+    samples = []
+    for _ in range(lookups):
+        i = random.randrange(rows)
+        document_type, tipo = tipos[i % len(tipos)]
+        samples.append((f" k001f{i:09d} ", document_type, tipo))
+
+    start = time.perf_counter()
+    for document_id, _, tipo in samples:
+        assert conn.execute(EXACT_QUERY, (normalize_document_key(document_id), tipo)).fetchone()
+    exact = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for document_id, _, tipo in samples:
+        assert conn.execute(LIKE_QUERY, (f"%{document_id.strip()}%", f"%{tipo}%")).fetchone()
+    like = time.perf_counter() - start
+
+    print(f"📊 {rows} filas, {lookups} búsquedas")
+    print(f"   Exacta: {exact / lookups * 1000:.3f} ms/búsqueda")
+    print(f"   LIKE:   {like / lookups * 1000:.3f} ms/búsqueda")
+    print(f"   Mejora: x{like / exact:.1f}")
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    run(build_stand_in(rows), rows, lookups)
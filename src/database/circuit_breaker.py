@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from src.database.exceptions import StoreNetworkError, StoreTimeoutError, StoreDeadlineExceededError, offline_error
+from src.utils.logger import logger
+
+
+class CircuitBreaker:
+    """
+    Circuito por tienda: closed -> open tras N fallos de conectividad seguidos.
+    Mientras está abierto las llamadas fallan al instante; pasado reset_timeout un único
+    sondeo en segundo plano (half-open) decide si se cierra o se vuelve a abrir con más espera.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, store_code: str, probe: Callable[[], Any], failure_threshold: int,
+                 reset_timeout: float, max_reset_timeout: float):
+        self.store_code = store_code
+        self._probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+
+        self.state = self.CLOSED
+        self._failures = 0
+        self._reset_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'trips': 0, 'rejected': 0, 'probes': 0}
+
+    def before_call(self):
+        """Lanza StoreOfflineError si el circuito no deja pasar llamadas"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            self.stats['rejected'] += 1
+            retry_in = self._opened_at + self._reset_timeout - time.monotonic()
+            start_probe = self.state == self.OPEN and retry_in <= 0
+            if start_probe:
+                self.state = self.HALF_OPEN
+                self.stats['probes'] += 1
+
+        if start_probe:
+            threading.Thread(target=self._run_probe, name=f'breaker-{self.store_code}', daemon=True).start()
+        raise offline_error(self.store_code, max(retry_in, 0) if not start_probe else self._reset_timeout)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self, error: Exception):
+        """Solo los fallos de conectividad cuentan; un error de SQL no dice nada de la red"""
+        if not isinstance(error, (StoreNetworkError, StoreTimeoutError)) or isinstance(error, StoreDeadlineExceededError):
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open_locked()
+                logger.error(f"📴 Circuito ABIERTO para {self.store_code} tras {self._failures} fallos de conexión")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self.stats)
+            data.update({
+                'state': self.state,
+                'failures': self._failures,
+                'retry_in': max(0.0, self._opened_at + self._reset_timeout - time.monotonic())
+                if self.state != self.CLOSED else 0.0
+            })
+        return data
+
+    def _open_locked(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.stats['trips'] += 1
+
+    def _run_probe(self):
+        try:
+            self._probe()
+        except Exception as e:
+            with self._lock:
+                # Cada sondeo fallido duplica la espera hasta el siguiente (con tope)
+                self._reset_timeout = min(self._reset_timeout * 2, self.max_reset_timeout)
+                self._open_locked()
+            logger.warning(f"📴 Sondeo a {self.store_code} falló, próximo en {self._reset_timeout:.0f}s: {str(e)}")
+            return
+
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._reset_timeout = self.base_reset_timeout
+        logger.info(f"✅ Circuito CERRADO para {self.store_code}: la tienda volvió a responder")
@@ -1,27 +1,200 @@
+import asyncio
 import pyodbc
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional
+import math
+import random
+import socket
 import time
 import logging
 
 from src.config.settings import settings
+from src.config.store_registry import store_registry
+from src.database.exceptions import (StoreDatabaseError, StoreNetworkError, StoreQueryError, classify_pyodbc_error,
+                                     deadline_error, network_error, timeout_error)
+from src.database.circuit_breaker import CircuitBreaker
+from src.database.pool import PoolTimeoutError, StoreConnectionPool
 from src.utils.logger import logger
 
 
+class ConnectionLease:
+    """
+    Una conexión del pool retenida para varias operaciones seguidas (p. ej. toda la cadena de
+    reimpresión) y devuelta una sola vez al final. `use()` la presta con un lock porque una
+    conexión pyodbc no se puede usar desde dos hilos a la vez (métodos lanzados en paralelo).
+    """
+
+    def __init__(self, manager: 'DatabaseManager', store_code: str):
+        self.store_code = store_code
+        self._context = manager.get_connection(store_code)
+        self._connection = None
+        self._lock = threading.Lock()
+        # Error al abrir, o error de pyodbc que dejó la conexión inservible (se descarta al cerrar)
+        self._open_error: Optional[Exception] = None
+        self._broken_error: Optional[Exception] = None
+        # Estado compartido entre close() y el hilo que la usa, siempre bajo _state_lock:
+        # si close() llega con la conexión en uso, la devuelve ese hilo al terminar
+        self._state_lock = threading.Lock()
+        self._in_use = False
+        self._close_pending = False
+        self._closed = False
+        self.uses = 0
+
+    def open(self) -> 'ConnectionLease':
+        """Toma la conexión del pool; use() lo hace solo la primera vez si no se llamó antes"""
+        if self._closed:
+            raise RuntimeError(f"Conexión retenida de {self.store_code} ya devuelta al pool")
+        if self._connection is None and self._open_error is None:
+            try:
+                self._connection = self._context.__enter__()
+            except Exception as e:
+                self._open_error = e
+                raise
+        elif self._open_error is not None:
+            raise self._open_error
+        return self
+
+    @contextmanager
+    def use(self):
+        with self._lock:
+            with self._state_lock:
+                if self._closed:
+                    raise RuntimeError(f"Conexión retenida de {self.store_code} ya devuelta al pool")
+                self._in_use = True
+            try:
+                self.open()
+                if self._broken_error is not None:
+                    raise self._broken_error
+                self.uses += 1
+                yield self._connection
+            except pyodbc.Error as e:
+                error = classify_pyodbc_error(self.store_code, e)
+                if not isinstance(error, StoreQueryError) or error.transient:
+                    self._broken_error = e
+                raise
+            finally:
+                with self._state_lock:
+                    self._in_use = False
+                    release = self._close_pending
+                if release:
+                    self._release()
+
+    def close(self):
+        """
+        Devuelve la conexión al pool. Si un método cancelado aún la usa en su hilo, no se espera:
+        la devuelve ese hilo al terminar su consulta.
+        """
+        with self._state_lock:
+            self._closed = True
+            if self._in_use:
+                self._close_pending = True
+                return
+        # Nadie la usa y ya no se presta más: el lock se obtiene sin esperar una consulta
+        with self._lock:
+            self._release()
+
+    def _release(self):
+        # Se llama con _lock tomado; una segunda llamada no hace nada
+        if self._connection is None:
+            return
+        self._connection = None
+        error = self._broken_error
+        try:
+            if error is None:
+                self._context.__exit__(None, None, None)
+            else:
+                self._context.__exit__(type(error), error, error.__traceback__)
+        except StoreDatabaseError:
+            # get_connection ya registró el error y descartó la conexión
+            pass
+
+    def __enter__(self) -> 'ConnectionLease':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionLeaseGroup:
+    """
+    Conexiones retenidas para una cadena de métodos que pueden correr en paralelo (reimpresión con
+    hedging): cada método en curso toma su propia conexión, hasta max_size a la vez, y los métodos
+    que corren en secuencia reutilizan la misma. Todas vuelven al pool con close().
+    """
+
+    def __init__(self, manager: 'DatabaseManager', store_code: str, max_size: int):
+        self._manager = manager
+        self.store_code = store_code
+        self.max_size = max(1, max_size)
+        self._leases: List[ConnectionLease] = []
+        self._free: List[ConnectionLease] = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+    @contextmanager
+    def acquire(self):
+        with self._condition:
+            while not self._closed and not self._free and len(self._leases) >= self.max_size:
+                self._condition.wait()
+            # Tras close() no se presta ninguna conexión: no quedaría nadie para devolverla
+            if self._closed:
+                raise RuntimeError(f"Conexiones retenidas de {self.store_code} ya devueltas al pool")
+            if self._free:
+                lease = self._free.pop()
+            else:
+                lease = ConnectionLease(self._manager, self.store_code)
+                self._leases.append(lease)
+        try:
+            yield lease
+        finally:
+            with self._condition:
+                self._free.append(lease)
+                self._condition.notify()
+
+    @property
+    def uses(self) -> int:
+        return sum(lease.uses for lease in self._leases)
+
+    @property
+    def connections(self) -> int:
+        return len(self._leases)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            leases = list(self._leases)
+            self._condition.notify_all()
+        for lease in leases:
+            lease.close()
+
+
 class DatabaseManager:
+    # Cada cuánto se barren las conexiones ociosas de todas las tiendas
+    _SWEEP_INTERVAL = 60
+
     def __init__(self):
         self.settings = settings.database
+        self._pools: Dict[str, StoreConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+        # Hilos dedicados a BD: una tienda lenta no consume el pool por defecto del event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.settings.executor_workers,
+            thread_name_prefix='db'
+        )
+        self._store_semaphores: Dict[str, asyncio.Semaphore] = {}
 
-    def _get_store_server(self, store_code: str) -> str:
-        """Get proper server name for store - CORREGIDO PARA K100+"""
-        # Para todas las tiendas usar formato SRV_ (K100 -> SRV_K100)
-        return f'SRV_{store_code}'
+        # Circuito por tienda: una tienda caída falla al instante en vez de esperar el timeout ODBC
+        self._breakers: Dict[str, CircuitBreaker] = {}
 
-    def _get_connection_string(self, store_code: str) -> str:
+    def _get_connection_string(self, store_code: str, login_timeout: int = 10) -> str:
         """Generate optimized connection string for store - CORREGIDO"""
-        database_name = f'MAXPOINT_{store_code}'
-        server_name = self._get_store_server(store_code)
+        database_name = store_registry.get(store_code).database
+        server_name = store_registry.host(store_code)
 
         # String de conexión optimizado
         conn_str = (
@@ -31,7 +204,7 @@ class DatabaseManager:
             f'UID={self.settings.user};'
             f'PWD={self.settings.password};'
             f'Connection Timeout=15;'
-            f'Login Timeout=10;'
+            f'Login Timeout={login_timeout};'
             f'Query Timeout=30;'
             f'Application Name=KFC_Bot;'
         )
@@ -39,104 +212,372 @@ class DatabaseManager:
         logger.info(f"🔗 Conectando a: SERVER={server_name}, DATABASE={database_name}")
         return conn_str
 
+    def _connect(self, store_code: str, login_timeout: int = None):
+        """Abre una conexión nueva (solo se llama cuando el pool no tiene una disponible)"""
+        if login_timeout is None:
+            conn_str = self._get_connection_string(store_code)
+            # Conexión optimizada
+            connection = pyodbc.connect(conn_str, autocommit=True)
+        else:
+            # timeout= fija SQL_ATTR_LOGIN_TIMEOUT: el login no espera más que lo pedido
+            conn_str = self._get_connection_string(store_code, login_timeout)
+            connection = pyodbc.connect(conn_str, autocommit=True, timeout=login_timeout)
+        connection.timeout = 15
+        return connection
+
+    def _get_pool(self, store_code: str) -> StoreConnectionPool:
+        """Pool de la tienda, creado la primera vez que se usa"""
+        pool = self._pools.get(store_code)
+        if pool is None:
+            with self._pools_lock:
+                pool = self._pools.get(store_code)
+                if pool is None:
+                    pool = StoreConnectionPool(
+                        store_code,
+                        factory=lambda: self._connect(store_code),
+                        max_size=self.settings.pool_max_size,
+                        idle_timeout=self.settings.pool_idle_timeout,
+                        wait_timeout=self.settings.pool_wait_timeout,
+                        health_check_after=self.settings.pool_health_check_after
+                    )
+                    self._pools[store_code] = pool
+        return pool
+
+    def _get_breaker(self, store_code: str) -> CircuitBreaker:
+        breaker = self._breakers.get(store_code)
+        if breaker is None:
+            with self._pools_lock:
+                breaker = self._breakers.get(store_code)
+                if breaker is None:
+                    breaker = CircuitBreaker(
+                        store_code,
+                        probe=lambda: self._probe(store_code),
+                        failure_threshold=self.settings.breaker_failure_threshold,
+                        reset_timeout=self.settings.breaker_reset_timeout,
+                        max_reset_timeout=self.settings.breaker_max_reset_timeout
+                    )
+                    self._breakers[store_code] = breaker
+        return breaker
+
+    def _probe(self, store_code: str):
+        """Sondeo del circuito: conexión nueva fuera del pool y SELECT 1"""
+        connection = self._connect(store_code)
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        finally:
+            connection.close()
+
+    def _sweep_idle_pools(self):
+        """Cierra conexiones ociosas vencidas de tiendas que ya no se consultan"""
+        now = time.monotonic()
+        if now - self._last_sweep < self._SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+
+        for pool in list(self._pools.values()):
+            evicted = pool.evict_idle()
+            if evicted:
+                logger.info(f"🧹 {evicted} conexión(es) ociosa(s) cerrada(s) en {pool.store_code}")
+
     @contextmanager
     def get_connection(self, store_code: str):
-        """Context manager for database connections with auto-close"""
-        connection = None
+        """Context manager que presta una conexión del pool de la tienda y la devuelve al salir"""
+        self._sweep_idle_pools()
+        breaker = self._get_breaker(store_code)
+        breaker.before_call()
+
+        pool = self._get_pool(store_code)
+        entry = None
+        broken = False
         start_time = time.time()
 
         try:
-            conn_str = self._get_connection_string(store_code)
-
-            # Conexión optimizada
-            connection = pyodbc.connect(conn_str, autocommit=True)
-            connection.timeout = 15
+            entry = pool.acquire()
 
             elapsed_time = time.time() - start_time
-            logger.info(f"✅ Conexión exitosa a {store_code} en {elapsed_time:.2f}s")
+            if entry.reused:
+                logger.debug(f"♻️ Conexión reutilizada del pool de {store_code}")
+            else:
+                logger.info(f"✅ Conexión exitosa a {store_code} en {elapsed_time:.2f}s")
 
-            yield connection
+            yield entry.connection
+            breaker.record_success()
 
-        except pyodbc.OperationalError as e:
-            elapsed_time = time.time() - start_time
-            error_msg = str(e)
-
-            if '53' in error_msg or 'network' in error_msg.lower():
-                logger.error(f"❌ Error de red para tienda {store_code}: {error_msg}")
-                raise Exception(f"🌐 *Problema de conexión detectado*\n\n"
-                                f"**Tienda:** {store_code}\n"
-                                f"**Error:** Servidor no disponible\n\n"
-                                f"🔍 **Qué verificar:**\n"
-                                f"• El código {store_code} es correcto\n"
-                                f"• El servidor SRV_{store_code} está activo\n"
-                                f"• La red tiene conectividad")
-            elif 'login' in error_msg.lower():
-                logger.error(f"❌ Error de autenticación para {store_code}: {error_msg}")
-                raise Exception(f"🔐 *Error de credenciales*\n\n"
-                                f"**Tienda:** {store_code}\n"
-                                f"**Problema:** No se pudo autenticar\n\n"
-                                f"💡 **Solución:**\n"
-                                f"Contacte al administrador del sistema")
-            else:
-                logger.error(f"❌ Error operacional BD {store_code}: {error_msg}")
-                raise Exception(f"⚙️ *Error de base de datos*\n\n"
-                                f"**Tienda:** {store_code}\n"
-                                f"**Detalle:** {error_msg}\n\n"
-                                f"🛠️ **Acción requerida:**\n"
-                                f"Contacte a Mesa de Servicio")
+        except StoreDatabaseError as e:
+            broken = e.transient
+            breaker.record_failure(e)
+            logger.error(f"❌ Error de BD en {store_code}: {e.detail or str(e)}")
+            raise
+
+        except PoolTimeoutError as e:
+            logger.error(f"❌ Sin conexiones libres para {store_code}: {str(e)}")
+            raise timeout_error(store_code, str(e)) from e
+
+        except pyodbc.Error as e:
+            error = classify_pyodbc_error(store_code, e)
+            # Un error de SQL no daña la conexión; red/timeout/desconocido sí la descartan
+            broken = not isinstance(error, StoreQueryError) or error.transient
+            breaker.record_failure(error)
+            if isinstance(error, StoreNetworkError):
+                store_registry.forget(store_code)
+            logger.error(f"❌ {type(error).__name__} en {store_code} "
+                         f"(SQLSTATE {error.sqlstate or '?'}): {error.detail}")
+            raise error from e
 
         except Exception as e:
+            broken = True
             logger.error(f"❌ Error inesperado en {store_code}: {str(e)}")
-            raise Exception(f"🚨 *Error inesperado*\n\n"
-                            f"**Tienda:** {store_code}\n"
-                            f"**Error:** {str(e)}\n\n"
-                            f"📞 **Contacte a soporte técnico**")
+            raise StoreDatabaseError(store_code,
+                                     f"🚨 *Error inesperado*\n\n"
+                                     f"**Tienda:** {store_code}\n"
+                                     f"**Error:** {str(e)}\n\n"
+                                     f"📞 **Contacte a soporte técnico**",
+                                     str(e)) from e
+
+        finally:
+            # Una conexión que falló en medio de una consulta no vuelve al pool
+            if entry is not None:
+                pool.release(entry, discard=broken)
+
+    def lease(self, store_code: str) -> ConnectionLease:
+        """Conexión retenida para varias operaciones: se toma del pool en el primer use() y vuelve con close()"""
+        return ConnectionLease(self, store_code)
+
+    def lease_group(self, store_code: str, max_size: int) -> ConnectionLeaseGroup:
+        """Una conexión por método en curso (hasta max_size), reutilizadas entre métodos sucesivos"""
+        return ConnectionLeaseGroup(self, store_code, max_size)
+
+    def check_reachable(self, store_code: str) -> float:
+        """
+        Conexión TCP al puerto de SQL Server (sub-segundo) antes de intentar el login ODBC.
+        Retorna los segundos que tardó; lanza StoreNetworkError si el servidor no acepta la conexión.
+        """
+        breaker = self._get_breaker(store_code)
+        breaker.before_call()
+
+        server_name = store_registry.get(store_code).server
+        start_time = time.time()
+        try:
+            server_ip = store_registry.resolve(store_code)
+            if server_ip is None:
+                raise OSError(f"{server_name} no resuelve por DNS")
+            with socket.create_connection((server_ip, self.settings.port),
+                                          timeout=self.settings.tcp_check_timeout):
+                pass
+        except OSError as e:
+            # El servidor pudo cambiar de IP: la próxima verificación vuelve a consultar el DNS
+            store_registry.forget(store_code)
+            error = network_error(store_code, f"TCP {server_name}:{self.settings.port} - {str(e)}")
+            breaker.record_failure(error)
+            logger.warning(f"🔌 {server_name}:{self.settings.port} no responde a TCP: {str(e)}")
+            raise error from e
+
+        return time.time() - start_time
+
+    def connect_store(self, store_code: str) -> bool:
+        """
+        Verificación por etapas: si el pool no tiene una conexión lista, primero TCP y solo
+        si responde el login completo. La conexión autenticada queda en el pool para las consultas.
+        """
+        if not self._get_pool(store_code).has_idle():
+            elapsed = self.check_reachable(store_code)
+            logger.info(f"🔌 {store_code} alcanzable por TCP en {elapsed * 1000:.0f}ms")
+
+        with self.get_connection(store_code):
+            pass
+        return True
+
+    def query_unpooled(self, store_code: str, query: str, params: tuple = None, timeout: float = None) -> list:
+        """
+        SELECT puntual con una conexión propia, fuera del pool y cerrada al terminar.
+        Login y consulta esperan como máximo `timeout`: sirve para recorridos por muchas tiendas
+        que no deben dejar conexiones ociosas en cada pool ni hilos bloqueados el login ODBC completo.
+        """
+        breaker = self._get_breaker(store_code)
+        breaker.before_call()
+
+        seconds = max(1, int(math.ceil(timeout))) if timeout else self.settings.timeout
+        connection = None
+        try:
+            connection = self._connect(store_code, login_timeout=seconds)
+            connection.timeout = seconds
+            cursor = connection.cursor()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            rows = cursor.fetchall()
+            breaker.record_success()
+            return rows
+
+        except pyodbc.Error as e:
+            error = classify_pyodbc_error(store_code, e)
+            breaker.record_failure(error)
+            if isinstance(error, StoreNetworkError):
+                store_registry.forget(store_code)
+            logger.error(f"❌ {type(error).__name__} en {store_code} "
+                         f"(SQLSTATE {error.sqlstate or '?'}): {error.detail}")
+            raise error from e
 
         finally:
-            if connection:
+            if connection is not None:
                 try:
                     connection.close()
-                except:
+                except pyodbc.Error:
                     pass
 
-    def execute_query(self, store_code: str, query: str, params: tuple = None, max_retries: int = 2):
-        """Execute query with retry logic"""
-        last_exception = None
+    def get_breaker_states(self) -> Dict[str, dict]:
+        """Estado del circuito por tienda (closed/open/half_open, fallos, próximo sondeo)"""
+        return {store_code: breaker.snapshot() for store_code, breaker in list(self._breakers.items())}
+
+    def get_pool_stats(self) -> Dict[str, dict]:
+        """Estadísticas del pool por tienda (hits, misses, waits, ociosas, en uso)"""
+        return {store_code: pool.snapshot() for store_code, pool in list(self._pools.items())}
+
+    def close_all(self):
+        """Cierra todas las conexiones ociosas de todos los pools"""
+        for pool in list(self._pools.values()):
+            pool.close()
+        logger.info("✅ Pools de conexiones cerrados")
+
+    def shutdown(self):
+        """Detiene el executor de BD y cierra los pools"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.close_all()
+
+    def _execute_once(self, store_code: str, query: str, params: tuple = None, timeout: float = None):
+        """Ejecuta la consulta una sola vez con una conexión del pool"""
+        with self.get_connection(store_code) as conn:
+            # El timeout de la consulta no puede pasarse del tiempo que le queda a la llamada
+            conn.timeout = max(1, int(min(timeout, self.settings.timeout))) if timeout else self.settings.timeout
+            cursor = conn.cursor()
+
+            start_time = time.time()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+
+            # Determinar si es SELECT o no
+            if query.strip().upper().startswith('SELECT'):
+                results = cursor.fetchall()
+                elapsed = time.time() - start_time
+
+                if elapsed > 3:  # Log queries lentas
+                    logger.warning(f"⏱️ Query lenta en {store_code}: {elapsed:.2f}s")
+
+                return results
+            else:
+                conn.commit()
+                return cursor.rowcount
+
+    def _retry_delay(self, attempt: int) -> float:
+        """Backoff exponencial con jitter completo: uniforme entre 0 y base * 2^intento (con tope)"""
+        ceiling = min(self.settings.retry_max_delay, self.settings.retry_base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _should_retry(self, store_code: str, error: Exception, attempt: int, max_retries: int,
+                      deadline_at: float, delay: float) -> bool:
+        """Solo se reintentan errores transitorios y si el reintento cabe dentro del plazo de la llamada"""
+        if not getattr(error, 'transient', False):
+            logger.error(f"❌ Error no reintentable en {store_code}: {type(error).__name__}")
+            return False
+        if attempt >= max_retries:
+            logger.error(f"❌ Fallo después de {max_retries + 1} intentos en {store_code}: {str(error)}")
+            return False
+        if time.monotonic() + delay >= deadline_at:
+            logger.error(f"❌ Sin tiempo para reintentar en {store_code} (plazo de la llamada agotado)")
+            return False
+        logger.warning(f"🔄 Reintento {attempt + 1} para {store_code} en {delay:.2f}s "
+                       f"({type(error).__name__})...")
+        return True
+
+    def execute_query(self, store_code: str, query: str, params: tuple = None, max_retries: int = 2,
+                      deadline: float = None):
+        """
+        Execute query with retry logic (bloqueante: usar solo fuera del event loop).
+        `deadline` acota el tiempo total de la llamada, reintentos incluidos.
+        """
+        deadline = deadline or self.settings.query_deadline
+        deadline_at = time.monotonic() + deadline
 
         for attempt in range(max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise deadline_error(store_code, deadline)
             try:
-                with self.get_connection(store_code) as conn:
-                    cursor = conn.cursor()
+                return self._execute_once(store_code, query, params, timeout=remaining)
 
-                    start_time = time.time()
-                    if params:
-                        cursor.execute(query, params)
-                    else:
-                        cursor.execute(query)
+            except StoreDatabaseError as e:
+                delay = self._retry_delay(attempt)
+                if not self._should_retry(store_code, e, attempt, max_retries, deadline_at, delay):
+                    raise
+                time.sleep(delay)
 
-                    # Determinar si es SELECT o no
-                    if query.strip().upper().startswith('SELECT'):
-                        results = cursor.fetchall()
-                        elapsed = time.time() - start_time
+    def _get_store_semaphore(self, store_code: str) -> asyncio.Semaphore:
+        """Límite de operaciones simultáneas contra una misma tienda"""
+        semaphore = self._store_semaphores.get(store_code)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.settings.store_concurrency)
+            self._store_semaphores[store_code] = semaphore
+        return semaphore
 
-                        if elapsed > 3:  # Log queries lentas
-                            logger.warning(f"⏱️ Query lenta en {store_code}: {elapsed:.2f}s")
+    async def run_async(self, store_code: str, func: Callable, *args) -> Any:
+        """
+        Ejecuta trabajo bloqueante de BD en el executor dedicado, respetando el límite de la tienda.
+        El cupo se devuelve cuando termina el hilo, no cuando el llamador deja de esperar (plazo
+        agotado o cancelación): la consulta sigue ocupando su conexión hasta acabar.
+        """
+        semaphore = self._get_store_semaphore(store_code)
+        await semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self._release_store_slot(loop, semaphore))
+        return await asyncio.wrap_future(future)
 
-                        return results
-                    else:
-                        conn.commit()
-                        return cursor.rowcount
+    @staticmethod
+    def _release_store_slot(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore):
+        # Se llama desde el hilo del executor (o al cancelar un trabajo aún no iniciado)
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            pass  # event loop ya cerrado (apagado)
 
-            except Exception as e:
-                last_exception = e
-                if attempt < max_retries:
-                    wait_time = (attempt + 1) * 2  # Backoff exponencial
-                    logger.warning(f"🔄 Reintento {attempt + 1} para {store_code} en {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    logger.error(f"❌ Fallo después de {max_retries + 1} intentos en {store_code}: {str(e)}")
-                    raise last_exception
+    async def execute_query_async(self, store_code: str, query: str, params: tuple = None,
+                                  max_retries: int = 2, deadline: float = None):
+        """
+        Versión asíncrona de execute_query: no bloquea el event loop, espera los reintentos con
+        asyncio.sleep y corta la llamada completa al llegar a `deadline`.
+        """
+        deadline = deadline or self.settings.query_deadline
+        deadline_at = time.monotonic() + deadline
+
+        for attempt in range(max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise deadline_error(store_code, deadline)
+            try:
+                return await asyncio.wait_for(
+                    self.run_async(store_code, self._execute_once, store_code, query, params, remaining),
+                    timeout=remaining
+                )
+
+            except asyncio.TimeoutError:
+                logger.error(f"❌ Plazo de {deadline:g}s agotado consultando {store_code}")
+                raise deadline_error(store_code, deadline)
+
+            except StoreDatabaseError as e:
+                delay = self._retry_delay(attempt)
+                if not self._should_retry(store_code, e, attempt, max_retries, deadline_at, delay):
+                    raise
+                await asyncio.sleep(delay)
 
 
 # Global database manager
-db_manager = DatabaseManager()
\ No newline at end of file
+db_manager = DatabaseManager()
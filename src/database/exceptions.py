@@ -0,0 +1,155 @@
+from typing import Optional
+
+from src.config.store_registry import store_registry
+
+
+class StoreDatabaseError(Exception):
+    """
+    Error de BD de una tienda. str(error) es el mensaje para el usuario (Markdown);
+    `detail` conserva el error original para los logs.
+    """
+    # Si vale la pena reintentar la misma operación
+    transient = False
+
+    def __init__(self, store_code: str, message: str, detail: str = '', sqlstate: Optional[str] = None):
+        super().__init__(message)
+        self.store_code = store_code
+        self.detail = detail
+        self.sqlstate = sqlstate
+
+
+class StoreNetworkError(StoreDatabaseError):
+    """Servidor de la tienda inalcanzable o conexión cortada"""
+    transient = True
+
+
+class StoreAuthError(StoreDatabaseError):
+    """Credenciales rechazadas: reintentar no sirve"""
+
+
+class StoreTimeoutError(StoreDatabaseError):
+    """La consulta o la espera de una conexión superó su tiempo"""
+    transient = True
+
+
+class StoreDeadlineExceededError(StoreTimeoutError):
+    """Se agotó el tiempo total permitido para la llamada, incluidos los reintentos"""
+    transient = False
+
+
+class StoreQueryError(StoreDatabaseError):
+    """Error de SQL (objeto inexistente, sintaxis, restricción...); solo un deadlock es reintentable"""
+
+    def __init__(self, store_code: str, message: str, detail: str = '', sqlstate: Optional[str] = None,
+                 transient: bool = False):
+        super().__init__(store_code, message, detail, sqlstate)
+        self.transient = transient
+
+
+# SQLSTATE de ODBC por categoría
+_NETWORK_STATES = {'08001', '08004', '08007', '08S01', '01002'}
+_AUTH_STATES = {'28000'}
+_TIMEOUT_STATES = {'HYT00', 'HYT01'}
+_DEADLOCK_STATES = {'40001'}
+
+
+def _sqlstate(error: Exception) -> Optional[str]:
+    """pyodbc guarda el SQLSTATE como primer argumento de la excepción"""
+    if error.args and isinstance(error.args[0], str) and len(error.args[0]) == 5:
+        return error.args[0].upper()
+    return None
+
+
+def _server_name(store_code: str) -> str:
+    """Servidor SQL de la tienda según el directorio (stores.json o plantillas por defecto)"""
+    try:
+        return store_registry.get(store_code).server
+    except Exception:
+        return store_code
+
+
+def network_error(store_code: str, detail: str, sqlstate: Optional[str] = None) -> StoreNetworkError:
+    return StoreNetworkError(
+        store_code,
+        f"🌐 *Problema de conexión detectado*\n\n"
+        f"**Tienda:** {store_code}\n"
+        f"**Error:** Servidor no disponible\n\n"
+        f"🔍 **Qué verificar:**\n"
+        f"• El código {store_code} es correcto\n"
+        f"• El servidor `{_server_name(store_code)}` está activo\n"
+        f"• La red tiene conectividad",
+        detail, sqlstate
+    )
+
+
+def timeout_error(store_code: str, detail: str, sqlstate: Optional[str] = None) -> StoreTimeoutError:
+    return StoreTimeoutError(
+        store_code,
+        f"⏱️ *La tienda no respondió a tiempo*\n\n"
+        f"**Tienda:** {store_code}\n\n"
+        f"🔄 Intente nuevamente en unos segundos",
+        detail, sqlstate
+    )
+
+
+def deadline_error(store_code: str, deadline: float, detail: str = '') -> StoreDeadlineExceededError:
+    return StoreDeadlineExceededError(
+        store_code,
+        f"⏱️ *La tienda no respondió a tiempo*\n\n"
+        f"**Tienda:** {store_code}\n"
+        f"**Espera máxima:** {deadline:g}s\n\n"
+        f"🔄 Intente nuevamente en unos minutos",
+        detail
+    )
+
+
+def classify_pyodbc_error(store_code: str, error: Exception) -> StoreDatabaseError:
+    """Convierte un error de pyodbc en el tipo correspondiente según SQLSTATE (y el texto si no lo hay)"""
+    detail = str(error)
+    lowered = detail.lower()
+    sqlstate = _sqlstate(error)
+
+    if sqlstate in _AUTH_STATES or (sqlstate is None and 'login' in lowered):
+        return StoreAuthError(
+            store_code,
+            f"🔐 *Error de credenciales*\n\n"
+            f"**Tienda:** {store_code}\n"
+            f"**Problema:** No se pudo autenticar\n\n"
+            f"💡 **Solución:**\n"
+            f"Contacte al administrador del sistema",
+            detail, sqlstate
+        )
+
+    if sqlstate in _TIMEOUT_STATES or 'timeout expired' in lowered:
+        return timeout_error(store_code, detail, sqlstate)
+
+    if (sqlstate in _NETWORK_STATES or '(53)' in detail or 'network' in lowered
+            or 'tcp provider' in lowered or 'communication link' in lowered):
+        return network_error(store_code, detail, sqlstate)
+
+    deadlock = sqlstate in _DEADLOCK_STATES or 'deadlock' in lowered
+    return StoreQueryError(
+        store_code,
+        f"⚙️ *Error de base de datos*\n\n"
+        f"**Tienda:** {store_code}\n"
+        f"**Detalle:** {detail}\n\n"
+        f"🛠️ **Acción requerida:**\n"
+        f"Contacte a Mesa de Servicio",
+        detail, sqlstate, transient=deadlock
+    )
+
+
+class StoreOfflineError(StoreDatabaseError):
+    """El circuito de la tienda está abierto: se falla de inmediato sin intentar conectar"""
+
+
+def offline_error(store_code: str, retry_in: float) -> StoreOfflineError:
+    return StoreOfflineError(
+        store_code,
+        f"📴 *Tienda sin conexión*\n\n"
+        f"**Tienda:** {store_code}\n"
+        f"**Estado:** El servidor `{_server_name(store_code)}` no responde\n\n"
+        f"🔄 Se está verificando automáticamente; intente de nuevo en ~{max(1, int(retry_in))}s\n"
+        f"📞 Si persiste, contacte a Mesa de Servicio",
+        f"circuito abierto, próximo sondeo en {retry_in:.0f}s"
+    )
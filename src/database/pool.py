@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Deque, Dict, List
+
+from src.utils.logger import logger
+
+
+class PoolTimeoutError(Exception):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera"""
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    waits: int = 0
+    timeouts: int = 0
+    evicted: int = 0
+    discarded: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class PooledConnection:
+    """Conexión viva del pool con sus marcas de tiempo"""
+    __slots__ = ('connection', 'created_at', 'last_used', 'reused')
+
+    def __init__(self, connection: Any):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.reused = False
+
+
+class StoreConnectionPool:
+    """Pool acotado y thread-safe de conexiones pyodbc para una tienda"""
+
+    def __init__(self, store_code: str, factory: Callable[[], Any], max_size: int,
+                 idle_timeout: float, wait_timeout: float, health_check_after: float):
+        self.store_code = store_code
+        self._factory = factory
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.health_check_after = health_check_after
+
+        self._idle: Deque[PooledConnection] = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.stats = PoolStats()
+
+    def acquire(self) -> PooledConnection:
+        """Obtiene una conexión: reutiliza una ociosa sana o abre una nueva si hay cupo"""
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        expired: List[PooledConnection] = []
+
+        with self._cond:
+            while True:
+                expired.extend(self._pop_expired_locked())
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO: la más recientemente usada
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    entry = None
+                    self._in_use += 1
+                    break
+
+                if not waited:
+                    self.stats.waits += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats.timeouts += 1
+                    self._close_all(expired)
+                    raise PoolTimeoutError(
+                        f"Pool de {self.store_code} agotado ({self.max_size} conexiones en uso)"
+                    )
+                self._cond.wait(remaining)
+
+        self._close_all(expired)
+
+        if entry is not None:
+            if self._is_healthy(entry):
+                with self._cond:
+                    self.stats.hits += 1
+                entry.reused = True
+                return entry
+            logger.warning(f"🩺 Conexión ociosa inválida descartada en {self.store_code}")
+            self._close(entry)
+            with self._cond:
+                self.stats.discarded += 1
+
+        try:
+            entry = PooledConnection(self._factory())
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self.stats.misses += 1
+        return entry
+
+    def release(self, entry: PooledConnection, discard: bool = False):
+        """Devuelve la conexión al pool, o la cierra si quedó en estado dudoso"""
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self.stats.discarded += 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+        if discard:
+            self._close(entry)
+
+    def has_idle(self) -> bool:
+        with self._cond:
+            return bool(self._idle)
+
+    def evict_idle(self) -> int:
+        """Cierra las conexiones que superaron el tiempo máximo ociosas"""
+        with self._cond:
+            expired = self._pop_expired_locked()
+        self._close_all(expired)
+        return len(expired)
+
+    def close(self):
+        """Cierra todas las conexiones ociosas"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        self._close_all(idle)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            data = self.stats.to_dict()
+            data.update({
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size
+            })
+        return data
+
+    def _pop_expired_locked(self) -> List[PooledConnection]:
+        """Retira (con el lock tomado) las conexiones ociosas vencidas, de la más antigua a la más nueva"""
+        now = time.monotonic()
+        expired = []
+        while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+            expired.append(self._idle.popleft())
+        self.stats.evicted += len(expired)
+        return expired
+
+    def _is_healthy(self, entry: PooledConnection) -> bool:
+        """Verifica la conexión solo si estuvo ociosa más de health_check_after segundos"""
+        if time.monotonic() - entry.last_used < self.health_check_after:
+            return True
+        try:
+            cursor = entry.connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _close_all(self, entries: List[PooledConnection]):
+        for entry in entries:
+            self._close(entry)
+
+    @staticmethod
+    def _close(entry: PooledConnection):
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
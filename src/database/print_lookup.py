@@ -0,0 +1,43 @@
+from typing import Any, List, Optional, Tuple
+
+from src.config.constants import CANAL_MOVIMIENTO_TIPOS
+from src.database.queries import PRINT_DATA_EXACT_QUERY, PRINT_DATA_QUERY
+from src.utils.helpers import normalize_document_key
+from src.utils.logger import logger
+
+# Cuántas búsquedas respondió cada nivel (para ver si el respaldo con LIKE sigue haciendo falta)
+print_lookup_stats = {'exact': 0, 'like': 0, 'none': 0}
+
+
+def print_lookup_plan(document_id: str, document_type: str) -> List[Tuple[str, str, tuple]]:
+    """
+    Consultas a Canal_Movimiento en orden: igualdad con la clave normalizada y el tipo exacto,
+    y luego el LIKE '%id%' / '%tipo%' original. Lista vacía si el tipo no es válido.
+    """
+    tipo = CANAL_MOVIMIENTO_TIPOS.get(document_type.lower())
+    if tipo is None:
+        return []
+
+    return [
+        ('exact', PRINT_DATA_EXACT_QUERY, (normalize_document_key(document_id), tipo)),
+        ('like', PRINT_DATA_QUERY, (f'%{document_id.strip()}%', f'%{tipo}%'))
+    ]
+
+
+def record_print_lookup(document_id: str, tier: str):
+    print_lookup_stats[tier] += 1
+    if tier == 'like':
+        logger.info(f"🐢 Canal_Movimiento de {document_id} encontrado solo con LIKE (clave exacta sin coincidencia)")
+
+
+def find_print_data(cursor: Any, document_id: str, document_type: str) -> Tuple[Optional[tuple], str]:
+    """Búsqueda escalonada con un cursor pyodbc abierto; retorna (fila, nivel que respondió)"""
+    for tier, query, params in print_lookup_plan(document_id, document_type):
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        if row:
+            record_print_lookup(document_id, tier)
+            return row, tier
+
+    record_print_lookup(document_id, 'none')
+    return None, 'none'
@@ -26,8 +26,64 @@ ORDER_STATUS_QUERY = """
     WHERE codigo_app = ?
 """
 
+# Estado por tabla de origen: se consulta primero la que corresponde al formato del código
+# y la otra solo como respaldo; TOP 1 corta en cuanto encuentra la fila
+ORDER_STATUS_APP_QUERY = """
+    SELECT TOP 1
+        codigo_app, 
+        estado, 
+        cfac_id, 
+        medio, 
+        fecha_Pedido,
+        COALESCE(m.nombres + ' ' + m.apellidos, 'No asignado') as motorizado
+    FROM Cabecera_App ca WITH(NOLOCK)
+    LEFT JOIN Motorolo m WITH(NOLOCK) ON ca.IDMotorolo = m.IDMotorolo
+    WHERE ca.codigo_app = ?
+"""
+
+ORDER_STATUS_KIOSK_QUERY = """
+    SELECT TOP 1
+        codigo_app,
+        estado_maxpoint as estado,
+        cfac_id,
+        '' as medio,
+        GETDATE() as fecha_Pedido,
+        'No asignado' as motorizado
+    FROM kiosko_cabecera_pedidos WITH(NOLOCK)
+    WHERE codigo_app = ?
+"""
+
+# Estado de varias órdenes en un solo viaje: ambas tablas con IN (?, ?, ...); 'origen' indica
+# la tabla para preferir la que corresponde al formato del código si aparece en las dos
+ORDER_STATUS_BATCH_TEMPLATE = """
+    SELECT
+        ca.codigo_app,
+        estado,
+        cfac_id,
+        medio,
+        fecha_Pedido,
+        COALESCE(m.nombres + ' ' + m.apellidos, 'No asignado') as motorizado,
+        'app' as origen
+    FROM Cabecera_App ca WITH(NOLOCK)
+    LEFT JOIN Motorolo m WITH(NOLOCK) ON ca.IDMotorolo = m.IDMotorolo
+    WHERE ca.codigo_app IN ({placeholders})
+
+    UNION ALL
+
+    SELECT
+        codigo_app,
+        estado_maxpoint as estado,
+        cfac_id,
+        '' as medio,
+        GETDATE() as fecha_Pedido,
+        'No asignado' as motorizado,
+        'kiosko' as origen
+    FROM kiosko_cabecera_pedidos WITH(NOLOCK)
+    WHERE codigo_app IN ({placeholders})
+"""
+
 # Order audit - QUERY OPTIMIZADA
-ORDER_AUDIT_QUERY = """
+_ORDER_AUDIT_TEMPLATE = """
     SELECT 
         epa.codigo_app,
         epa.estado,
@@ -36,10 +92,16 @@ ORDER_AUDIT_QUERY = """
     FROM Estado_Pedido_App epa WITH(NOLOCK)
     LEFT JOIN Cabecera_App ca WITH(NOLOCK) ON epa.codigo_app = ca.codigo_app
     LEFT JOIN Motorolo m WITH(NOLOCK) ON ca.IDMotorolo = m.IDMotorolo
-    WHERE epa.codigo_app LIKE ?
+    WHERE {condition}
     ORDER BY epa.IDEstadoPedido ASC
 """
 
+# Búsqueda escalonada: exacta y prefijo usan el índice de codigo_app;
+# la subcadena ('%id%') recorre toda la tabla y solo se usa si se habilita explícitamente
+ORDER_AUDIT_EXACT_QUERY = _ORDER_AUDIT_TEMPLATE.format(condition="epa.codigo_app = ?")
+ORDER_AUDIT_PREFIX_QUERY = _ORDER_AUDIT_TEMPLATE.format(condition="epa.codigo_app LIKE ? ESCAPE '\\'")
+ORDER_AUDIT_QUERY = ORDER_AUDIT_PREFIX_QUERY  # subcadena: mismo LIKE con comodín inicial
+
 # Get comanda URL - QUERY DIRECTA
 COMANDA_URL_QUERY = """
     SELECT TOP 1 IDCabeceraordenPedido 
@@ -47,6 +109,18 @@ COMANDA_URL_QUERY = """
     WHERE cfac_id = ?
 """
 
+# Identidad de un documento: ODP y código de app/pickup a partir del cfac_id
+DOCUMENT_IDENTITY_QUERY = """
+    SELECT TOP 1
+        cf.IDCabeceraordenPedido,
+        ca.codigo_app AS codigo_app_delivery,
+        pk.codigo_app AS codigo_app_pickup
+    FROM Cabecera_Factura cf WITH(NOLOCK)
+    LEFT JOIN Cabecera_App ca WITH(NOLOCK) ON ca.cfac_id = cf.cfac_id AND ca.codigo_app IS NOT NULL
+    LEFT JOIN pickup_cabecera_pedidos pk WITH(NOLOCK) ON pk.cfac_id = cf.cfac_id AND pk.codigo_app IS NOT NULL
+    WHERE cf.cfac_id = ?
+"""
+
 # Get associated code - QUERY MEJORADA
 ASSOCIATED_CODE_QUERY = """
     SELECT TOP 1 codigo_app 
@@ -60,7 +134,15 @@ ASSOCIATED_CODE_QUERY = """
     WHERE cfac_id = ?
 """
 
-# Get print data for reprints - QUERY OPTIMIZADA
+# Get print data for reprints - búsqueda exacta (usa índices) con la clave normalizada
+PRINT_DATA_EXACT_QUERY = """
+    SELECT TOP 1 imp_url, Canal_MovimientoVarchar1 
+    FROM Canal_Movimiento WITH(NOLOCK)
+    WHERE Canal_MovimientoVarchar3 = ? 
+    AND imp_varchar1 = ?
+"""
+
+# Get print data for reprints - respaldo con comodines si la búsqueda exacta no encuentra nada
 PRINT_DATA_QUERY = """
     SELECT TOP 1 imp_url, Canal_MovimientoVarchar1 
     FROM Canal_Movimiento WITH(NOLOCK)
@@ -59,7 +59,6 @@ class CallbackHandlers:
     def __init__(self):
         self.user_states = {}
         self.user_last_activity = {}
-        self.conteo_impresiones = {}
         # AGREGAR ESTAS LÍNEAS
         self.order_service = OrderService()
         self.impresora_manager = ImpresoraManager()
@@ -117,6 +116,9 @@ class CallbackHandlers:
             elif query.data == '8':  # Cambiar Tienda
                 await self._handle_opcion_8(query, state)
 
+            elif query.data == '9':  # Buscar orden en todas las tiendas
+                await self._handle_opcion_9(query, state)
+
             # SUBMENÚ DE RE-IMPRESIONES
             elif query.data in ['factura', 'nota_credito', 'comanda']:
                 await self._handle_reprint_submenu(query, state)
@@ -370,7 +372,8 @@ Total: ${order_data.get('total', '0')}
         await query.edit_message_text(
             text="🔍 *Verificar Estado de Orden*\n\n"
                  "📝 **Por favor, ingresa el número de orden:**\n"
-                 "(Ejemplo: APP123456789)\n\n"
+                 "(Ejemplo: APP123456789)\n"
+                 "📋 Puedes pegar varios códigos separados por espacios, comas o saltos de línea\n\n"
                  "💡 *También puedes usar los botones de navegación*",
             parse_mode='Markdown',
             reply_markup=reply_markup
@@ -464,6 +467,24 @@ Total: ${order_data.get('total', '0')}
             parse_mode='Markdown'
         )
 
+    async def _handle_opcion_9(self, query, state):
+        """Buscar orden en todas las tiendas"""
+        state['step'] = USER_STATES['SEARCH_ALL_STORES']
+        keyboard = [
+            [InlineKeyboardButton("↩️ Volver al Menú", callback_data='volver_menu')],
+            [InlineKeyboardButton("❌ Finalizar", callback_data='finalizar_consulta')]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        await query.edit_message_text(
+            text="🌐 *Buscar en todas las tiendas*\n\n"
+                 "📝 **Por favor, ingresa el número de orden:**\n"
+                 "(Ejemplo: APP123456789)\n\n"
+                 "💡 *Se consultan todas las tiendas y se detiene al encontrarla*",
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
+
     async def _handle_reprint_submenu(self, query, state):
         """Manejar submenú de re-impresiones"""
         state['step'] = USER_STATES['GET_REPRINT_ID']
@@ -500,7 +521,7 @@ Total: ${order_data.get('total', '0')}
             await self.mostrar_menu_reimpresion(query.message)
         elif state.get('step') in [USER_STATES['GET_ORDER_STATUS'], USER_STATES['GET_ORDER_AUDIT'],
                                    USER_STATES['GET_INVOICE_ID'], USER_STATES['GET_COMANDA_ID'],
-                                   USER_STATES['GET_CFAC_ID']]:
+                                   USER_STATES['GET_CFAC_ID'], USER_STATES['SEARCH_ALL_STORES']]:
             state['step'] = USER_STATES['MAIN_MENU']
             await self.mostrar_menu_principal(query.message)
         else:
@@ -528,6 +549,9 @@ Total: ${order_data.get('total', '0')}
             [
                 InlineKeyboardButton("🖨️ Re-Impresión", callback_data='7')
             ],
+            [
+                InlineKeyboardButton("🌐 Buscar en todas las tiendas", callback_data='9')
+            ],
             [
                 InlineKeyboardButton("🔄 Cambiar Tienda", callback_data='8'),
                 InlineKeyboardButton("❌ Finalizar", callback_data='finalizar_consulta')
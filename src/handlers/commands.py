@@ -8,9 +8,17 @@ from telegram.ext import ContextTypes, CommandHandler
 
 from src.config.settings import settings
 from src.utils.logger import logger
-from src.services.order_service import OrderService
+from src.services.order_service import OrderService, image_cache, render_scheduler
 from src.services.report_service import ReportService
-from src.services.reimpresion_service import ReimpresionService
+from src.database.connection import db_manager
+from src.services.render_wait import render_wait_histograms
+from src.services.document_resolver import document_resolver
+from src.database.print_lookup import print_lookup_stats
+from src.services.store_health import store_health
+from src.services.http_client import http_client
+from src.services.reprint_orchestrator import reprint_orchestrator
+from src.services.print_queue import print_queue
+from src.services.reprint_ledger import reprint_ledger
 
 
 class CommandHandlers:
@@ -21,7 +29,6 @@ class CommandHandlers:
         self.activity_records = {}
         self.callback_handlers = callback_handlers
         self.report_service = ReportService()
-        self.reimpresion_service = ReimpresionService()
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -47,7 +54,8 @@ class CommandHandlers:
                 "• 🖨️ Re-impresiones inteligentes\n"
                 "• 📦 Seguimiento de comandas\n\n"
                 "🔢 **Por favor, ingresa el código de tu tienda:**\n"
-                "*(Ejemplo: K002, K080, K100, K101)*"
+                "*(Ejemplo: K002, K080, K100, K101)*\n\n"
+                "🌐 ¿No sabes la tienda? Escribe *TODAS* para buscar la orden en todas"
             )
 
             await update.message.reply_text(
@@ -114,39 +122,29 @@ class CommandHandlers:
                 )
                 return
 
-            # Mensaje de procesamiento
-            processing_msg = await update.message.reply_text(
-                f"🔄 *Procesando reimpresión...*\n\n"
-                f"📄 **Documento:** {cfac_id}\n"
-                f"📋 **Tipo:** {tipo_documento}\n"
-                f"⏳ *Por favor espere...*",
-                parse_mode='Markdown'
+            # Encolar: el worker imprime y el resultado llega como respuesta al mensaje de la cola
+            job, created = await print_queue.submit(
+                'reimpresion', 'LOCAL', tipo_documento, cfac_id,
+                requested_by=str(update.effective_user.username or update.effective_user.id), reason='/reimprimir'
             )
-
-            # Ejecutar reimpresión
-            resultado = self.reimpresion_service.reimprimir_documento(cfac_id, tipo_documento)
-
-            # Enviar resultado
-            if resultado.get('success'):
-                await processing_msg.edit_text(
-                    f"✅ *Impresión exitosa*\n\n"
-                    f"📄 **Documento:** `{cfac_id}`\n"
-                    f"📋 **Tipo:** {tipo_documento}\n"
-                    f"📝 **Constancia:** RE IMPRESIÓN DE DOCUMENTO\n\n"
-                    f"🖨️ *Documento enviado a impresora*",
+            if not created:
+                await update.message.reply_text(
+                    f"ℹ️ *Este documento ya está en la cola de impresión*\n\n"
+                    f"🧾 **Trabajo:** `#{job.id}`\n"
+                    f"🔎 Consulte su estado con `/estado_impresion {job.id}`",
                     parse_mode='Markdown'
                 )
-            else:
-                error_msg = (
-                    f"❌ *Error en impresión*\n\n"
-                    f"📄 **Documento:** `{cfac_id}`\n"
-                    f"⚠️ **Error:** {resultado.get('error', 'Desconocido')}"
-                )
-
-                if resultado.get('requires_support'):
-                    error_msg += "\n\n🚨 **CONTACTE CON SOPORTE TÉCNICO**"
+                return
 
-                await processing_msg.edit_text(error_msg, parse_mode='Markdown')
+            queued_msg = await update.message.reply_text(
+                f"🧾 *Reimpresión en cola*\n\n"
+                f"🔢 **Trabajo:** `#{job.id}`\n"
+                f"📄 **Documento:** `{cfac_id}`\n"
+                f"📋 **Tipo:** `{tipo_documento}`\n\n"
+                f"⏳ *Le avisaremos aquí cuando se imprima.*",
+                parse_mode='Markdown'
+            )
+            await print_queue.attach_message(job.id, queued_msg.chat_id, queued_msg.message_id)
 
         except Exception as e:
             logger.error(f"Error en comando reimprimir: {str(e)}")
@@ -172,8 +170,102 @@ class CommandHandlers:
             f"• ⏰ Última actividad: {datetime.datetime.now().strftime('%H:%M:%S')}"
         )
 
+        pool_stats = db_manager.get_pool_stats()
+        if pool_stats:
+            reporte += "\n\n🗄️ *Pool de conexiones*\n"
+            for store_code, stats in sorted(pool_stats.items()):
+                reporte += (
+                    f"• `{store_code}`: {stats['in_use']} en uso / {stats['idle']} libres - "
+                    f"hits {stats['hits']}, misses {stats['misses']}, esperas {stats['waits']}\n"
+                )
+
+        breaker_states = db_manager.get_breaker_states()
+        open_breakers = {code: data for code, data in breaker_states.items() if data['state'] != 'closed'}
+        if breaker_states:
+            reporte += f"\n🔌 *Circuitos por tienda*: {len(open_breakers)} abiertos de {len(breaker_states)}\n"
+            for store_code, data in sorted(open_breakers.items()):
+                icon = '🟡' if data['state'] == 'half_open' else '🔴'
+                reporte += (
+                    f"{icon} `{store_code}`: `{data['state']}` - próximo sondeo en {data['retry_in']:.0f}s, "
+                    f"{data['rejected']} rechazadas, {data['trips']} aperturas\n"
+                )
+
         await update.message.reply_text(reporte, parse_mode='Markdown')
 
+    async def latencia_tiendas(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Tabla de alcanzabilidad y latencia por tienda según el monitor en segundo plano"""
+        user_id = update.effective_user.id
+
+        if user_id not in settings.bot.admins:
+            await update.message.reply_text("❌ No tienes permisos para esta acción.")
+            return
+
+        entries = store_health.snapshot()
+        if not entries:
+            await update.message.reply_text("🩺 Aún no hay tiendas sondeadas")
+            return
+
+        lines = [f"{'Tienda':<7}{'Estado':<8}{'Latencia':>9}{'Hace':>7}"]
+        for health in entries:
+            lines.append(
+                f"{health.store_code:<7}{'OK' if health.reachable else 'CAIDA':<8}"
+                f"{health.latency * 1000:>7.0f}ms{health.age():>6.0f}s"
+            )
+
+        monitor = store_health.stats
+        await update.message.reply_text(
+            f"🩺 *Latencia por tienda*\n\n```\n" + "\n".join(lines) + "\n```\n"
+            f"Rondas: {monitor['rounds']}, sondeos: {monitor['probes']}, "
+            f"respuestas desde caché: {monitor['cache_answers']}, pruebas en vivo: {monitor['live_checks']}",
+            parse_mode='Markdown'
+        )
+
+    async def estado_impresion(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Estado de un trabajo de la cola de impresión (/estado_impresion <id>) o resumen de la cola"""
+        status_labels = {
+            'pending': '⏳ En cola', 'running': '🖨️ Imprimiendo', 'done': '✅ Impreso',
+            'uncertain': '⚠️ Sin confirmar', 'failed': '❌ Fallido', 'dead': '💀 Intentos agotados'
+        }
+        try:
+            if context.args:
+                job_id = context.args[0].lstrip('#')
+                job = await print_queue.get(int(job_id)) if job_id.isdigit() else None
+                if job is None:
+                    await update.message.reply_text(f"❌ No existe el trabajo de impresión `{context.args[0]}`",
+                                                    parse_mode='Markdown')
+                    return
+
+                text = (
+                    f"🧾 *Trabajo de impresión #{job.id}*\n\n"
+                    f"• Estado: {status_labels.get(job.status, job.status)}\n"
+                    f"• Documento: {job.document_type.replace('_', ' ').title()} `{job.document_id}`\n"
+                    f"• Tienda: `{job.store_code}` - impresora: `{job.printer_key}`\n"
+                    f"• Intentos: {job.attempts}/{job.max_attempts}\n"
+                    f"• Creado: {datetime.datetime.fromtimestamp(job.created_at):%Y-%m-%d %H:%M:%S}"
+                )
+                if job.status == 'pending' and job.attempts:
+                    text += f"\n• Próximo intento: {datetime.datetime.fromtimestamp(job.next_attempt_at):%H:%M:%S}"
+                if job.error:
+                    text += f"\n• Último error: {job.error[:200]}"
+                await update.message.reply_text(text)
+                return
+
+            counts = await print_queue.counts()
+            recent = await print_queue.recent(limit=10)
+            text = "🧾 Cola de impresión\n\n" + "\n".join(
+                f"{label}: {counts.get(status, 0)}" for status, label in status_labels.items()
+            )
+            if recent:
+                text += "\n\nÚltimos trabajos:\n" + "\n".join(
+                    f"#{job.id} {job.store_code} {job.document_type} {job.document_id} - "
+                    f"{status_labels.get(job.status, job.status)}" for job in recent
+                )
+            await update.message.reply_text(text + "\n\nDetalle: /estado_impresion <id>")
+
+        except Exception as e:
+            logger.error(f"Error en comando estado_impresion: {str(e)}")
+            await update.message.reply_text(f"❌ Error consultando la cola de impresión: {str(e)}")
+
     async def estadisticas(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Estadísticas básicas del sistema"""
         user_id = update.effective_user.id
@@ -190,6 +282,98 @@ class CommandHandlers:
             f"• 📊 Consultas hoy: {len(self.activity_records)}"
         )
 
+        render_waits = render_wait_histograms.items()
+        if render_waits:
+            stats += "\n\n⏱️ *Espera de renderizado por tienda*\n"
+            for store_code, histogram in sorted(render_waits):
+                data = histogram.snapshot()
+                stats += (
+                    f"• `{store_code}`: {data['count']} capturas - "
+                    f"prom {data['avg']:.2f}s, p95 ≤{histogram.percentile(95):g}s\n"
+                )
+
+        result_cache = OrderService._result_cache.snapshot()
+        stats += (
+            f"\n\n🗃️ *Caché de consultas*\n"
+            f"• Aciertos: {result_cache['hits']}, fallos: {result_cache['misses']} "
+            f"({result_cache['hit_rate']:.0%} de acierto)\n"
+            f"• Entradas: {result_cache['size']}/{result_cache['max_items']}, "
+            f"expiradas: {result_cache['expired']}, expulsadas: {result_cache['evicted']}, "
+            f"invalidadas: {result_cache['invalidated']}"
+        )
+
+        tiers = OrderService.audit_tier_stats
+        sources = OrderService.status_source_stats
+        stats += (
+            f"\n\n🔎 *Búsquedas por nivel*\n"
+            f"• Estado - tabla esperada: {sources['first']}, respaldo: {sources['fallback']}, "
+            f"por lotes: {sources['batch']}, sin resultados: {sources['none']}\n"
+            f"• Auditoría - exacta: {tiers['exact']}, prefijo: {tiers['prefix']}, "
+            f"subcadena: {tiers['substring']}, sin resultados: {tiers['none']}\n"
+            f"• Canal\\_Movimiento - exacta: {print_lookup_stats['exact']}, "
+            f"LIKE: {print_lookup_stats['like']}, sin registro: {print_lookup_stats['none']}"
+        )
+
+        flights = OrderService._query_flights.stats
+        documents = document_resolver.snapshot()
+        stats += (
+            f"\n\n🔗 *Consultas a tiendas*\n"
+            f"• Ejecutadas: {flights['executed']}, "
+            f"compartidas con otra idéntica en curso: {flights['shared']}\n"
+            f"• Documentos resueltos en caché: {documents['hits']} de {documents['hits'] + documents['misses']} "
+            f"({documents['size']} memorizados)\n"
+        )
+
+        queue = render_scheduler.snapshot()
+        stats += (
+            f"\n🚦 *Fila de renderizado*\n"
+            f"• En curso: {queue['running']}/{queue['global_limit']} - en espera: {queue['waiting']}/{queue['max_queue']}\n"
+            f"• Completadas: {queue['completed']}, fallidas: {queue['failed']}\n"
+            f"• Compartidas: {queue['deduped']}, rechazadas por fila llena: {queue['rejected']}\n"
+        )
+
+        api = http_client.snapshot()
+        stats += (
+            f"\n🖨️ *API de impresión*\n"
+            f"• Peticiones: {api['requests']}, errores de conexión: {api['errors']}, timeouts: {api['timeouts']}\n"
+            f"• Conexiones keep-alive ociosas: {api['idle_connections']}\n"
+        )
+
+        chain = reprint_orchestrator.snapshot()
+        stats += (
+            f"\n🔀 *Cadena de reimpresión*\n"
+            f"• Ejecuciones: {chain['runs']}, unidas a una en curso: {chain['joined']}\n"
+            f"• En paralelo: {chain['hedged']}, resueltas por respaldo: {chain['fallback_wins']}\n"
+            f"• Sin confirmar: {chain['uncertain']}, fallidas: {chain['failed']}\n"
+        )
+
+        jobs = print_queue.snapshot()
+        stats += (
+            f"\n🧾 *Cola de impresión*\n"
+            f"• Encolados: {jobs['enqueued']}, repetidos unidos al existente: {jobs['deduplicated']}\n"
+            f"• Impresos: {jobs['done']}, reintentos: {jobs['retries']}, sin confirmar: {jobs['uncertain']}\n"
+            f"• Fallidos: {jobs['failed']}, agotados: {jobs['dead']} - workers activos: {jobs['workers']}\n"
+        )
+
+        ledger = reprint_ledger.snapshot()
+        stats += (
+            f"\n🧮 *Límite de reimpresiones* (`{ledger['backend']}`)\n"
+            f"• Reservadas: {ledger['reserved']}, rechazadas por límite: {ledger['rejected']}, "
+            f"devueltas: {ledger['released']}\n"
+            f"• Compactadas: {ledger['compacted']}, sin registro disponible: {ledger['unavailable']}, "
+            f"reconexiones: {ledger['reconnects']}\n"
+        )
+
+        if image_cache:
+            cache = image_cache.snapshot()
+            stats += (
+                f"\n🗂️ *Caché de imágenes*\n"
+                f"• Memoria: {cache['memory_hits']} aciertos ({cache['memory_items']} en RAM)\n"
+                f"• Disco: {cache['disk_hits']} aciertos, {cache['disk_evicted']} expulsadas\n"
+                f"• Reenvíos por file\\_id: {cache['file_id_hits']}\n"
+                f"• Fallos: {cache['misses']}\n"
+            )
+
         await update.message.reply_text(stats, parse_mode='Markdown')
 
     async def reporte_avanzado(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -396,6 +580,8 @@ class CommandHandlers:
             CommandHandler("reimprimir", self.handle_reimprimir),
             CommandHandler("reporte_conexiones", self.reporte_conexiones),
             CommandHandler("estadisticas", self.estadisticas),
+            CommandHandler("latencia_tiendas", self.latencia_tiendas),
+            CommandHandler("estado_impresion", self.estado_impresion),
             CommandHandler("reporte_avanzado", self.reporte_avanzado),
             CommandHandler("estadisticas_detalladas", self.estadisticas_detalladas),
             CommandHandler("reporte_diario", self.reporte_diario),
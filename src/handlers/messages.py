@@ -1,15 +1,23 @@
+import io
 import time
 import datetime
-import asyncio
 import re
+from typing import Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.helpers import escape_markdown
 
 from src.config.settings import settings
 from src.config.constants import USER_STATES
+from src.database.connection import db_manager
 from src.utils.logger import logger
-from src.services.order_service import OrderService
+from src.services.order_service import OrderService, image_cache, render_scheduler
+from src.services.render_scheduler import RenderQueueFullError
+from src.services.store_health import store_health
+from src.services.order_search import order_search
 from src.services.print_service import PrintService
+from src.services.print_queue import DONE, UNCERTAIN, FAILED, DEAD, PrintJob, print_queue
+from src.services.reprint_ledger import ReprintLedgerUnavailableError, reprint_ledger
 from src.handlers.callbacks import CallbackHandlers
 from src.services.reimpresion_service import ReimpresionService
 
@@ -21,9 +29,14 @@ class MessageHandlers:
         self.callback_handlers = callback_handlers
         self.user_states = callback_handlers.user_states
         self.user_last_activity = callback_handlers.user_last_activity
-        self.conteo_impresiones = callback_handlers.conteo_impresiones
         self.reimpresion_service = ReimpresionService()
 
+        # Procesadores de la cola de impresión (los trabajos los encolan los handlers)
+        print_queue.register('reprint', lambda job: self.print_service.send_reprint_request(
+            job.document_type, job.store_code, job.document_id))
+        print_queue.register('reimpresion', lambda job: self.reimpresion_service.reimprimir_documento(
+            job.document_id, job.document_type))
+
     async def handle_reimpresion_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Manejar mensajes de reimpresión en formato libre - CORREGIDO"""
         try:
@@ -82,36 +95,9 @@ class MessageHandlers:
                 )
                 return True
 
-            # Procesar reimpresión
-            processing_msg = await update.message.reply_text(
-                f"🔄 *Procesando {action}...*\n\n"
-                f"📄 **Documento:** {cfac_id}\n"
-                f"📋 **Tipo:** {tipo_documento}\n"
-                f"⏳ *Por favor espere...*",
-                parse_mode='Markdown'
-            )
-
-            resultado = self.reimpresion_service.reimprimir_documento(cfac_id, tipo_documento)
-
-            if resultado.get('success'):
-                await processing_msg.edit_text(
-                    f"✅ *Impresión exitosa*\n\n"
-                    f"📄 **Documento:** `{cfac_id}`\n"
-                    f"📋 **Tipo:** {tipo_documento}\n"
-                    f"📝 **Constancia:** RE IMPRESIÓN DE DOCUMENTO\n\n"
-                    f"🖨️ *Documento enviado a impresora*",
-                    parse_mode='Markdown'
-                )
-            else:
-                response = f"❌ *Error en impresión*\n\n"
-                response += f"📄 **Documento:** `{cfac_id}`\n"
-                response += f"⚠️ **Error:** {resultado.get('error', 'Desconocido')}"
-
-                if resultado.get('requires_support'):
-                    response += "\n\n🚨 **CONTACTE CON SOPORTE TÉCNICO**"
-
-                await processing_msg.edit_text(response, parse_mode='Markdown')
-
+            # Encolar la reimpresión: el resultado llega como respuesta a este mensaje
+            await self._enqueue_print_job(update, 'reimpresion', 'LOCAL', tipo_documento, cfac_id,
+                                          reason=action)
             return True
 
         except Exception as e:
@@ -170,6 +156,9 @@ class MessageHandlers:
             elif state['step'] == USER_STATES['GET_ORDER_STATUS']:
                 await self._handle_order_status(update, incoming_msg, state)
 
+            elif state['step'] == USER_STATES['SEARCH_ALL_STORES']:
+                await self._handle_search_all_stores(update, incoming_msg, state)
+
             elif state['step'] == USER_STATES['GET_ORDER_AUDIT']:
                 await self._handle_order_audit(update, incoming_msg, state)
 
@@ -215,6 +204,17 @@ class MessageHandlers:
         try:
             store_code = store_code.upper().strip()
 
+            # Tienda desconocida: buscar la orden en todas
+            if store_code == 'TODAS':
+                self.user_states[user_id] = {'step': USER_STATES['SEARCH_ALL_STORES']}
+                await update.message.reply_text(
+                    "🌐 *Buscar en todas las tiendas*\n\n"
+                    "📝 **Ingresa el número de orden:**\n"
+                    "(Ejemplo: APP123456789)",
+                    parse_mode='Markdown'
+                )
+                return
+
             # Validación simple
             if not store_code.startswith('K') or len(store_code) < 3:
                 await update.message.reply_text(
@@ -233,14 +233,18 @@ class MessageHandlers:
                 parse_mode='Markdown'
             )
 
-            # Test de conexión
-            is_connected = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.order_service.test_store_connection,
-                store_code
-            )
+            # Mapa del monitor de tiendas si está vigente; prueba en vivo solo si no se conoce o venció
+            health = store_health.get(store_code)
+            if health is None:
+                health = await store_health.live_check(store_code)
+            else:
+                logger.info(f"⚡ {store_code} respondido desde el monitor "
+                            f"({'alcanzable' if health.reachable else 'inalcanzable'}, hace {health.age():.0f}s)")
+            is_connected = health.reachable
 
             if is_connected:
+                # Solo una tienda válida y alcanzable entra en el conjunto que sondea el monitor
+                store_health.touch(store_code)
                 await processing_msg.edit_text(
                     f"✅ *¡Conexión exitosa!* 🎉\n\n"
                     f"🏪 **Tienda:** `{store_code}`\n\n"
@@ -279,7 +283,15 @@ class MessageHandlers:
             return
 
         try:
-            status = self.order_service.get_order_status(store_code, order_id)
+            order_ids = self.order_service.parse_order_codes(order_id)
+            if len(order_ids) > 1:
+                await self._reply_order_statuses(update, store_code, order_ids)
+                state['step'] = USER_STATES['MAIN_MENU']
+                await self.callback_handlers.mostrar_menu_principal(update.message)
+                return
+
+            order_id = order_ids[0] if order_ids else order_id.strip()
+            status = await self.order_service.get_order_status(store_code, order_id)
             if status:
                 response_text = self.order_service.format_order_status_response(status, order_id)
                 await update.message.reply_text(response_text, parse_mode='Markdown')
@@ -298,6 +310,85 @@ class MessageHandlers:
         state['step'] = USER_STATES['MAIN_MENU']
         await self.callback_handlers.mostrar_menu_principal(update.message)
 
+    async def _reply_order_statuses(self, update: Update, store_code: str, order_ids: list):
+        """Estado de varios códigos en una consulta: tabla en el chat o archivo si la lista es larga"""
+        max_codes = settings.database.status_batch_max_codes
+        if len(order_ids) > max_codes:
+            await update.message.reply_text(
+                f"⚠️ Se recibieron {len(order_ids)} códigos; se consultan los primeros {max_codes}."
+            )
+            order_ids = order_ids[:max_codes]
+
+        statuses = await self.order_service.get_order_statuses(store_code, order_ids)
+        found = sum(1 for row in statuses.values() if row is not None)
+        table = self.order_service.format_order_statuses_table(statuses)
+        summary = f"📦 *Estado de {len(statuses)} órdenes en {store_code}*\n✅ Encontradas: {found}  ❌ No encontradas: {len(statuses) - found}"
+
+        if len(statuses) <= settings.database.status_batch_inline_rows:
+            await update.message.reply_text(f"{summary}\n\n```\n{table}\n```", parse_mode='Markdown')
+        else:
+            filename = f"estado_ordenes_{store_code}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+            await update.message.reply_document(
+                document=InputFile(io.BytesIO(table.encode('utf-8')), filename=filename),
+                caption=summary,
+                parse_mode='Markdown'
+            )
+
+    async def _handle_search_all_stores(self, update: Update, order_id: str, state: dict):
+        """Busca la orden en todas las tiendas; al encontrarla esa tienda queda como la activa"""
+        order_id = order_id.strip()
+        progress_msg = await update.message.reply_text(
+            f"🌐 *Buscando `{order_id}` en todas las tiendas...*\n\n⏳ *Por favor espere...*",
+            parse_mode='Markdown'
+        )
+
+        async def on_progress(progress: dict):
+            await progress_msg.edit_text(
+                f"🌐 *Buscando `{order_id}` en todas las tiendas...*\n\n"
+                f"🔎 Revisadas: {progress['checked']}/{progress['total']}\n"
+                f"📴 Sin conexión: {progress['offline']}\n"
+                f"⏱️ {progress['elapsed']:.0f}s",
+                parse_mode='Markdown'
+            )
+
+        try:
+            result = await order_search.search(order_id, on_progress=on_progress)
+        except Exception as e:
+            logger.error(f"Error en búsqueda en todas las tiendas: {str(e)}")
+            await progress_msg.edit_text(f"❌ Error buscando la orden: `{str(e)}`", parse_mode='Markdown')
+            state['step'] = USER_STATES['MAIN_MENU'] if state.get('store_code') else USER_STATES['GET_STORE_CODE']
+            return
+
+        if result['success']:
+            store_code = result['store_code']
+            state['store_code'] = store_code
+            store_health.touch(store_code)
+            await progress_msg.edit_text(
+                f"✅ *Orden encontrada en {store_code}* "
+                f"({result['checked']}/{result['total']} tiendas, {result['elapsed']:.1f}s)",
+                parse_mode='Markdown'
+            )
+            await update.message.reply_text(
+                self.order_service.format_order_status_response(result['status'], order_id),
+                parse_mode='Markdown'
+            )
+        else:
+            await progress_msg.edit_text(
+                f"❌ *No se encontró `{order_id}` en ninguna tienda*\n\n"
+                f"🔎 Revisadas: {result['total']}\n"
+                f"📴 Sin conexión: {result['offline']}\n"
+                f"⚠️ Con error: {result['errors']}",
+                parse_mode='Markdown'
+            )
+
+        if state.get('store_code'):
+            state['step'] = USER_STATES['MAIN_MENU']
+            await self.callback_handlers.mostrar_menu_principal(update.message)
+        else:
+            state['step'] = USER_STATES['GET_STORE_CODE']
+            await update.message.reply_text("🔢 **Ingresa código de tienda:**\n(Ejemplo: K002, K080, K100)",
+                                            parse_mode='Markdown')
+
     async def _handle_order_audit(self, update: Update, order_id: str, state: dict):
         """Handle order audit request"""
         store_code = state.get('store_code')
@@ -308,7 +399,7 @@ class MessageHandlers:
             return
 
         try:
-            audit = self.order_service.audit_order(store_code, order_id)
+            audit = await self.order_service.audit_order(store_code, order_id)
             if audit:
                 response_text = self.order_service.format_audit_response(audit, order_id)
                 await update.message.reply_text(response_text, parse_mode='Markdown')
@@ -336,29 +427,49 @@ class MessageHandlers:
             await self.callback_handlers.mostrar_menu_principal(update.message)
             return
 
+        caption = f"🧾 *Factura:* `{cfac_id}`\n🏪 *Tienda:* `{store_code}`"
         try:
+            if await self._reply_cached_photo(update, store_code, 'factura', cfac_id, caption):
+                state['step'] = USER_STATES['MAIN_MENU']
+                await self.callback_handlers.mostrar_menu_principal(update.message)
+                return
+
             processing_msg = await update.message.reply_text(
                 "📸 *Generando imagen de factura...*\n\n"
                 "⏳ *Por favor espere...*",
                 parse_mode='Markdown'
             )
 
-            image_buffer = await asyncio.get_event_loop().run_in_executor(
-                None,
+            image_buffer = await render_scheduler.submit(
+                store_code,
+                ('factura', store_code, cfac_id),
                 self.order_service.generate_invoice_image,
                 store_code,
-                cfac_id
+                cfac_id,
+                on_queued=lambda position: processing_msg.edit_text(
+                    "📸 *Generando imagen de factura...*\n\n"
+                    f"⏳ *Está #{position} en la fila, por favor espere...*",
+                    parse_mode='Markdown'
+                )
             )
 
             if image_buffer and image_buffer.getbuffer().nbytes > 100:
-                await update.message.reply_photo(
+                sent = await update.message.reply_photo(
                     photo=InputFile(image_buffer, filename=f"factura_{cfac_id}.png"),
-                    caption=f"🧾 *Factura:* `{cfac_id}`\n🏪 *Tienda:* `{store_code}`",
+                    caption=caption,
                     parse_mode='Markdown'
                 )
+                if image_cache and sent.photo:
+                    image_cache.set_file_id(store_code, 'factura', cfac_id, sent.photo[-1].file_id)
                 await processing_msg.delete()
             else:
                 await processing_msg.edit_text("❌ No se pudo generar la imagen de la factura")
+        except RenderQueueFullError as e:
+            logger.warning(f"🚦 {str(e)} - tienda {store_code}")
+            await processing_msg.edit_text(
+                "🚦 *Hay muchas imágenes en proceso.*\n\nIntente nuevamente en unos segundos.",
+                parse_mode='Markdown'
+            )
         except Exception as e:
             logger.error(f"Error generando imagen: {str(e)}")
             await update.message.reply_text(f"❌ Error: {str(e)}")
@@ -375,29 +486,57 @@ class MessageHandlers:
             await self.callback_handlers.mostrar_menu_principal(update.message)
             return
 
+        caption = f"🍔 *Comanda:* `{cfac_id}`\n🏪 *Tienda:* `{store_code}`"
         try:
+            if await self._reply_cached_photo(update, store_code, 'comanda', cfac_id, caption):
+                state['step'] = USER_STATES['MAIN_MENU']
+                await self.callback_handlers.mostrar_menu_principal(update.message)
+                return
+
             processing_msg = await update.message.reply_text(
                 "📸 *Generando imagen de comanda...*\n\n"
                 "⏳ *Por favor espere...*",
                 parse_mode='Markdown'
             )
 
-            image_buffer = await asyncio.get_event_loop().run_in_executor(
-                None,
+            # La URL (ODP de la tienda) se resuelve en el event loop, coalescida con consultas idénticas;
+            # si falla, la imagen de error se genera igual sin URL
+            try:
+                comanda_url = await self.order_service.get_comanda_url(store_code, cfac_id)
+            except Exception:
+                comanda_url = None
+
+            image_buffer = await render_scheduler.submit(
+                store_code,
+                ('comanda', store_code, cfac_id),
                 self.order_service.generate_comanda_image,
                 store_code,
-                cfac_id
+                cfac_id,
+                comanda_url,
+                on_queued=lambda position: processing_msg.edit_text(
+                    "📸 *Generando imagen de comanda...*\n\n"
+                    f"⏳ *Está #{position} en la fila, por favor espere...*",
+                    parse_mode='Markdown'
+                )
             )
 
             if image_buffer and image_buffer.getbuffer().nbytes > 100:
-                await update.message.reply_photo(
+                sent = await update.message.reply_photo(
                     photo=InputFile(image_buffer, filename=f"comanda_{cfac_id}.png"),
-                    caption=f"🍔 *Comanda:* `{cfac_id}`\n🏪 *Tienda:* `{store_code}`",
+                    caption=caption,
                     parse_mode='Markdown'
                 )
+                if image_cache and sent.photo:
+                    image_cache.set_file_id(store_code, 'comanda', cfac_id, sent.photo[-1].file_id)
                 await processing_msg.delete()
             else:
                 await processing_msg.edit_text("❌ No se pudo generar la imagen de la comanda")
+        except RenderQueueFullError as e:
+            logger.warning(f"🚦 {str(e)} - tienda {store_code}")
+            await processing_msg.edit_text(
+                "🚦 *Hay muchas imágenes en proceso.*\n\nIntente nuevamente en unos segundos.",
+                parse_mode='Markdown'
+            )
         except Exception as e:
             logger.error(f"Error generando comanda: {str(e)}")
             await update.message.reply_text(f"❌ Error: {str(e)}")
@@ -405,6 +544,23 @@ class MessageHandlers:
         state['step'] = USER_STATES['MAIN_MENU']
         await self.callback_handlers.mostrar_menu_principal(update.message)
 
+    async def _reply_cached_photo(self, update: Update, store_code: str, doc_type: str,
+                                  cfac_id: str, caption: str) -> bool:
+        """Reenvía una imagen ya subida a Telegram usando su file_id; False si no hay o fue rechazado"""
+        if not image_cache:
+            return False
+        file_id = image_cache.get_file_id(store_code, doc_type, cfac_id)
+        if not file_id:
+            return False
+        try:
+            await update.message.reply_photo(photo=file_id, caption=caption, parse_mode='Markdown')
+            logger.info(f"⚡ {doc_type} {cfac_id} reenviada por file_id sin volver a subir")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ file_id de {doc_type} {cfac_id} rechazado, se regenera: {str(e)}")
+            image_cache.invalidate_file_id(store_code, doc_type, cfac_id)
+            return False
+
     async def _handle_associated_code(self, update: Update, cfac_id: str, state: dict):
         """Handle associated code request"""
         store_code = state.get('store_code')
@@ -415,7 +571,7 @@ class MessageHandlers:
             return
 
         try:
-            codigo_asociado = self.order_service.get_associated_code(store_code, cfac_id)
+            codigo_asociado = await self.order_service.get_associated_code(store_code, cfac_id)
             if codigo_asociado:
                 await update.message.reply_text(
                     f'🔍 *Código Asociado Encontrado*\n\n'
@@ -516,12 +672,21 @@ class MessageHandlers:
                 await self.callback_handlers.mostrar_menu_principal(update.message)
                 return
 
-            # Verificar límites de reimpresión
-            reprint_key = f'{document_type}_{document_id}'
-            current_count = self.conteo_impresiones.get(reprint_key, 0)
+            # Verificar límite y reservar la reimpresión en un solo paso (compartido entre instancias)
             max_reprints = self.print_service.get_max_reprints(document_type)
+            try:
+                allowed, _ = await reprint_ledger.try_reserve(document_type, document_id, max_reprints)
+            except ReprintLedgerUnavailableError as e:
+                # Sin el registro compartido no se puede garantizar el límite: no se reimprime
+                logger.error(f"❌ Reimpresión de {document_id} rechazada: {str(e)}")
+                await update.message.reply_text(
+                    '⚠️ *Registro de re-impresiones no disponible*\n\n'
+                    'No se puede verificar el límite en este momento. Intente de nuevo en unos minutos.',
+                    parse_mode='Markdown'
+                )
+                return
 
-            if current_count >= max_reprints:
+            if not allowed:
                 await update.message.reply_text(
                     f'❌ *Límite de re-impresiones alcanzado*\n\n'
                     f'📄 **Documento:** `{document_id}`\n'
@@ -535,17 +700,6 @@ class MessageHandlers:
                 await self.callback_handlers.mostrar_menu_principal(update.message)
                 return
 
-            # Mostrar mensaje de procesamiento
-            processing_msg = await update.message.reply_text(
-                f"🖨️ *Procesando re-impresión...*\n\n"
-                f"📄 **Documento:** {document_type.replace('_', ' ').title()}\n"
-                f"🔢 **ID:** `{document_id}`\n"
-                f"🏪 **Tienda:** `{store_code}`\n"
-                f"📋 **Motivo:** {motivo}\n\n"
-                f"⏳ *Por favor espere...*",
-                parse_mode='Markdown'
-            )
-
             # Registrar intento de reimpresión
             log_message = (
                 f'Re-impresión solicitada - '
@@ -557,41 +711,16 @@ class MessageHandlers:
             )
             logger.info(log_message)
 
-            # Enviar solicitud de reimpresión
-            result = await self.print_service.send_reprint_request(
-                document_type, store_code, document_id
-            )
-
-            # Actualizar contador si fue exitoso
-            if result.get('success'):
-                self.conteo_impresiones[reprint_key] = current_count + 1
-
-            # Mostrar resultado
-            await processing_msg.delete()
-
-            if result.get('success'):
-                await update.message.reply_text(
-                    f'✅ *Re-impresión Exitosa*\n\n'
-                    f'📄 **Documento:** `{document_id}`\n'
-                    f'📋 **Tipo:** {document_type.replace("_", " ").title()}\n'
-                    f'🏪 **Tienda:** `{store_code}`\n\n'
-                    f'🖨️ *El documento ha sido enviado a la impresora*\n\n'
-                    f'📝 **Constancia:** RE IMPRESIÓN DE DOCUMENTO',
-                    parse_mode='Markdown'
-                )
-            else:
-                error_message = (
-                    f'❌ *Error en Re-impresión*\n\n'
-                    f'📄 **Documento:** `{document_id}`\n'
-                    f'📋 **Tipo:** {document_type.replace("_", " ").title()}\n'
-                    f'🏪 **Tienda:** `{store_code}`\n\n'
-                    f'⚠️ **Error:** {result.get("message", "Error desconocido")}'
-                )
-
-                if result.get('requires_support', False):
-                    error_message += '\n\n🚨 **CONTACTE CON SOPORTE TÉCNICO**'
-
-                await update.message.reply_text(error_message, parse_mode='Markdown')
+            # Encolar: el worker imprime y el resultado llega como respuesta al mensaje de la cola
+            try:
+                _, created = await self._enqueue_print_job(update, 'reprint', store_code, document_type,
+                                                           document_id, reason=motivo)
+            except Exception:
+                await reprint_ledger.release(document_type, document_id)
+                raise
+            if not created:
+                # El trabajo que ya estaba en cola tiene su propia reserva
+                await reprint_ledger.release(document_type, document_id)
 
         except Exception as e:
             logger.error(f"Error en handle_reprint_reason: {str(e)}")
@@ -608,6 +737,85 @@ class MessageHandlers:
             state['step'] = USER_STATES['MAIN_MENU']
             await self.callback_handlers.mostrar_menu_principal(update.message)
 
+    async def _enqueue_print_job(self, update: Update, kind: str, store_code: str, document_type: str,
+                                 document_id: str, reason: str = '') -> Tuple[PrintJob, bool]:
+        """Encola la impresión y responde al instante con el número de trabajo; retorna (trabajo, creado)"""
+        job, created = await print_queue.submit(
+            kind, store_code, document_type, document_id,
+            requested_by=str(update.effective_user.username or update.effective_user.id), reason=reason
+        )
+
+        if not created:
+            await update.message.reply_text(
+                f"ℹ️ *Este documento ya está en la cola de impresión*\n\n"
+                f"🧾 **Trabajo:** `#{job.id}`\n"
+                f"📄 **Documento:** `{document_id}`\n\n"
+                f"🔎 Consulte su estado con `/estado_impresion {job.id}`",
+                parse_mode='Markdown'
+            )
+            return job, False
+
+        queued_msg = await update.message.reply_text(
+            f"🧾 *Re-impresión en cola*\n\n"
+            f"🔢 **Trabajo:** `#{job.id}`\n"
+            f"📄 **Documento:** {document_type.replace('_', ' ').title()} `{document_id}`\n"
+            f"🏪 **Tienda:** `{job.store_code}`\n\n"
+            f"⏳ *Le avisaremos aquí cuando se imprima.*\n"
+            f"🔎 Estado: `/estado_impresion {job.id}`",
+            parse_mode='Markdown'
+        )
+        await print_queue.attach_message(job.id, queued_msg.chat_id, queued_msg.message_id)
+        return job, True
+
+    async def notify_print_job(self, bot, job: PrintJob):
+        """Avisa en el chat el resultado de un trabajo de la cola de impresión (notifier de print_queue)"""
+        result = job.result or {}
+        document_label = job.document_type.replace('_', ' ').title()
+
+        if job.status in (DONE, UNCERTAIN):
+            OrderService.invalidate_document(job.document_id)
+        elif job.kind == 'reprint' and job.status in (FAILED, DEAD):
+            # No imprimió: se devuelve la reimpresión reservada al encolar
+            # (si pudo haber impreso sin confirmación, la reserva se mantiene)
+            await reprint_ledger.release(job.document_type, job.document_id)
+
+        if job.status == DONE:
+            text = (
+                f'✅ *Re-impresión Exitosa* (trabajo `#{job.id}`)\n\n'
+                f'📄 **Documento:** `{job.document_id}`\n'
+                f'📋 **Tipo:** {document_label}\n'
+                f'🏪 **Tienda:** `{job.store_code}`\n\n'
+                f'🖨️ *El documento ha sido enviado a la impresora*\n\n'
+                f'📝 **Constancia:** RE IMPRESIÓN DE DOCUMENTO'
+            )
+        else:
+            # El detalle viene de excepciones/servicios (puede traer _ o *): se escapa para no romper el Markdown
+            error = result.get("message") or result.get("error") or job.error or "Error desconocido"
+            text = (
+                f'❌ *Error en Re-impresión* (trabajo `#{job.id}`)\n\n'
+                f'📄 **Documento:** `{job.document_id}`\n'
+                f'📋 **Tipo:** {document_label}\n'
+                f'🏪 **Tienda:** `{job.store_code}`\n\n'
+                f'⚠️ **Error:** {escape_markdown(str(error), version=1)}'
+            )
+            if job.status == UNCERTAIN:
+                text = text.replace('❌ *Error en Re-impresión*', '⚠️ *Re-impresión sin confirmar*', 1)
+                text += '\n\n🖨️ Verifique la impresora antes de volver a intentar'
+            elif job.status == DEAD:
+                text += f'\n\n🔁 Se agotaron los {job.attempts} intentos'
+            if result.get('requires_support', False) or job.status == DEAD:
+                text += '\n\n🚨 **CONTACTE CON SOPORTE TÉCNICO**'
+
+        if job.chat_id is None:
+            return
+        try:
+            await bot.send_message(job.chat_id, text, parse_mode='Markdown', reply_to_message_id=job.message_id)
+        except Exception as e:
+            # El mensaje de la cola pudo haberse borrado o el Markdown no se pudo interpretar:
+            # se envía como texto plano sin responderlo para que el aviso llegue siempre
+            logger.warning(f"⚠️ No se pudo responder al mensaje del trabajo #{job.id}: {str(e)}")
+            await bot.send_message(job.chat_id, text)
+
     def get_handlers(self):
         """Get all message handlers"""
         return [
@@ -1,4 +1,5 @@
 # src/handlers/reprint_handler.py
+import asyncio
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
@@ -44,7 +45,13 @@ class ReprintHandler:
             )
 
             # Ejecutar reimpresión
-            resultado = self.impresion_service.reimprimir_documento(cfac_id, tipo_documento, ip_estacion)
+            resultado = await asyncio.get_running_loop().run_in_executor(
+                None,
+                self.impresion_service.reimprimir_documento,
+                cfac_id,
+                tipo_documento,
+                ip_estacion
+            )
 
             # Enviar resultado
             if resultado.get('success'):
@@ -94,7 +101,13 @@ class ReprintHandler:
 
             # Procesar reimpresión
             processing_msg = await update.message.reply_text(f"🔄 Procesando {cfac_id}...")
-            resultado = self.impresion_service.reimprimir_documento(cfac_id, tipo_documento, ip_estacion)
+            resultado = await asyncio.get_running_loop().run_in_executor(
+                None,
+                self.impresion_service.reimprimir_documento,
+                cfac_id,
+                tipo_documento,
+                ip_estacion
+            )
 
             # Responder resultado
             if resultado.get('success'):
@@ -10,6 +10,13 @@ from src.handlers.commands import CommandHandlers
 from src.handlers.messages import MessageHandlers
 from src.handlers.callbacks import CallbackHandlers
 from src.services.image_service import image_service
+from src.services.order_service import OrderService, browser_pool, render_scheduler
+from src.database.connection import db_manager
+from src.services.store_health import store_health
+from src.services.order_search import order_search
+from src.services.http_client import http_client
+from src.services.print_queue import print_queue
+from src.services.reprint_ledger import reprint_ledger
 from src.services.report_service import ReportService
 
 # AGREGAR ESTAS IMPORTACIONES NUEVAS
@@ -133,9 +140,20 @@ class KFCBot:
             # Initialize application
             await self.application.initialize()
 
+            # Arrancar los navegadores de captura fuera del camino de las peticiones
+            browser_pool.warm_up()
+
             # Start polling with proper shutdown handling
             await self.application.start()
 
+            # Sondeo periódico de las tiendas usadas recientemente
+            store_health.start()
+
+            # Workers de la cola de impresión; el resultado de cada trabajo se avisa en su chat
+            await print_queue.start(
+                notifier=lambda job: self.message_handlers.notify_print_job(self.application.bot, job)
+            )
+
             logger.info("Bot started successfully - Waiting for messages...")
 
             # Keep the bot running until stop event is set
@@ -211,6 +229,10 @@ Total: ${order_data.get('total', '0')}
             # Signal the stop event
             self._stop_event.set()
 
+            await store_health.stop()
+            await print_queue.stop()
+            reprint_ledger.close()
+
             if self.application:
                 if self.application.running:
                     await self.application.stop()
@@ -222,6 +244,20 @@ Total: ${order_data.get('total', '0')}
         # Cleanup image service
         image_service.cleanup()
 
+        # Detener la fila de renderizado y cerrar navegadores del pool de capturas
+        render_scheduler.shutdown()
+        OrderService.cleanup()
+
+        # Cerrar las conexiones keep-alive con la API de impresión
+        try:
+            await http_client.close()
+        except Exception as e:
+            logger.error(f"Error cerrando cliente HTTP: {str(e)}")
+
+        # Detener el executor de BD y cerrar conexiones ociosas de los pools
+        order_search.shutdown()
+        db_manager.shutdown()
+
         logger.info("Bot shutdown completed")
 
 
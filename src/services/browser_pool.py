@@ -0,0 +1,200 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+from src.utils.logger import logger
+
+
+class BrowserLeaseTimeoutError(Exception):
+    """Ningún navegador quedó libre dentro del tiempo de espera"""
+
+
+class BrowserWorker:
+    """Instancia de Chrome del pool y cuántas capturas lleva"""
+    __slots__ = ('driver', 'renders', 'started_at')
+
+    def __init__(self, driver: Any):
+        self.driver = driver
+        self.renders = 0
+        self.started_at = time.monotonic()
+
+
+class BrowserPool:
+    """Pool de navegadores headless pre-calentados que se prestan por captura"""
+
+    # Tamaño con el que se abre Chrome; se restaura al devolver el navegador
+    DEFAULT_WINDOW_SIZE = (1920, 1080)
+
+    def __init__(self, factory: Callable[[], Any], size: int, max_renders: int, lease_timeout: float):
+        self._factory = factory
+        self.size = max(1, size)
+        self.max_renders = max(1, max_renders)
+        self.lease_timeout = lease_timeout
+
+        self._idle: List[BrowserWorker] = []
+        self._total = 0  # navegadores vivos + arrancando
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {'leases': 0, 'cold_starts': 0, 'recycled': 0, 'crashed': 0, 'waits': 0}
+
+    def warm_up(self):
+        """Arranca en segundo plano los navegadores que falten hasta completar el pool"""
+        with self._cond:
+            missing = self.size - self._total
+            self._total += max(0, missing)
+
+        for _ in range(max(0, missing)):
+            threading.Thread(target=self._spawn, name='browser-warmup', daemon=True).start()
+
+        if missing > 0:
+            logger.info(f"🌐 Pre-calentando {missing} navegador(es) para capturas")
+
+    @contextmanager
+    def lease(self):
+        """Presta un navegador en exclusiva; se recicla al llegar a max_renders o si se cae"""
+        worker = self._acquire()
+        healthy = True
+        try:
+            yield worker.driver
+        except Exception:
+            healthy = self._is_alive(worker)
+            raise
+        finally:
+            worker.renders += 1
+            if healthy:
+                healthy = self._reset(worker)
+            self._release(worker, recycle=not healthy or worker.renders >= self.max_renders,
+                          crashed=not healthy)
+
+    def close(self):
+        """Cierra todos los navegadores libres; los prestados se cierran al devolverse"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+
+        for worker in idle:
+            self._quit(worker)
+        logger.info("✅ Pool de navegadores cerrado")
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._cond:
+            data = dict(self.stats)
+            data.update({'idle': len(self._idle), 'total': self._total, 'size': self.size})
+        return data
+
+    def _acquire(self) -> BrowserWorker:
+        deadline = time.monotonic() + self.lease_timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise BrowserLeaseTimeoutError("El pool de navegadores está cerrado")
+                if self._idle:
+                    worker = self._idle.pop()
+                    self.stats['leases'] += 1
+                    return worker
+                if self._total < self.size:
+                    # Sin navegador caliente disponible: arranque en frío en este hilo
+                    self._total += 1
+                    self.stats['cold_starts'] += 1
+                    break
+
+                if not waited:
+                    self.stats['waits'] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BrowserLeaseTimeoutError(
+                        f"Sin navegadores libres tras {self.lease_timeout}s ({self.size} en uso)"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            worker = BrowserWorker(self._factory())
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self.stats['leases'] += 1
+        return worker
+
+    def _release(self, worker: BrowserWorker, recycle: bool, crashed: bool):
+        if not recycle:
+            with self._cond:
+                if not self._closed:
+                    self._idle.append(worker)
+                    self._cond.notify()
+                    return
+                self._total -= 1
+            self._quit(worker)
+            return
+
+        with self._cond:
+            self.stats['recycled'] += 1
+            if crashed:
+                self.stats['crashed'] += 1
+            replace = not self._closed
+            if not replace:
+                self._total -= 1
+
+        reason = "caído" if crashed else f"{worker.renders} capturas"
+        logger.info(f"♻️ Reciclando navegador ({reason})")
+
+        # El reemplazo arranca fuera del camino de la petición del usuario
+        threading.Thread(target=self._replace, args=(worker, replace), name='browser-recycle',
+                         daemon=True).start()
+
+    def _replace(self, worker: BrowserWorker, replace: bool):
+        self._quit(worker)
+        if replace:
+            self._spawn()
+
+    def _spawn(self):
+        """Crea un navegador (con su cupo ya reservado en _total) y lo deja libre"""
+        try:
+            worker = BrowserWorker(self._factory())
+        except Exception as e:
+            logger.error(f"❌ No se pudo arrancar navegador para el pool: {str(e)}")
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            if not self._closed:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._total -= 1
+        self._quit(worker)
+
+    def _reset(self, worker: BrowserWorker) -> bool:
+        """Deja el navegador en blanco y con el tamaño inicial para la próxima captura"""
+        try:
+            worker.driver.get('about:blank')
+            worker.driver.set_window_size(*self.DEFAULT_WINDOW_SIZE)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _is_alive(worker: BrowserWorker) -> bool:
+        try:
+            worker.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(worker: BrowserWorker):
+        try:
+            worker.driver.quit()
+        except Exception:
+            pass
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from src.config.settings import settings
+from src.database.connection import db_manager
+from src.database.queries import DOCUMENT_IDENTITY_QUERY
+from src.utils.logger import logger
+from src.utils.singleflight import SingleFlight, AsyncSingleFlight
+from src.utils.ttl_cache import TTLCache
+
+
+@dataclass(frozen=True)
+class DocumentIdentity:
+    """Lo que identifica a una factura en la tienda"""
+    store_code: str
+    cfac_id: str
+    odp_id: Optional[str]
+    codigo_app: Optional[str]
+    origin: str  # 'delivery' (Cabecera_App), 'pickup' o 'local'
+
+
+class DocumentResolver:
+    """
+    Resuelve cfac_id -> odp_id, codigo_app y origen una sola vez y memoriza la respuesta.
+    Lo comparten la generación de comandas, las reimpresiones y el análisis de fallos.
+    """
+
+    _NOT_FOUND = object()
+
+    def __init__(self, max_items: int, ttl: float, not_found_ttl: float):
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        self._cache = TTLCache(max_items=max_items)
+        self._flights = AsyncSingleFlight()
+        self._sync_flights = SingleFlight()
+
+    def resolve(self, store_code: str, cfac_id: str) -> Optional[DocumentIdentity]:
+        """Versión síncrona, para hilos de renderizado"""
+        key = self._key(store_code, cfac_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return None if cached is self._NOT_FOUND else cached
+
+        results = self._sync_flights.do(
+            key, lambda: db_manager.execute_query(store_code, DOCUMENT_IDENTITY_QUERY, (cfac_id,))
+        )
+        return self._remember(key, store_code, cfac_id, results)
+
+    async def resolve_async(self, store_code: str, cfac_id: str,
+                            query: Optional[Callable[[str, str, tuple], Awaitable[List]]] = None
+                            ) -> Optional[DocumentIdentity]:
+        """
+        `query(store_code, sql, params)` ejecuta la consulta si no está memorizada; por defecto
+        db_manager.execute_query_async (OrderService pasa la suya para coalescer con sus consultas).
+        """
+        key = self._key(store_code, cfac_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return None if cached is self._NOT_FOUND else cached
+
+        query = query or db_manager.execute_query_async
+        results = await self._flights.do(
+            key, lambda: query(store_code, DOCUMENT_IDENTITY_QUERY, (cfac_id,))
+        )
+        return self._remember(key, store_code, cfac_id, results)
+
+    def snapshot(self):
+        return self._cache.snapshot()
+
+    @staticmethod
+    def _key(store_code: str, cfac_id: str) -> tuple:
+        return store_code.strip().upper(), str(cfac_id).strip()
+
+    def _remember(self, key: tuple, store_code: str, cfac_id: str, results) -> Optional[DocumentIdentity]:
+        if not results:
+            # Puede ser una factura recién emitida: se recuerda poco tiempo
+            self._cache.set(key, self._NOT_FOUND, self.not_found_ttl)
+            logger.warning(f"⚠️ Documento {cfac_id} no encontrado en Cabecera_Factura de {store_code}")
+            return None
+
+        odp_id, codigo_delivery, codigo_pickup = results[0]
+        if codigo_delivery:
+            origin = 'delivery'
+        elif codigo_pickup:
+            origin = 'pickup'
+        else:
+            origin = 'local'
+
+        identity = DocumentIdentity(
+            store_code=key[0],
+            cfac_id=key[1],
+            odp_id=odp_id,
+            codigo_app=codigo_delivery or codigo_pickup,
+            origin=origin
+        )
+        self._cache.set(key, identity, self.ttl)
+        return identity
+
+
+# Global resolver instance
+document_resolver = DocumentResolver(
+    max_items=settings.query_cache.document_max_items,
+    ttl=settings.query_cache.document_ttl,
+    not_found_ttl=settings.query_cache.not_found_ttl
+)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from src.config.settings import settings
+from src.utils.logger import logger
+
+
+class RequestNotSentError(aiohttp.ClientConnectionError):
+    """
+    La petición falló antes de enviar sus cabeceras (conexión rechazada, plazo de conexión
+    agotado, DNS): el servidor no recibió nada y reintentar es seguro.
+    """
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    text: str
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class HttpClient:
+    """
+    Cliente HTTP asíncrono compartido con pool de conexiones keep-alive.
+    La sesión se crea en el event loop la primera vez que se usa; el conector limita las
+    conexiones simultáneas y cada petición tiene su plazo total (incluida la espera de conexión).
+    """
+
+    def __init__(self, max_connections: int, max_per_host: int, keepalive: float,
+                 timeout: float, connect_timeout: float):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'timeouts': 0}
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=self.max_connections,
+                        limit_per_host=self.max_per_host,
+                        keepalive_timeout=self.keepalive,
+                        ttl_dns_cache=300
+                    )
+                    # Marca en el contexto de cada petición si sus cabeceras ya salieron hacia el servidor
+                    trace = aiohttp.TraceConfig()
+                    trace.on_request_headers_sent.append(self._on_headers_sent)
+                    self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+        return self._session
+
+    @staticmethod
+    async def _on_headers_sent(session, trace_config_ctx, params):
+        if trace_config_ctx.trace_request_ctx is not None:
+            trace_config_ctx.trace_request_ctx['sent'] = True
+
+    async def post_json(self, url: str, payload: Any, timeout: Optional[float] = None,
+                        headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        """
+        POST con cuerpo JSON. Lanza RequestNotSentError si falló antes de enviar la petición;
+        después de enviada, asyncio.TimeoutError al superar el plazo y aiohttp.ClientError si la
+        conexión se cortó (en ambos casos el servidor pudo haberla procesado).
+        """
+        session = await self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout, sock_connect=self.connect_timeout)
+        request_ctx = {'sent': False}
+        self.stats['requests'] += 1
+        try:
+            async with session.post(url, json=payload, timeout=client_timeout, trace_request_ctx=request_ctx,
+                                    headers=headers or {'Content-Type': 'application/json'}) as response:
+                return HttpResponse(response.status, await response.text())
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            if not request_ctx['sent']:
+                # ServerTimeoutError de sock_connect también es TimeoutError: se distingue por la fase
+                self.stats['errors'] += 1
+                raise RequestNotSentError(str(e) or type(e).__name__) from e
+            self.stats['timeouts' if isinstance(e, asyncio.TimeoutError) else 'errors'] += 1
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = dict(self.stats)
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        # Conexiones keep-alive ociosas listas para reutilizar
+        data['idle_connections'] = (sum(len(conns) for conns in connector._conns.values())
+                                    if connector is not None else 0)
+        return data
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("🔌 Cliente HTTP cerrado")
+        self._session = None
+
+
+# Global HTTP client (API de impresión)
+http_client = HttpClient(
+    max_connections=settings.print.api_max_connections,
+    max_per_host=settings.print.api_max_connections,
+    keepalive=settings.print.api_keepalive,
+    timeout=settings.print.api_timeout,
+    connect_timeout=settings.print.api_connect_timeout
+)
@@ -0,0 +1,271 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from src.utils.logger import logger
+
+
+class ImageCache:
+    """
+    Caché de imágenes de documentos (factura/comanda) en dos niveles:
+    LRU en memoria para los documentos más pedidos y disco con expulsión por tamaño.
+    Cada entrada se direcciona por el SHA-256 de (tienda, tipo, id) y guarda además el
+    file_id de Telegram tras el primer envío, para reenviar sin volver a subir la imagen.
+    El tamaño en disco se lleva como un total acumulado (un solo recorrido al arrancar): el
+    directorio solo se recorre de nuevo cuando hay que expulsar.
+    """
+
+    # Al pasar el límite se expulsa hasta esta fracción, para no recorrer el disco en cada escritura
+    _EVICT_TARGET = 0.9
+
+    def __init__(self, directory: str, memory_items: int, disk_max_bytes: int, ttl: float):
+        self.directory = directory
+        self.memory_items = max(0, memory_items)
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl = ttl
+
+        self._memory: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._file_ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_ready = False
+        self._disk_bytes: Optional[int] = None
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0,
+                      'file_id_hits': 0, 'disk_evicted': 0}
+
+    @staticmethod
+    def make_key(store_code: str, doc_type: str, doc_id: str) -> str:
+        raw = f"{store_code.strip().upper()}|{doc_type}|{str(doc_id).strip()}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, store_code: str, doc_type: str, doc_id: str) -> Optional[io.BytesIO]:
+        """Retorna la imagen cacheada (memoria y luego disco) o None"""
+        key = self.make_key(store_code, doc_type, doc_id)
+        now = time.time()
+
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                data, stored_at = item
+                if now - stored_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return io.BytesIO(data)
+                del self._memory[key]
+
+        data, stored_at = self._read_disk(key, now)
+        with self._lock:
+            if data is None:
+                self.stats['misses'] += 1
+                self._file_ids.pop(key, None)
+                return None
+            self.stats['disk_hits'] += 1
+            self._remember_locked(key, data, stored_at)
+        return io.BytesIO(data)
+
+    def put(self, store_code: str, doc_type: str, doc_id: str, image: io.BytesIO):
+        """Guarda una imagen generada correctamente; las imágenes de error no se cachean"""
+        key = self.make_key(store_code, doc_type, doc_id)
+        data = image.getvalue()
+        now = time.time()
+
+        with self._lock:
+            self._remember_locked(key, data, now)
+            self._file_ids.pop(key, None)  # imagen nueva -> file_id viejo ya no corresponde
+            self.stats['stores'] += 1
+
+        self._write_disk(key, data)
+
+    def get_file_id(self, store_code: str, doc_type: str, doc_id: str) -> Optional[str]:
+        """file_id de Telegram de una imagen ya enviada y aún vigente en la caché"""
+        key = self.make_key(store_code, doc_type, doc_id)
+        with self._lock:
+            file_id = self._file_ids.get(key)
+            item = self._memory.get(key)
+        now = time.time()
+
+        if item is not None:
+            fresh = now - item[1] <= self.ttl
+        else:
+            try:
+                fresh = now - os.path.getmtime(self._path(key, '.png')) <= self.ttl
+            except OSError:
+                fresh = False
+        if not fresh:
+            return None
+
+        if file_id is None:
+            file_id = self._read_file_id(key)
+            if file_id is None:
+                return None
+        with self._lock:
+            self._file_ids[key] = file_id
+            self.stats['file_id_hits'] += 1
+        return file_id
+
+    def set_file_id(self, store_code: str, doc_type: str, doc_id: str, file_id: str):
+        """Asocia el file_id de Telegram; se ignora si la imagen no está cacheada (p. ej. imagen de error)"""
+        key = self.make_key(store_code, doc_type, doc_id)
+        with self._lock:
+            cached = key in self._memory
+        if not cached and not os.path.exists(self._path(key, '.png')):
+            return
+
+        with self._lock:
+            self._file_ids[key] = file_id
+        try:
+            with open(self._path(key, '.fid'), 'w', encoding='utf-8') as f:
+                f.write(file_id)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar file_id en caché: {str(e)}")
+
+    def invalidate_file_id(self, store_code: str, doc_type: str, doc_id: str):
+        """Olvida un file_id que Telegram ya no acepta"""
+        key = self.make_key(store_code, doc_type, doc_id)
+        with self._lock:
+            self._file_ids.pop(key, None)
+        self._remove(self._path(key, '.fid'))
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            data = dict(self.stats)
+            data['memory_items'] = len(self._memory)
+        return data
+
+    def _remember_locked(self, key: str, data: bytes, stored_at: float):
+        if not self.memory_items:
+            return
+        self._memory[key] = (data, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _ensure_directory(self) -> bool:
+        if not self._disk_ready:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                self._disk_ready = True
+            except OSError as e:
+                logger.warning(f"⚠️ Caché de imágenes sin disco ({self.directory}): {str(e)}")
+        return self._disk_ready
+
+    def _read_disk(self, key: str, now: float) -> Tuple[Optional[bytes], float]:
+        path = self._path(key, '.png')
+        try:
+            stored_at = os.path.getmtime(path)
+            if now - stored_at > self.ttl:
+                self._remove_png(path)
+                self._remove(self._path(key, '.fid'))
+                return None, 0.0
+            with open(path, 'rb') as f:
+                data = f.read()
+            # El atime marca el uso para la expulsión LRU en disco
+            os.utime(path, (now, stored_at))
+            return data, stored_at
+        except OSError:
+            return None, 0.0
+
+    def _read_file_id(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key, '.fid'), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _scan_disk(self) -> list:
+        """(atime, tamaño, ruta) de cada PNG en disco"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_atime, st.st_size, path))
+        return entries
+
+    def _disk_total_locked(self) -> int:
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+        return self._disk_bytes
+
+    def _write_disk(self, key: str, data: bytes):
+        if self.disk_max_bytes <= 0 or not self._ensure_directory():
+            return
+
+        path = self._path(key, '.png')
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            with self._disk_lock:
+                total = self._disk_total_locked()
+                try:
+                    previous = os.path.getsize(path)
+                except OSError:
+                    previous = 0
+                os.replace(tmp_path, path)  # escritura atómica: nunca se lee un PNG a medias
+                self._disk_bytes = total + len(data) - previous
+            self._remove(self._path(key, '.fid'))
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo escribir imagen en caché: {str(e)}")
+            self._remove(tmp_path)
+            return
+
+        if self._disk_bytes > self.disk_max_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Expulsa las imágenes menos usadas (por atime) hasta quedar bajo el límite de tamaño"""
+        with self._disk_lock:
+            # Recorrido completo solo al expulsar; de paso corrige el total acumulado
+            entries = self._scan_disk()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.disk_max_bytes:
+                self._disk_bytes = total
+                return
+
+            target = int(self.disk_max_bytes * self._EVICT_TARGET)
+            entries.sort()
+            evicted = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                self._remove(path)
+                self._remove(path[:-len('.png')] + '.fid')
+                total -= size
+                evicted += 1
+            self._disk_bytes = total
+
+        with self._lock:
+            self.stats['disk_evicted'] += evicted
+        logger.info(f"🧹 Caché de imágenes: {evicted} archivo(s) expulsado(s) por tamaño")
+
+    def _remove_png(self, path: str):
+        """Borra una imagen del disco descontándola del total acumulado"""
+        with self._disk_lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return
+            if self._disk_bytes is not None:
+                self._disk_bytes = max(0, self._disk_bytes - size)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -4,6 +4,8 @@ import requests
 from PIL import Image
 import sys
 
+from src.config.settings import settings
+from src.services.ticket_renderer import TicketRenderer
 from src.utils.logger import logger
 
 
@@ -12,6 +14,7 @@ class SimpleImageService:
 
     def __init__(self):
         self.is_selenium_available = self._check_selenium()
+        self.ticket_renderer = TicketRenderer(paper_mm=settings.render.ticket_paper_mm)
 
     def _check_selenium(self):
         """Check if Selenium is available"""
@@ -92,19 +95,9 @@ class SimpleImageService:
         return image_stream
 
     async def _url_to_image_simple(self, url: str) -> io.BytesIO:
-        """Simple method using requests"""
-
-        def _download_page():
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
-
+        """Simple method: descarga el HTML del ticket y lo dibuja con Pillow"""
         loop = asyncio.get_event_loop()
-        html_content = await loop.run_in_executor(None, _download_page)
-
-        # For now, return a placeholder or the URL
-        # In a real implementation, you might use imgkit or another HTML to image converter
-        raise Exception("Método simple no implementado. Use Selenium o instale imgkit.")
+        return await loop.run_in_executor(None, self.ticket_renderer.render_url, url)
 
     def is_available(self) -> bool:
         """Check if image service is available"""
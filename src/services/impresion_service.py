@@ -2,8 +2,9 @@
 import requests
 import logging
 from typing import Dict, Any, Optional
-import pyodbc
 from src.config.settings import settings
+from src.database.connection import ConnectionLease, db_manager
+from src.database.print_lookup import find_print_data, print_lookup_plan
 
 logger = logging.getLogger(__name__)
 
@@ -13,79 +14,43 @@ class ImpresionService:
         self.url_api = settings.print.api_url
         self.db_config = settings.database
 
-    def get_db_connection(self):
-        """Crear conexión a la base de datos usando tu configuración actual"""
-        connection_string = (
-            f"DRIVER={self.db_config.driver};"
-            f"SERVER=10.101.2.20;"
-            f"DATABASE=MAXPOINT_Local;"
-            f"UID={self.db_config.user};"
-            f"PWD={self.db_config.password};"
-            f"Timeout={self.db_config.timeout};"
-        )
-        return pyodbc.connect(connection_string)
-
     def reimprimir_documento(self, cfac_id: str, tipo_documento: str, ip_estacion: str = None) -> Dict[str, Any]:
         """
         Sistema completo de reimpresión con 3 métodos de fallback
         """
         logger.info(f"Iniciando reimpresión para {cfac_id} - Tipo: {tipo_documento}")
 
-        # Método 1: Consulta directa a Canal_Movimiento
-        resultado = self._metodo_consulta_directa(cfac_id, tipo_documento)
+        # Una sola conexión del pool de LOCAL para los tres métodos y la constancia
+        with db_manager.lease('LOCAL') as lease:
+            # Método 1: Consulta directa a Canal_Movimiento
+            resultado = self._metodo_consulta_directa(lease, cfac_id, tipo_documento)
 
-        if not resultado.get('success'):
-            logger.warning("Método 1 falló, intentando Método 2...")
-            resultado = self._metodo_stored_procedure(cfac_id, tipo_documento, ip_estacion)
+            if not resultado.get('success'):
+                logger.warning("Método 1 falló, intentando Método 2...")
+                resultado = self._metodo_stored_procedure(lease, cfac_id, tipo_documento, ip_estacion)
 
-        if not resultado.get('success'):
-            logger.warning("Método 2 falló, intentando Método 3...")
-            resultado = self._metodo_usp_final(cfac_id, tipo_documento)
+            if not resultado.get('success'):
+                logger.warning("Método 2 falló, intentando Método 3...")
+                resultado = self._metodo_usp_final(lease, cfac_id, tipo_documento)
 
-        if not resultado.get('success'):
-            logger.error("Todos los métodos fallaron")
-            resultado = self._mensaje_soporte(cfac_id)
+            if not resultado.get('success'):
+                logger.error("Todos los métodos fallaron")
+                resultado = self._mensaje_soporte(cfac_id)
 
-        # Registrar constancia
-        self._registrar_constancia(cfac_id, tipo_documento, resultado)
+            # Registrar constancia
+            self._registrar_constancia(lease, cfac_id, tipo_documento, resultado)
 
         return resultado
 
-    def _metodo_consulta_directa(self, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
+    def _metodo_consulta_directa(self, lease: ConnectionLease, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
         """Método 1: Consulta directa a la BDD"""
-        connection = None
         try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor()
-
-            # Determinar query según tipo de documento
-            if tipo_documento.lower() == 'factura':
-                query = """
-                SELECT imp_url, Canal_MovimientoVarchar1 
-                FROM Canal_Movimiento 
-                WHERE Canal_MovimientoVarchar3 LIKE ? 
-                AND imp_varchar1 like '%factura%'
-                """
-            elif tipo_documento.lower() == 'nota_credito':
-                query = """
-                SELECT imp_url, Canal_MovimientoVarchar1 
-                FROM Canal_Movimiento 
-                WHERE Canal_MovimientoVarchar3 LIKE ? 
-                AND imp_varchar1 like '%nota_credito%'
-                """
-            elif tipo_documento.lower() == 'comanda':
-                query = """
-                SELECT imp_url, Canal_MovimientoVarchar1 
-                FROM Canal_Movimiento 
-                WHERE Canal_MovimientoVarchar3 LIKE ? 
-                AND imp_varchar1 like '%orden%'
-                """
-            else:
+            # Búsqueda escalonada: clave exacta primero, LIKE con comodines solo como respaldo
+            if not print_lookup_plan(cfac_id, tipo_documento):
                 return {"success": False, "error": "Tipo de documento no válido"}
 
-            # Ejecutar consulta
-            cursor.execute(query, '%' + cfac_id + '%')
-            result = cursor.fetchone()
+            with lease.use() as connection:
+                result, _ = find_print_data(connection.cursor(), cfac_id, tipo_documento)
 
             if result:
                 imp_url, canal_movimiento = result
@@ -106,20 +71,14 @@ class ImpresionService:
         except Exception as e:
             logger.error(f"Error en método 1 (consulta directa): {str(e)}")
             return {"success": False, "error": str(e)}
-        finally:
-            if connection:
-                connection.close()
 
-    def _metodo_stored_procedure(self, cfac_id: str, tipo_documento: str, ip_estacion: str) -> Dict[str, Any]:
+    def _metodo_stored_procedure(self, lease: ConnectionLease, cfac_id: str, tipo_documento: str,
+                                 ip_estacion: str) -> Dict[str, Any]:
         """Método 2: Stored Procedure dinámico"""
-        connection = None
         try:
             if not ip_estacion:
                 return {"success": False, "error": "IP de estación requerida para este método"}
 
-            connection = self.get_db_connection()
-            cursor = connection.cursor()
-
             sp_query = """
             DECLARE @impresiones TABLE
             (
@@ -139,8 +98,10 @@ class ImpresionService:
             FROM @impresiones
             """
 
-            cursor.execute(sp_query, cfac_id, ip_estacion)
-            result = cursor.fetchone()
+            with lease.use() as connection:
+                cursor = connection.cursor()
+                cursor.execute(sp_query, cfac_id, ip_estacion)
+                result = cursor.fetchone()
 
             if result and result[0]:
                 datos_json = result[0]
@@ -160,17 +121,10 @@ class ImpresionService:
         except Exception as e:
             logger.error(f"Error en método 2 (stored procedure): {str(e)}")
             return {"success": False, "error": str(e)}
-        finally:
-            if connection:
-                connection.close()
 
-    def _metodo_usp_final(self, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
+    def _metodo_usp_final(self, lease: ConnectionLease, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
         """Método 3: USP final como último recurso"""
-        connection = None
         try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor()
-
             # Determinar tipo de comprobante
             tipo_comprobante = 'F'  # Factura por defecto
             if tipo_documento.lower() == 'nota_credito':
@@ -181,8 +135,10 @@ class ImpresionService:
             # Ejecutar USP final
             usp_query = "EXEC [facturacion].[USP_impresiondinamica_factura] ?, ?"
 
-            cursor.execute(usp_query, cfac_id, tipo_comprobante)
-            result = cursor.fetchall()
+            with lease.use() as connection:
+                cursor = connection.cursor()
+                cursor.execute(usp_query, cfac_id, tipo_comprobante)
+                result = cursor.fetchall()
 
             if result:
                 logger.info("USP [facturacion].[USP_impresiondinamica_factura] ejecutado exitosamente")
@@ -211,9 +167,6 @@ class ImpresionService:
         except Exception as e:
             logger.error(f"Error en método 3 (USP final): {str(e)}")
             return {"success": False, "error": str(e)}
-        finally:
-            if connection:
-                connection.close()
 
     def _enviar_a_impresora(self, datos: Dict) -> Dict[str, Any]:
         """Enviar a la API de impresión física"""
@@ -274,14 +227,10 @@ class ImpresionService:
             "constancia": "FALLO DE IMPRESIÓN - CONTACTAR SOPORTE"
         }
 
-    def _registrar_constancia(self, cfac_id: str, tipo_documento: str, resultado: Dict):
+    def _registrar_constancia(self, lease: ConnectionLease, cfac_id: str, tipo_documento: str, resultado: Dict):
         """Registrar constancia de reimpresión en la BDD"""
-        connection = None
+        constancia = "RE IMPRESIÓN DE DOCUMENTO" if resultado.get('success') else "FALLO EN REIMPRESIÓN"
         try:
-            connection = self.get_db_connection()
-            cursor = connection.cursor()
-
-            constancia = "RE IMPRESIÓN DE DOCUMENTO" if resultado.get('success') else "FALLO EN REIMPRESIÓN"
 
             registro_query = """
             INSERT INTO Log_Reimpresiones 
@@ -289,12 +238,14 @@ class ImpresionService:
             VALUES (?, ?, GETDATE(), ?, ?)
             """
 
-            cursor.execute(registro_query,
-                           cfac_id,
-                           tipo_documento,
-                           str(resultado),
-                           constancia)
-            connection.commit()
+            with lease.use() as connection:
+                cursor = connection.cursor()
+                cursor.execute(registro_query,
+                               cfac_id,
+                               tipo_documento,
+                               str(resultado),
+                               constancia)
+                connection.commit()
 
             logger.info(f"📝 Constancia registrada: {constancia} para {cfac_id}")
 
@@ -302,9 +253,6 @@ class ImpresionService:
             logger.error(f"Error registrando constancia en BDD: {str(e)}")
             # Intentar registrar en archivo de log como fallback
             self._registrar_constancia_log(cfac_id, tipo_documento, resultado, constancia)
-        finally:
-            if connection:
-                connection.close()
 
     def _registrar_constancia_log(self, cfac_id: str, tipo_documento: str, resultado: Dict, constancia: str):
         """Registrar constancia en archivo de log si falla la BDD"""
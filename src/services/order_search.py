@@ -0,0 +1,127 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.config.settings import settings
+from src.config.store_registry import store_registry
+from src.database.connection import db_manager
+from src.database.exceptions import StoreNetworkError, StoreOfflineError, StoreTimeoutError, deadline_error
+from src.database.queries import ORDER_STATUS_QUERY
+from src.services.store_health import store_health
+from src.utils.logger import logger
+
+
+class CrossStoreOrderSearch:
+    """
+    Busca una orden en todas las tiendas del directorio cuando no se sabe en cuál está.
+    Consulta con concurrencia limitada y plazo por tienda, informa el progreso mientras avanza
+    y cancela las consultas pendientes en cuanto una tienda encuentra la orden.
+    Usa hilos propios y conexiones fuera del pool con login acotado al plazo de la tienda:
+    una tienda que no responde no ocupa el executor de BD ni deja conexiones ociosas abiertas.
+    """
+
+    def __init__(self, concurrency: int, store_deadline: float, progress_interval: float):
+        self.concurrency = max(1, concurrency)
+        self.store_deadline = store_deadline
+        self.progress_interval = progress_interval
+        self.stats = {'searches': 0, 'found': 0, 'stores_queried': 0, 'cancelled': 0}
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='search')
+
+    @staticmethod
+    def _ordered_stores() -> List[str]:
+        """Primero las tiendas usadas recientemente: es más probable que la orden esté ahí"""
+        stores = store_registry.search_codes()
+        known = set(stores)
+        recent = [code for code in store_health.recently_used() if code in known]
+        return list(dict.fromkeys(recent + stores))
+
+    def _query_store_sync(self, store_code: str, order_id: str) -> Optional[tuple]:
+        # TCP (sub-segundo) y luego login + consulta con lo que quede del plazo de la tienda
+        deadline_at = time.monotonic() + self.store_deadline
+        db_manager.check_reachable(store_code)
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise deadline_error(store_code, self.store_deadline)
+        rows = db_manager.query_unpooled(store_code, ORDER_STATUS_QUERY, (order_id, order_id), timeout=remaining)
+        return tuple(rows[0]) if rows else None
+
+    async def _query_store(self, store_code: str, order_id: str) -> Optional[tuple]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._query_store_sync, store_code, order_id)
+
+    async def search(self, order_id: str,
+                     on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None) -> Dict[str, Any]:
+        """
+        Retorna {'success', 'store_code', 'status', 'checked', 'offline', 'errors', 'total', 'elapsed'}.
+        on_progress recibe el mismo diccionario (sin resultado final) como máximo cada progress_interval segundos.
+        """
+        self.stats['searches'] += 1
+        stores = self._ordered_stores()
+        progress = {'success': False, 'store_code': None, 'status': None, 'checked': 0,
+                    'offline': 0, 'errors': 0, 'total': len(stores), 'elapsed': 0.0}
+        start_time = time.monotonic()
+        last_report = start_time
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def search_store(store_code: str):
+            async with semaphore:
+                self.stats['stores_queried'] += 1
+                try:
+                    return store_code, await asyncio.wait_for(self._query_store(store_code, order_id),
+                                                              timeout=self.store_deadline), None
+                except (asyncio.TimeoutError, StoreOfflineError, StoreNetworkError, StoreTimeoutError):
+                    return store_code, None, 'offline'
+                except Exception as e:
+                    logger.warning(f"⚠️ Búsqueda de {order_id} en {store_code} falló: {str(e)}")
+                    return store_code, None, 'errors'
+
+        tasks = [asyncio.create_task(search_store(store_code)) for store_code in stores]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                store_code, status, failure = await finished
+                progress['checked'] += 1
+                if failure:
+                    progress[failure] += 1
+
+                if status is not None:
+                    progress.update(success=True, store_code=store_code, status=status)
+                    break
+
+                now = time.monotonic()
+                if on_progress and now - last_report >= self.progress_interval:
+                    last_report = now
+                    progress['elapsed'] = now - start_time
+                    try:
+                        await on_progress(dict(progress))
+                    except Exception as e:
+                        logger.warning(f"⚠️ No se pudo informar el progreso de la búsqueda: {str(e)}")
+        finally:
+            # Encontrada (o búsqueda cancelada): las tiendas pendientes ya no se consultan
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            self.stats['cancelled'] += len(pending)
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        progress['elapsed'] = time.monotonic() - start_time
+        if progress['success']:
+            self.stats['found'] += 1
+            logger.info(f"🌐 Orden {order_id} encontrada en {progress['store_code']} tras revisar "
+                        f"{progress['checked']}/{progress['total']} tiendas ({progress['elapsed']:.1f}s)")
+        else:
+            logger.info(f"🌐 Orden {order_id} no encontrada en {progress['total']} tiendas "
+                        f"({progress['offline']} sin conexión, {progress['elapsed']:.1f}s)")
+        return progress
+
+    def shutdown(self):
+        """Detiene los hilos de búsqueda (las consultas en curso terminan solas al vencer su plazo)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global cross-store search
+order_search = CrossStoreOrderSearch(
+    concurrency=settings.database.search_concurrency,
+    store_deadline=settings.database.search_store_deadline,
+    progress_interval=settings.database.search_progress_interval
+)
@@ -1,7 +1,9 @@
 import io
+import re
 import time
+import threading
 import datetime
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -11,26 +13,45 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 from PIL import Image, ImageDraw, ImageFont
 
+from src.config.settings import settings
+from src.config.constants import TERMINAL_ORDER_STATES, ORDER_CODE_PATTERNS
+from src.config.store_registry import store_registry
 from src.database.connection import db_manager
 from src.database.queries import *
+from src.services.browser_pool import BrowserPool
+from src.services.document_resolver import document_resolver
+from src.services.image_cache import ImageCache
+from src.services.render_scheduler import RenderScheduler
+from src.services.render_wait import wait_until_ready, render_wait_histograms
+from src.services.ticket_renderer import TicketRenderer, TicketRenderError
 from src.utils.logger import logger
+from src.utils.singleflight import AsyncSingleFlight
+from src.utils.ttl_cache import TTLCache
 
 
 class OrderService:
-    # Configuración de Selenium
-    _driver = None
+    # Consultas idénticas (tienda, consulta, parámetros) en curso comparten un solo viaje a la BD
+    _query_flights = AsyncSingleFlight()
+
+    # Resultados recientes de estado/auditoría/código asociado, con TTL según el estado de la orden
+    _result_cache = TTLCache(max_items=settings.query_cache.max_items)
+    _CACHE_MISS = object()
+
+    # Dónde se encontró cada estado: en la tabla que indicaba el formato, en la de respaldo
+    # o en una consulta por lotes (varios códigos en un mensaje)
+    status_source_stats = {'first': 0, 'fallback': 0, 'batch': 0, 'none': 0}
+
+    # Qué nivel de la búsqueda escalonada respondió cada auditoría
+    audit_tier_stats = {'exact': 0, 'prefix': 0, 'substring': 0, 'none': 0}
+
+    # Ruta del ChromeDriver resuelta una sola vez por proceso
+    _driver_path = None
+    _driver_path_lock = threading.Lock()
 
     @staticmethod
-    def _setup_driver():
-        """Configura el driver de Chrome en modo headless - CORREGIDO CON VERSIÓN COMPATIBLE"""
+    def _create_driver():
+        """Crea un driver de Chrome headless; lo usa el pool de navegadores para arrancar instancias"""
         try:
-            if OrderService._driver:
-                try:
-                    OrderService._driver.quit()
-                except:
-                    pass
-                OrderService._driver = None
-
             chrome_options = Options()
             chrome_options.add_argument("--headless")
             chrome_options.add_argument("--no-sandbox")
@@ -38,14 +59,16 @@ class OrderService:
             chrome_options.add_argument("--window-size=1920,1080")
             chrome_options.add_argument("--disable-gpu")
             chrome_options.add_argument("--disable-extensions")
-            chrome_options.add_argument("--remote-debugging-port=9222")
             chrome_options.add_argument(
                 "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
 
             # SOLUCIÓN: Forzar la versión compatible de ChromeDriver
             try:
                 # Opción 1: Usar la versión más reciente compatible
-                service = Service(ChromeDriverManager().install())
+                with OrderService._driver_path_lock:
+                    if OrderService._driver_path is None:
+                        OrderService._driver_path = ChromeDriverManager().install()
+                service = Service(OrderService._driver_path)
                 driver = webdriver.Chrome(service=service, options=chrome_options)
             except Exception as driver_error:
                 logger.warning(f"Error con ChromeDriver automático: {driver_error}")
@@ -62,13 +85,11 @@ class OrderService:
             driver.set_page_load_timeout(30)
             driver.implicitly_wait(10)
 
-            OrderService._driver = driver
             logger.info("✅ Driver de Selenium configurado exitosamente")
             return driver
 
         except Exception as e:
             logger.error(f"❌ Error configurando Chrome driver: {str(e)}")
-            OrderService._driver = None
             raise
 
     @staticmethod
@@ -77,23 +98,76 @@ class OrderService:
         return store_code.startswith('K') and len(store_code) >= 4
 
     @staticmethod
-    def _get_store_ip(store_code: str) -> str:
-        """Get proper IP address for store"""
-        store_number = ''.join(filter(str.isdigit, store_code))
-        store_number_int = int(store_number) if store_number else 0
-        return f'10.101.{store_number_int}.20'
+    async def _query(store_code: str, query: str, params: tuple) -> List[Tuple]:
+        """execute_query_async con coalescencia de llamadas idénticas en curso"""
+        key = (store_code.strip().upper(), query, params)
+        results = await OrderService._query_flights.do(
+            key, lambda: db_manager.execute_query_async(store_code, query, params)
+        )
+        # Copia por llamador: los resultados compartidos no deben mutarse entre handlers
+        return list(results) if isinstance(results, list) else results
 
     @staticmethod
-    def get_order_status(store_code: str, order_id: str) -> Optional[Tuple]:
+    def _is_terminal(estado) -> bool:
+        return str(estado or '').strip().upper() in TERMINAL_ORDER_STATES
+
+    @staticmethod
+    def _link_document(document_id, order_id: str, ttl: float):
+        """
+        Registra en la caché la relación documento (cfac_id) -> orden (codigo_app) con la etiqueta del
+        documento: al invalidarlo se sabe qué auditorías de la orden descartar sin mirar los valores.
+        """
+        document_id = str(document_id or '').strip()
+        if document_id:
+            OrderService._result_cache.set(('link', document_id, order_id), order_id, ttl,
+                                           tags=(('document', document_id),))
+
+    @staticmethod
+    def invalidate_document(document_id: str):
+        """Descarta los resultados cacheados de un documento (p. ej. tras una reimpresión)"""
+        document_id = str(document_id).strip()
+        removed = OrderService._result_cache.invalidate_tag(('document', document_id))
+        # Las órdenes enlazadas al documento: su estado y su auditoría también se descartan
+        for order_id in {key[2] for key in removed if key[0] == 'link'}:
+            removed += OrderService._result_cache.invalidate_tag(('order', order_id))
+        if removed:
+            logger.info(f"🧹 {len(removed)} resultado(s) en caché descartados para {document_id}")
+
+    @staticmethod
+    def classify_order_code(order_id: str) -> Optional[str]:
+        """'app' o 'kiosko' según el formato del código; None si no se reconoce"""
+        for source, pattern in ORDER_CODE_PATTERNS.items():
+            if re.match(pattern, order_id):
+                return source
+        return None
+
+    @staticmethod
+    async def get_order_status(store_code: str, order_id: str) -> Optional[Tuple]:
         """Get order status with motorized information"""
+        cache_key = ('status', store_code.strip().upper(), order_id)
+        cached = OrderService._result_cache.get(cache_key, OrderService._CACHE_MISS)
+        if cached is not OrderService._CACHE_MISS:
+            logger.info(f"⚡ Estado de orden {order_id} en {store_code} desde caché")
+            return cached
+
         try:
             start_time = time.time()
 
-            results = db_manager.execute_query(
-                store_code,
-                ORDER_STATUS_QUERY,
-                (order_id, order_id)
-            )
+            # Tabla según el formato del código, la otra como respaldo (antes: UNION ALL de ambas)
+            sources = [('app', ORDER_STATUS_APP_QUERY), ('kiosko', ORDER_STATUS_KIOSK_QUERY)]
+            if OrderService.classify_order_code(order_id) == 'kiosko':
+                sources.reverse()
+
+            results = []
+            for attempt, (source, query) in enumerate(sources):
+                results = await OrderService._query(store_code, query, (order_id,))
+                if results:
+                    OrderService.status_source_stats['first' if attempt == 0 else 'fallback'] += 1
+                    if attempt:
+                        logger.info(f"↪️ Orden {order_id} encontrada en la tabla de respaldo ({source})")
+                    break
+            else:
+                OrderService.status_source_stats['none'] += 1
 
             elapsed = time.time() - start_time
             if elapsed > 2:
@@ -101,29 +175,142 @@ class OrderService:
 
             if results:
                 logger.info(f"✅ Orden {order_id} encontrada en {store_code} ({elapsed:.2f}s)")
-                return results[0]
+                row = tuple(results[0])
             else:
                 logger.warning(f"⚠️ Orden {order_id} no encontrada en {store_code}")
-                return None
+                row = None
+            OrderService._cache_status(cache_key, order_id, row)
+            return row
 
         except Exception as e:
             logger.error(f"❌ Error obteniendo estado orden {order_id}: {str(e)}")
             raise
 
     @staticmethod
-    def audit_order(store_code: str, order_id: str) -> List[Tuple]:
-        """Audit order with complete history"""
+    def _cache_status(cache_key: tuple, order_id: str, row: Optional[Tuple]):
+        """Guarda un estado (o su ausencia) con el TTL según si la orden ya terminó"""
+        ttl_config = settings.query_cache
+        if row is None:
+            OrderService._result_cache.set(cache_key, None, ttl_config.not_found_ttl, tags=(('order', order_id),))
+            return
+        ttl = (ttl_config.status_ttl_terminal if OrderService._is_terminal(row[1])
+               else ttl_config.status_ttl_active)
+        OrderService._result_cache.set(cache_key, row, ttl, tags=(('order', order_id),))
+        OrderService._link_document(row[2], order_id, ttl_config.associated_code_ttl)
+
+    @staticmethod
+    def parse_order_codes(text: str) -> List[str]:
+        """Códigos de orden de un mensaje (separados por espacios, comas, punto y coma o saltos), sin repetir"""
+        codes = [code.strip('`\'"') for code in re.split(r'[\s,;]+', text or '')]
+        return list(dict.fromkeys(code for code in codes if code))
+
+    @staticmethod
+    async def get_order_statuses(store_code: str, order_ids: List[str]) -> Dict[str, Optional[Tuple]]:
+        """
+        Estado de varias órdenes con una consulta IN por tienda (en bloques de status_batch_chunk).
+        Usa y llena la misma caché que get_order_status; retorna {código: fila o None} en el orden pedido.
+        """
+        store_key = store_code.strip().upper()
+        statuses: Dict[str, Optional[Tuple]] = {}
+        missing = []
+        for order_id in order_ids:
+            cached = OrderService._result_cache.get(('status', store_key, order_id), OrderService._CACHE_MISS)
+            if cached is OrderService._CACHE_MISS:
+                missing.append(order_id)
+            else:
+                statuses[order_id] = cached
+
+        start_time = time.time()
+        chunk = max(1, settings.database.status_batch_chunk)
+        for index in range(0, len(missing), chunk):
+            codes = missing[index:index + chunk]
+            query = ORDER_STATUS_BATCH_TEMPLATE.format(placeholders=', '.join('?' * len(codes)))
+            results = await OrderService._query(store_code, query, tuple(codes) * 2)
+
+            # La intercalación de SQL Server no distingue mayúsculas: se compara con ambos lados normalizados
+            found: Dict[str, Tuple] = {}
+            for row in results:
+                row_code = str(row[0]).strip()
+                match_key = row_code.upper()
+                # Si aparece en ambas tablas gana la que corresponde al formato del código
+                if match_key not in found or row[6] == OrderService.classify_order_code(row_code):
+                    found[match_key] = tuple(row[:6])
+
+            for order_id in codes:
+                row = found.get(order_id.strip().upper())
+                OrderService.status_source_stats['batch' if row else 'none'] += 1
+                OrderService._cache_status(('status', store_key, order_id), order_id, row)
+                statuses[order_id] = row
+
+        logger.info(f"📋 Estado de {len(order_ids)} órdenes en {store_code}: {len(missing)} consultadas "
+                    f"en {(len(missing) + chunk - 1) // chunk} viaje(s), {time.time() - start_time:.2f}s")
+        return {order_id: statuses.get(order_id) for order_id in order_ids}
+
+    @staticmethod
+    def format_order_statuses_table(statuses: Dict[str, Optional[Tuple]]) -> str:
+        """Tabla de texto plano (una fila por código) para el chat en bloque ``` o para el archivo"""
+        lines = [f"{'Código':<20} {'Estado':<16} {'Factura':<20} Motorizado"]
+        for order_id, row in statuses.items():
+            if row is None:
+                lines.append(f"{order_id:<20} NO ENCONTRADA")
+            else:
+                lines.append(f"{order_id:<20} {str(row[1]).strip():<16} {str(row[2] or '-').strip():<20} {row[5]}")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        """Escapa los comodines de LIKE de SQL Server (ESCAPE '\\')"""
+        for char in ('\\', '%', '_', '['):
+            value = value.replace(char, '\\' + char)
+        return value
+
+    @staticmethod
+    async def audit_order(store_code: str, order_id: str, allow_substring: Optional[bool] = None) -> List[Tuple]:
+        """
+        Audit order with complete history.
+        Búsqueda escalonada: exacta -> prefijo -> subcadena (solo si allow_substring o
+        DB_AUDIT_SUBSTRING_FALLBACK lo habilitan). Se registra qué nivel respondió.
+        """
+        order_id = order_id.strip()
+        if allow_substring is None:
+            allow_substring = settings.database.audit_substring_fallback
+
+        cache_key = ('audit', store_code.strip().upper(), order_id, allow_substring)
+        cached = OrderService._result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"⚡ Auditoría de {order_id} en {store_code} desde caché")
+            return list(cached)
+
         try:
             start_time = time.time()
 
-            results = db_manager.execute_query(
-                store_code,
-                ORDER_AUDIT_QUERY,
-                (f'%{order_id}%',)
-            )
+            escaped = OrderService._escape_like(order_id)
+            tiers = [
+                ('exact', ORDER_AUDIT_EXACT_QUERY, (order_id,)),
+                ('prefix', ORDER_AUDIT_PREFIX_QUERY, (f'{escaped}%',))
+            ]
+            if allow_substring:
+                tiers.append(('substring', ORDER_AUDIT_QUERY, (f'%{escaped}%',)))
+
+            results, tier = [], 'none'
+            for tier_name, query, params in tiers:
+                results = await OrderService._query(store_code, query, params)
+                if results:
+                    tier = tier_name
+                    break
 
             elapsed = time.time() - start_time
-            logger.info(f"Auditoría completada en {elapsed:.2f}s: {len(results)} registros")
+            OrderService.audit_tier_stats[tier] += 1
+            logger.info(f"Auditoría completada en {elapsed:.2f}s: {len(results)} registros (nivel: {tier})")
+
+            ttl_config = settings.query_cache
+            if not results:
+                ttl = ttl_config.not_found_ttl
+            elif OrderService._is_terminal(results[-1][1]):
+                ttl = ttl_config.audit_ttl_terminal
+            else:
+                ttl = ttl_config.audit_ttl_active
+            OrderService._result_cache.set(cache_key, tuple(results), ttl, tags=(('order', order_id),))
             return results
 
         except Exception as e:
@@ -131,8 +318,13 @@ class OrderService:
             raise
 
     @staticmethod
-    def get_associated_code(store_code: str, cfac_id: str) -> Optional[str]:
+    async def get_associated_code(store_code: str, cfac_id: str) -> Optional[str]:
         """Get associated code for a given invoice ID"""
+        cache_key = ('associated', store_code.strip().upper(), cfac_id)
+        cached = OrderService._result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             start_time = time.time()
 
@@ -152,7 +344,7 @@ class OrderService:
             ORDER BY priority
             """
 
-            results = db_manager.execute_query(
+            results = await OrderService._query(
                 store_code,
                 query,
                 (cfac_id, cfac_id)
@@ -162,6 +354,11 @@ class OrderService:
 
             if results and results[0][0]:
                 logger.info(f"✅ Código asociado encontrado en {elapsed:.2f}s: {results[0][0]}")
+                # La relación factura -> código no cambia: TTL largo
+                codigo_app = str(results[0][0]).strip()
+                OrderService._result_cache.set(cache_key, results[0][0], settings.query_cache.associated_code_ttl,
+                                               tags=(('document', cfac_id.strip()), ('order', codigo_app)))
+                OrderService._link_document(cfac_id, codigo_app, settings.query_cache.associated_code_ttl)
                 return results[0][0]
 
             logger.warning(f"⚠️ No se encontró código asociado para {cfac_id} en ninguna tabla")
@@ -172,23 +369,20 @@ class OrderService:
             return None
 
     @staticmethod
-    def get_comanda_url(store_code: str, cfac_id: str) -> Optional[str]:
+    async def get_comanda_url(store_code: str, cfac_id: str) -> Optional[str]:
         """Get comanda URL - CORREGIDA CON CONSULTA ADECUADA"""
         try:
             start_time = time.time()
 
-            # Consulta corregida para obtener ODP_ID
-            results = db_manager.execute_query(
-                store_code,
-                "SELECT TOP 1 IDCabeceraordenPedido FROM Cabecera_Factura WHERE cfac_id = ?",
-                (cfac_id,)
-            )
+            # ODP_ID desde el resolvedor compartido (memorizado entre servicios); si hay que ir a la
+            # tienda, la consulta pasa por _query y se comparte con otra idéntica en curso
+            identity = await document_resolver.resolve_async(store_code, cfac_id, query=OrderService._query)
 
             elapsed = time.time() - start_time
 
-            if results and results[0][0]:
-                odp_id = results[0][0]
-                server_ip = OrderService._get_store_ip(store_code)
+            if identity and identity.odp_id:
+                odp_id = identity.odp_id
+                server_ip = store_registry.get(store_code).ip
 
                 # URL corregida para comanda
                 url = f"http://{server_ip}:880/PoS/ordenpedido/impresion/imprimir_ordenpedido.php?odp_id={odp_id}&tipoServicio=2&canalImpresion=0&guardaOrden=0&numeroCuenta=1"
@@ -203,44 +397,86 @@ class OrderService:
             logger.error(f"Error obteniendo comanda {cfac_id}: {str(e)}")
             raise
 
+    @staticmethod
+    def _render_document(store_code: str, url: str, width: int) -> io.BytesIO:
+        """Dibuja el ticket sin navegador si se puede; si no, captura con un Chrome del pool"""
+        engine = settings.render.engine
+        if engine in ('auto', 'ticket'):
+            try:
+                start_time = time.time()
+                image_buffer = ticket_renderer.render_url(url)
+                logger.info(f"🧾 Ticket dibujado sin navegador en {time.time() - start_time:.2f}s")
+                return image_buffer
+            except TicketRenderError as e:
+                if engine == 'ticket':
+                    raise
+                logger.info(f"↪️ Ticket no soportado por el renderizador simple, se usa Selenium: {str(e)}")
+            except Exception as e:
+                if engine == 'ticket':
+                    raise
+                logger.warning(f"↪️ Falló el renderizador simple, se usa Selenium: {str(e)}")
+
+        # Navegador pre-calentado del pool
+        with browser_pool.lease() as driver:
+            screenshot = OrderService._capture_page(driver, store_code, url, width)
+
+        image_buffer = io.BytesIO(screenshot)
+        image_buffer.seek(0)
+        return image_buffer
+
+    @staticmethod
+    def _capture_page(driver, store_code: str, url: str, width: int) -> bytes:
+        """Carga la página y toma el screenshot en cuanto el contenido está renderizado"""
+        driver.get(url)
+
+        # Esperar a que exista el body
+        WebDriverWait(driver, 25).until(
+            EC.presence_of_element_located((By.TAG_NAME, "body"))
+        )
+
+        render_settings = settings.render
+        if render_settings.wait_mode == 'fixed':
+            time.sleep(3)
+            waited = 3.0
+        else:
+            # Esperar señales concretas de la página en lugar de un tiempo fijo
+            waited, stable = wait_until_ready(
+                driver,
+                render_settings.wait_max,
+                render_settings.wait_poll_interval,
+                render_settings.wait_stable_polls
+            )
+            if not stable:
+                logger.warning(f"⏱️ Página sin estabilizar tras {waited:.2f}s en {store_code}, se captura igual")
+        render_wait_histograms.observe(store_code, waited)
+
+        # Ajustar tamaño de ventana al contenido
+        total_height = driver.execute_script(
+            "return Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight);")
+        driver.set_window_size(width, total_height)
+
+        return driver.get_screenshot_as_png()
+
     @staticmethod
     def generate_invoice_image(store_code: str, cfac_id: str) -> io.BytesIO:
         """Genera imagen de factura usando Selenium - SIN MENSAJES TÉCNICOS AL USUARIO"""
-        driver = None
         try:
-            logger.info(f"🔄 Generando imagen para factura {cfac_id} en tienda {store_code}")
+            cached = image_cache.get(store_code, 'factura', cfac_id) if image_cache else None
+            if cached is not None:
+                logger.info(f"⚡ Factura {cfac_id} de {store_code} servida desde caché")
+                return cached
 
-            # Configurar driver
-            driver = OrderService._setup_driver()
+            logger.info(f"🔄 Generando imagen para factura {cfac_id} en tienda {store_code}")
 
             # Generar URL CORREGIDA
-            server_ip = OrderService._get_store_ip(store_code)
+            server_ip = store_registry.get(store_code).ip
             invoice_url = f"http://{server_ip}:880/pos/facturacion/impresion/impresion_factura.php?cfac_id={cfac_id}&tipo_comprobante=F&"
 
             logger.info(f"🔗 Navegando a factura: {invoice_url}")
+            image_buffer = OrderService._render_document(store_code, invoice_url, 1200)
 
-            # Cargar la página
-            driver.get(invoice_url)
-
-            # Esperar a que la página cargue completamente
-            WebDriverWait(driver, 25).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-
-            # Dar tiempo extra para que se renderice el contenido
-            time.sleep(3)
-
-            # Ajustar tamaño de ventana
-            total_height = driver.execute_script(
-                "return Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight);")
-            driver.set_window_size(1200, total_height)
-
-            # Tomar screenshot
-            screenshot = driver.get_screenshot_as_png()
-
-            # Convertir a BytesIO
-            image_buffer = io.BytesIO(screenshot)
-            image_buffer.seek(0)
+            if image_cache:
+                image_cache.put(store_code, 'factura', cfac_id, image_buffer)
 
             logger.info(f"✅ Imagen de factura {cfac_id} generada exitosamente")
             return image_buffer
@@ -258,51 +494,28 @@ class OrderService:
                 OrderService.get_invoice_url(store_code, cfac_id)
             )
 
-        finally:
-            # Limpiar recursos silenciosamente
-            try:
-                if driver:
-                    driver.quit()
-            except:
-                pass
-
     @staticmethod
-    def generate_comanda_image(store_code: str, cfac_id: str) -> io.BytesIO:
-        """Genera imagen de comanda usando Selenium - SIN MENSAJES TÉCNICOS"""
-        driver = None
+    def generate_comanda_image(store_code: str, cfac_id: str, comanda_url: Optional[str]) -> io.BytesIO:
+        """
+        Genera imagen de comanda usando Selenium - SIN MENSAJES TÉCNICOS.
+        `comanda_url` se resuelve antes en el event loop con get_comanda_url (None si no se encontró).
+        """
         try:
+            cached = image_cache.get(store_code, 'comanda', cfac_id) if image_cache else None
+            if cached is not None:
+                logger.info(f"⚡ Comanda {cfac_id} de {store_code} servida desde caché")
+                return cached
+
             logger.info(f"🔄 Generando imagen para comanda {cfac_id} en tienda {store_code}")
 
-            # Obtener URL de comanda
-            comanda_url = OrderService.get_comanda_url(store_code, cfac_id)
             if not comanda_url:
                 raise Exception("No se pudo obtener URL de comanda")
 
-            # Configurar driver
-            driver = OrderService._setup_driver()
-
             logger.info(f"🔗 Navegando a comanda: {comanda_url}")
+            image_buffer = OrderService._render_document(store_code, comanda_url, 800)
 
-            # Cargar la página
-            driver.get(comanda_url)
-
-            # Esperar a que la página cargue
-            WebDriverWait(driver, 25).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-
-            # Dar tiempo para renderizado
-            time.sleep(3)
-
-            # Ajustar tamaño para comanda
-            total_height = driver.execute_script(
-                "return Math.max(document.body.scrollHeight, document.body.offsetHeight, document.documentElement.clientHeight, document.documentElement.scrollHeight, document.documentElement.offsetHeight);")
-            driver.set_window_size(800, total_height)
-
-            # Tomar screenshot
-            screenshot = driver.get_screenshot_as_png()
-            image_buffer = io.BytesIO(screenshot)
-            image_buffer.seek(0)
+            if image_cache:
+                image_cache.put(store_code, 'comanda', cfac_id, image_buffer)
 
             logger.info(f"✅ Comanda {cfac_id} generada exitosamente")
             return image_buffer
@@ -312,7 +525,7 @@ class OrderService:
             error_msg = "Error al generar comanda"
             logger.error(f"❌ Error en Selenium para comanda {cfac_id}: {str(e)}")
 
-            comanda_url = OrderService.get_comanda_url(store_code, cfac_id)
+            # Si la consulta del ODP fue lo que falló, la imagen sale sin URL
             return OrderService._generate_error_image(
                 store_code,
                 cfac_id,
@@ -320,14 +533,6 @@ class OrderService:
                 comanda_url
             )
 
-        finally:
-            # Limpiar recursos silenciosamente
-            try:
-                if driver:
-                    driver.quit()
-            except:
-                pass
-
     @staticmethod
     def _generate_error_image(store_code: str, cfac_id: str, error_msg: str, url: str = None) -> io.BytesIO:
         """Genera una imagen de error cuando falla la captura - SIN DETALLES TÉCNICOS"""
@@ -386,13 +591,13 @@ class OrderService:
     @staticmethod
     def get_invoice_url(store_code: str, cfac_id: str) -> str:
         """Obtiene la URL de la factura - CORREGIDA"""
-        server_ip = OrderService._get_store_ip(store_code)
+        server_ip = store_registry.get(store_code).ip
         return f"http://{server_ip}:880/pos/facturacion/impresion/impresion_factura.php?cfac_id={cfac_id}&tipo_comprobante=F&"
 
     @staticmethod
     def get_nota_credito_url(store_code: str, cfac_id: str) -> str:
         """Obtiene la URL de la nota de crédito - NUEVO MÉTODO"""
-        server_ip = OrderService._get_store_ip(store_code)
+        server_ip = store_registry.get(store_code).ip
         return f"http://{server_ip}:880/pos/facturacion/impresion/impresion_factura.php?cfac_id={cfac_id}&tipo_comprobante=N&"
 
     @staticmethod
@@ -401,8 +606,8 @@ class OrderService:
         try:
             start_time = time.time()
 
-            with db_manager.get_connection(store_code):
-                pass  # Solo probar conexión
+            # TCP primero (sub-segundo) y login solo si responde; la conexión queda en el pool
+            db_manager.connect_store(store_code)
 
             elapsed = time.time() - start_time
             logger.info(f"✅ Conexión testeada a {store_code} en {elapsed:.2f}s")
@@ -479,9 +684,33 @@ class OrderService:
     def cleanup():
         """Limpia los recursos de Selenium"""
         try:
-            if OrderService._driver:
-                OrderService._driver.quit()
-                OrderService._driver = None
-                logger.info("✅ Driver de Selenium cerrado correctamente")
+            browser_pool.close()
         except Exception as e:
-            logger.error(f"Error limpiando recursos Selenium: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error limpiando recursos Selenium: {str(e)}")
+
+
+# Renderizador de tickets térmicos sin navegador
+ticket_renderer = TicketRenderer(paper_mm=settings.render.ticket_paper_mm)
+
+# Caché de imágenes de documentos ya generadas (None si está deshabilitada)
+image_cache = ImageCache(
+    directory=settings.render.cache_dir,
+    memory_items=settings.render.cache_memory_items,
+    disk_max_bytes=settings.render.cache_disk_max_mb * 1024 * 1024,
+    ttl=settings.render.cache_ttl
+) if settings.render.cache_enabled else None
+
+# Pool global de navegadores para capturas de documentos
+browser_pool = BrowserPool(
+    factory=OrderService._create_driver,
+    size=settings.render.browser_pool_size,
+    max_renders=settings.render.browser_max_renders,
+    lease_timeout=settings.render.browser_lease_timeout
+)
+
+# Fila acotada y justa entre tiendas para la generación de imágenes
+render_scheduler = RenderScheduler(
+    global_limit=settings.render.max_concurrent,
+    per_store_limit=settings.render.max_concurrent_per_store,
+    max_queue=settings.render.max_queue
+)
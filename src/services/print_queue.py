@@ -0,0 +1,448 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from src.config.settings import settings
+from src.utils.logger import logger
+
+# Estados de un trabajo de impresión
+PENDING = 'pending'  # en cola o esperando su próximo reintento
+RUNNING = 'running'  # un worker lo está procesando
+DONE = 'done'  # impreso
+UNCERTAIN = 'uncertain'  # pudo haber impreso (timeout a mitad del envío): no se reintenta
+FAILED = 'failed'  # fallo definitivo que no se arregla reintentando (p. ej. documento inexistente)
+DEAD = 'dead'  # se agotaron los reintentos
+
+ACTIVE_STATUSES = (PENDING, RUNNING)
+FINAL_STATUSES = (DONE, UNCERTAIN, FAILED, DEAD)
+
+
+@dataclass
+class PrintJob:
+    id: int
+    kind: str  # 'reprint' (PrintService) o 'reimpresion' (ReimpresionService)
+    store_code: str
+    document_type: str
+    document_id: str
+    printer_key: str
+    status: str
+    attempts: int
+    max_attempts: int
+    next_attempt_at: float  # time.time()
+    created_at: float
+    updated_at: float
+    chat_id: Optional[int] = None
+    message_id: Optional[int] = None  # mensaje "en cola" que se actualiza con el resultado
+    requested_by: str = ''
+    reason: str = ''
+    error: str = ''
+    result: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+
+class PrintJobStore:
+    """
+    Cola persistente de trabajos de impresión en SQLite (un archivo local, modo WAL).
+    Los métodos son bloqueantes y seguros entre hilos; PrintJobQueue los llama desde el executor.
+    """
+
+    _COLUMNS = ('id', 'kind', 'store_code', 'document_type', 'document_id', 'printer_key', 'status',
+                'attempts', 'max_attempts', 'next_attempt_at', 'created_at', 'updated_at', 'chat_id',
+                'message_id', 'requested_by', 'reason', 'error', 'result')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Se abre con el primer uso: importar el módulo no crea archivos
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS print_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    store_code TEXT NOT NULL,
+                    document_type TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    printer_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    chat_id INTEGER,
+                    message_id INTEGER,
+                    requested_by TEXT NOT NULL DEFAULT '',
+                    reason TEXT NOT NULL DEFAULT '',
+                    error TEXT NOT NULL DEFAULT '',
+                    result TEXT NOT NULL DEFAULT '{}'
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_print_jobs_due ON print_jobs (status, next_attempt_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_print_jobs_document '
+                         'ON print_jobs (kind, store_code, document_type, document_id, status)')
+            self._conn = conn
+        return self._conn
+
+    def _row_to_job(self, row) -> PrintJob:
+        data = dict(zip(self._COLUMNS, row))
+        data['result'] = json.loads(data['result'] or '{}')
+        return PrintJob(**data)
+
+    def _select(self, where: str, params: tuple = (), suffix: str = '') -> List[PrintJob]:
+        rows = self._connection().execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM print_jobs WHERE {where} {suffix}", params
+        ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def enqueue(self, kind: str, store_code: str, document_type: str, document_id: str, printer_key: str,
+                max_attempts: int, chat_id: Optional[int] = None, message_id: Optional[int] = None,
+                requested_by: str = '', reason: str = '') -> Tuple[PrintJob, bool]:
+        """
+        Encola el trabajo y retorna (trabajo, True). Si el mismo documento ya tiene un trabajo
+        pendiente o en curso retorna ese (trabajo, False): pedirlo dos veces no imprime dos veces.
+        """
+        with self._lock:
+            conn = self._connection()
+            active = self._select(
+                f"kind = ? AND store_code = ? AND document_type = ? AND document_id = ? "
+                f"AND status IN ({', '.join('?' * len(ACTIVE_STATUSES))})",
+                (kind, store_code, document_type, document_id) + ACTIVE_STATUSES, 'LIMIT 1'
+            )
+            if active:
+                return active[0], False
+
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO print_jobs (kind, store_code, document_type, document_id, printer_key, status, "
+                "max_attempts, next_attempt_at, created_at, updated_at, chat_id, message_id, requested_by, reason) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, store_code, document_type, document_id, printer_key, PENDING, max_attempts,
+                 now, now, now, chat_id, message_id, requested_by, reason)
+            )
+            return self._select('id = ?', (cursor.lastrowid,))[0], True
+
+    def attach_message(self, job_id: int, chat_id: int, message_id: int):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE print_jobs SET chat_id = ?, message_id = ? WHERE id = ?", (chat_id, message_id, job_id)
+            )
+
+    def claim(self, busy_printers: Set[str]) -> Optional[PrintJob]:
+        """Toma el trabajo vencido más antiguo cuya impresora no esté ocupada y lo marca en curso"""
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            where = "status = ? AND next_attempt_at <= ?"
+            params: tuple = (PENDING, now)
+            if busy_printers:
+                where += f" AND printer_key NOT IN ({', '.join('?' * len(busy_printers))})"
+                params += tuple(busy_printers)
+            jobs = self._select(where, params, 'ORDER BY next_attempt_at, id LIMIT 1')
+            if not jobs:
+                return None
+
+            job = jobs[0]
+            job.status, job.attempts, job.updated_at = RUNNING, job.attempts + 1, now
+            conn.execute("UPDATE print_jobs SET status = ?, attempts = ?, updated_at = ? WHERE id = ?",
+                         (job.status, job.attempts, now, job.id))
+            return job
+
+    def finish(self, job_id: int, status: str, result: Dict[str, Any], error: str = ''):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE print_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result, default=str), error, time.time(), job_id)
+            )
+
+    def reschedule(self, job_id: int, next_attempt_at: float, error: str):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE print_jobs SET status = ?, next_attempt_at = ?, error = ?, updated_at = ? WHERE id = ?",
+                (PENDING, next_attempt_at, error, time.time(), job_id)
+            )
+
+    def get(self, job_id: int) -> Optional[PrintJob]:
+        with self._lock:
+            jobs = self._select('id = ?', (job_id,))
+            return jobs[0] if jobs else None
+
+    def recent(self, limit: int = 10, statuses: tuple = ()) -> List[PrintJob]:
+        with self._lock:
+            if statuses:
+                return self._select(f"status IN ({', '.join('?' * len(statuses))})", statuses,
+                                    f'ORDER BY id DESC LIMIT {int(limit)}')
+            return self._select('1 = 1', (), f'ORDER BY id DESC LIMIT {int(limit)}')
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection().execute("SELECT status, COUNT(*) FROM print_jobs GROUP BY status").fetchall()
+            return dict(rows)
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT MIN(next_attempt_at) FROM print_jobs WHERE status = ?", (PENDING,)
+            ).fetchone()
+            return row[0] if row else None
+
+    def recover(self) -> List[PrintJob]:
+        """
+        Trabajos que estaban en curso cuando el proceso se detuvo: no se sabe si alcanzaron a
+        imprimir, así que quedan sin confirmar en vez de reintentarse
+        """
+        with self._lock:
+            jobs = self._select('status = ?', (RUNNING,))
+            self._connection().execute(
+                "UPDATE print_jobs SET status = ?, error = ?, updated_at = ? WHERE status = ?",
+                (UNCERTAIN, 'Interrumpido por reinicio del bot', time.time(), RUNNING)
+            )
+            return jobs
+
+    def purge(self, before: float) -> int:
+        """Borra los trabajos terminados antes de `before` (time.time())"""
+        with self._lock:
+            cursor = self._connection().execute(
+                f"DELETE FROM print_jobs WHERE status IN ({', '.join('?' * len(FINAL_STATUSES))}) "
+                f"AND updated_at < ?", FINAL_STATUSES + (before,)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class PrintJobQueue:
+    """
+    Cola durable de impresiones consumida por un pool de workers asíncronos.
+    - Los handlers encolan y responden al instante con el número de trabajo.
+    - Una impresora (tienda + tipo de documento) procesa un trabajo a la vez.
+    - Los fallos se reintentan con backoff exponencial; al agotar los intentos el trabajo queda 'dead'.
+    - Al terminar, el notifier recibe el trabajo para avisar el resultado al chat.
+    """
+
+    def __init__(self, path: str, workers: int, max_attempts: int, retry_base_delay: float,
+                 retry_max_delay: float, poll_interval: float, retention_days: float):
+        self.store = PrintJobStore(path)
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+
+        self._handlers: Dict[str, Callable[[PrintJob], Awaitable[Dict[str, Any]]]] = {}
+        self._notifier: Optional[Callable[[PrintJob], Awaitable[None]]] = None
+        self._busy_printers: Set[str] = set()
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {'enqueued': 0, 'deduplicated': 0, 'done': 0, 'retries': 0,
+                      'uncertain': 0, 'failed': 0, 'dead': 0}
+
+    def register(self, kind: str, handler: Callable[[PrintJob], Awaitable[Dict[str, Any]]]):
+        """Función que procesa los trabajos de este tipo y retorna el dict de resultado del servicio"""
+        self._handlers[kind] = handler
+
+    @staticmethod
+    def printer_key(store_code: str, document_type: str) -> str:
+        # La impresora real la decide el SP al imprimir; tienda + tipo la aproxima
+        # (facturas y notas de crédito en caja, comandas en cocina)
+        printer = 'cocina' if document_type == 'comanda' else 'caja'
+        return f"{store_code.strip().upper()}:{printer}"
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def submit(self, kind: str, store_code: str, document_type: str, document_id: str,
+                     chat_id: Optional[int] = None, message_id: Optional[int] = None,
+                     requested_by: str = '', reason: str = '') -> Tuple[PrintJob, bool]:
+        """Encola la impresión; retorna (trabajo, creado). creado=False si el documento ya estaba en cola"""
+        store_code = store_code.strip().upper()
+        document_id = str(document_id).strip()
+        job, created = await self._call(
+            self.store.enqueue, kind, store_code, document_type, document_id,
+            self.printer_key(store_code, document_type), self.max_attempts,
+            chat_id, message_id, requested_by, reason
+        )
+        if created:
+            self.stats['enqueued'] += 1
+            logger.info(f"🧾 Trabajo de impresión #{job.id} en cola: {kind} {document_type} {document_id} "
+                        f"({store_code})")
+            if self._wakeup is not None:
+                self._wakeup.set()
+        else:
+            self.stats['deduplicated'] += 1
+            logger.info(f"🧾 {document_type} {document_id} ya tiene el trabajo #{job.id} ({job.status})")
+        return job, created
+
+    async def attach_message(self, job_id: int, chat_id: int, message_id: int):
+        """Mensaje del chat que se actualizará con el resultado del trabajo"""
+        await self._call(self.store.attach_message, job_id, chat_id, message_id)
+
+    async def get(self, job_id: int) -> Optional[PrintJob]:
+        return await self._call(self.store.get, job_id)
+
+    async def recent(self, limit: int = 10, statuses: tuple = ()) -> List[PrintJob]:
+        return await self._call(self.store.recent, limit, statuses)
+
+    async def counts(self) -> Dict[str, int]:
+        return await self._call(self.store.counts)
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = dict(self.stats)
+        data['busy_printers'] = len(self._busy_printers)
+        data['workers'] = sum(1 for task in self._tasks if not task.done())
+        return data
+
+    async def start(self, notifier: Optional[Callable[[PrintJob], Awaitable[None]]] = None):
+        if any(not task.done() for task in self._tasks):
+            return
+        self._notifier = notifier
+        self._claim_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+        for job in await self._call(self.store.recover):
+            logger.warning(f"⚠️ Trabajo de impresión #{job.id} interrumpido por reinicio: queda sin confirmar")
+            job.status, job.error = UNCERTAIN, 'Interrumpido por reinicio del bot'
+            await self._notify(job)
+        if self.retention_days > 0:
+            purged = await self._call(self.store.purge, time.time() - self.retention_days * 86400)
+            if purged:
+                logger.info(f"🧹 {purged} trabajos de impresión antiguos eliminados")
+
+        self._tasks = [asyncio.create_task(self._worker(), name=f'print-worker-{n}') for n in range(self.workers)]
+        logger.info(f"🖨️ Cola de impresión iniciada ({self.workers} workers, {self.store.path})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Un trabajo cortado aquí queda 'running' y al arrancar se marca sin confirmar
+        self.store.close()
+
+    def _retry_delay(self, attempts: int) -> float:
+        """Backoff exponencial con jitter: entre la mitad y el total de base * 2^(intento-1) (con tope)"""
+        ceiling = min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempts - 1)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    async def _next_job(self) -> Optional[PrintJob]:
+        async with self._claim_lock:
+            job = await self._call(self.store.claim, set(self._busy_printers))
+            if job is not None:
+                self._busy_printers.add(job.printer_key)
+            return job
+
+    async def _sleep_until_due(self):
+        # Despierta al encolar/terminar un trabajo, o cuando vence el próximo reintento
+        next_due = await self._call(self.store.next_due)
+        timeout = self.poll_interval
+        if next_due is not None:
+            timeout = min(timeout, max(0.05, next_due - time.time()))
+        # asyncio.wait y no wait_for: wait_for puede tragarse la cancelación de stop()
+        # si el evento se activa en el mismo instante
+        waiter = asyncio.ensure_future(self._wakeup.wait())
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        finally:
+            waiter.cancel()
+
+    async def _worker(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                job = await self._next_job()
+                if job is None:
+                    await self._sleep_until_due()
+                    continue
+                try:
+                    await self._process(job)
+                finally:
+                    self._busy_printers.discard(job.printer_key)
+                    # La impresora quedó libre: otro worker puede tomar su siguiente trabajo
+                    self._wakeup.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error en worker de impresión: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process(self, job: PrintJob):
+        handler = self._handlers.get(job.kind)
+        logger.info(f"🖨️ Procesando trabajo #{job.id} (intento {job.attempts}/{job.max_attempts}) "
+                    f"en {job.printer_key}")
+        if handler is None:
+            await self._finish(job, DEAD, {}, f"Tipo de trabajo sin procesador: {job.kind}")
+            return
+
+        try:
+            result = await handler(job)
+        except Exception as e:
+            logger.error(f"❌ Trabajo de impresión #{job.id} falló: {str(e)}")
+            result = {'success': False, 'message': str(e)}
+        error = result.get('message') or result.get('error') or ''
+
+        if result.get('success'):
+            await self._finish(job, DONE, result)
+        elif result.get('uncertain'):
+            # Pudo haber impreso: reintentarlo podría duplicar la impresión
+            await self._finish(job, UNCERTAIN, result, error)
+        elif result.get('retryable') is False:
+            await self._finish(job, FAILED, result, error)
+        elif job.attempts >= job.max_attempts:
+            await self._finish(job, DEAD, result, error)
+        else:
+            delay = self._retry_delay(job.attempts)
+            self.stats['retries'] += 1
+            logger.warning(f"🔁 Trabajo de impresión #{job.id} se reintenta en {delay:.0f}s: {error}")
+            await self._call(self.store.reschedule, job.id, time.time() + delay, error)
+
+    async def _finish(self, job: PrintJob, status: str, result: Dict[str, Any], error: str = ''):
+        await self._call(self.store.finish, job.id, status, result, error)
+        job.status, job.result, job.error = status, result, error
+        self.stats[status] += 1
+        icon = {DONE: '✅', UNCERTAIN: '⚠️', FAILED: '❌', DEAD: '💀'}[status]
+        logger.info(f"{icon} Trabajo de impresión #{job.id} terminó: {status} (intentos: {job.attempts})")
+        await self._notify(job)
+
+    async def _notify(self, job: PrintJob):
+        if self._notifier is None:
+            return
+        try:
+            await self._notifier(job)
+        except Exception as e:
+            logger.error(f"❌ No se pudo avisar el resultado del trabajo #{job.id}: {str(e)}")
+
+
+# Global print job queue
+print_queue = PrintJobQueue(
+    path=settings.print.queue_db,
+    workers=settings.print.queue_workers,
+    max_attempts=settings.print.queue_max_attempts,
+    retry_base_delay=settings.print.queue_retry_base_delay,
+    retry_max_delay=settings.print.queue_retry_max_delay,
+    poll_interval=settings.print.queue_poll_interval,
+    retention_days=settings.print.queue_retention_days
+)
@@ -1,10 +1,19 @@
-import requests
+import asyncio
 import json
+import threading
 from typing import Optional, Dict, Any
 import time
 
+import aiohttp
+
 from src.config.settings import settings
+from src.config.store_registry import store_registry
 from src.database.connection import db_manager
+from src.database.exceptions import StoreQueryError
+from src.database.print_lookup import print_lookup_plan, record_print_lookup
+from src.services.document_resolver import document_resolver
+from src.services.http_client import RequestNotSentError, http_client
+from src.services.reprint_orchestrator import PrintToken, ReprintStrategy, reprint_orchestrator
 from src.utils.logger import logger
 
 
@@ -12,16 +21,10 @@ class PrintService:
     def __init__(self):
         self.settings = settings.print
 
-    def _get_store_ip(self, store_code: str) -> str:
-        """Get proper IP address for store"""
-        store_number = ''.join(filter(str.isdigit, store_code))
-        store_number_int = int(store_number) if store_number else 0
-        return f'10.101.{store_number_int}.20'
-
-    def _get_print_url(self, document_type: str, store_code: str, document_id: str) -> Optional[str]:
+    async def _get_print_url(self, document_type: str, store_code: str, document_id: str) -> Optional[str]:
         """Generate print URL based on document type"""
         try:
-            server_ip = self._get_store_ip(store_code)
+            server_ip = store_registry.get(store_code).ip
             base_url = f"http://{server_ip}:880"
 
             if document_type == 'factura':
@@ -31,7 +34,7 @@ class PrintService:
             elif document_type == 'comanda':
                 # Usar OrderService para obtener URL de comanda
                 from src.services.order_service import OrderService
-                url = OrderService.get_comanda_url(store_code, document_id)
+                url = await OrderService.get_comanda_url(store_code, document_id)
             else:
                 return None
 
@@ -66,7 +69,7 @@ class PrintService:
             """
 
             logger.info(f"🔧 Ejecutando SP para generar JSON: {document_id}")
-            results = db_manager.execute_query(store_code, sp_query, (document_id,))
+            results = await db_manager.execute_query_async(store_code, sp_query, (document_id,))
 
             if results and results[0][0]:
                 json_data = results[0][0]
@@ -99,37 +102,43 @@ class PrintService:
             # Enviar a la API de impresión
             logger.info(f"📤 Enviando a API de impresión: {self.settings.api_url}")
 
-            response = requests.post(
-                self.settings.api_url,
-                json=print_data,
-                timeout=30,
-                headers={'Content-Type': 'application/json'}
-            )
+            response = await http_client.post_json(self.settings.api_url, print_data)
 
-            if response.status_code == 200:
+            if response.status == 200:
                 logger.info("✅ Impresión enviada exitosamente vía API")
                 return {
                     'success': True,
                     'printer': printer_id
                 }
             else:
-                logger.error(f"❌ Error en API: {response.status_code} - {response.text}")
+                logger.error(f"❌ Error en API: {response.status} - {response.text}")
                 return {
                     'success': False,
-                    'message': f'Error en API de impresión: {response.status_code}'
+                    'message': f'Error en API de impresión: {response.status}'
                 }
 
-        except requests.exceptions.Timeout:
+        except (RequestNotSentError, aiohttp.ClientConnectorError):
+            # No llegó a enviarse (conexión rechazada o plazo de conexión agotado): fallo seguro de reintentar
+            logger.error("🌐 Error de conexión con API")
+            return {
+                'success': False,
+                'message': 'Error de conexión con API de impresión'
+            }
+        except asyncio.TimeoutError:
+            # Plazo agotado con la petición ya enviada: la API pudo haber recibido el trabajo
             logger.error("⏰ Timeout en API de impresión")
             return {
                 'success': False,
+                'uncertain': True,
                 'message': 'Timeout en la conexión con API de impresión'
             }
-        except requests.exceptions.ConnectionError:
-            logger.error("🌐 Error de conexión con API")
+        except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError, aiohttp.ClientPayloadError):
+            # Conexión cortada después de enviar la petición
+            logger.error("🌐 Conexión con API interrumpida")
             return {
                 'success': False,
-                'message': 'Error de conexión con API de impresión'
+                'uncertain': True,
+                'message': 'Conexión con API de impresión interrumpida'
             }
         except Exception as e:
             logger.error(f"❌ Error enviando a API: {str(e)}")
@@ -138,8 +147,20 @@ class PrintService:
                 'message': f'Error de conexión con API: {str(e)}'
             }
 
-    async def _execute_print_sp(self, store_code: str, document_type: str, document_id: str) -> Dict[str, Any]:
+    async def _reprint_via_api(self, token: PrintToken, store_code: str, document_id: str) -> Dict[str, Any]:
+        """PRIMER INTENTO: JSON generado por SP y envío a la API de impresión"""
+        logger.info("1️⃣ PRIMER INTENTO: Generando JSON con SP...")
+        json_result = await self._generate_json_with_sp(store_code, document_id)
+        if not json_result['success']:
+            return json_result
+
+        logger.info("✅ JSON generado exitosamente, enviando a API...")
+        return await token.print_once('json_api', lambda: self._send_to_print_api(json_result['json_data']))
+
+    async def _execute_print_sp(self, store_code: str, document_type: str, document_id: str,
+                                token: PrintToken) -> Dict[str, Any]:
         """SEGUNDO INTENTO: Ejecutar SP directo de impresión"""
+        logger.info("2️⃣ SEGUNDO INTENTO: Ejecutando SP directo...")
         try:
             sp_name = ""
             params = ()
@@ -150,13 +171,9 @@ class PrintService:
                 params = (document_id, tipo)
             elif document_type == 'comanda':
                 # Para comanda, obtener ODP_ID primero
-                results = db_manager.execute_query(
-                    store_code,
-                    "SELECT TOP 1 IDCabeceraordenPedido FROM Cabecera_Factura WHERE cfac_id = ?",
-                    (document_id,)
-                )
-                if results:
-                    odp_id = results[0][0]
+                identity = await document_resolver.resolve_async(store_code, document_id)
+                if identity and identity.odp_id:
+                    odp_id = identity.odp_id
                     sp_name = "ordenpedido.USP_impresion_orden_pedido"
                     params = (odp_id,)
                 else:
@@ -165,19 +182,43 @@ class PrintService:
                         'message': 'No se encontró ODP_ID para la comanda'
                     }
 
-            # Ejecutar SP directo
-            logger.info(f"🔧 Ejecutando SP: {sp_name} con parámetros: {params}")
-            db_manager.execute_query(
-                store_code,
-                f"EXEC {sp_name} {'?, ?' if len(params) == 2 else '?'}",
-                params
-            )
+            # Conexión lista antes de tomar el token: un fallo aquí seguro no imprimió
+            await db_manager.run_async(store_code, db_manager.connect_store, store_code)
+
+            async def execute_sp():
+                logger.info(f"🔧 Ejecutando SP: {sp_name} con parámetros: {params}")
+                query = f"EXEC {sp_name} {'?, ?' if len(params) == 2 else '?'}"
+                state = {'sent': False, 'abandoned': False, 'lock': threading.Lock()}
+                try:
+                    # Sin reintentos: el SP imprime y repetirlo podría duplicar la impresión
+                    await asyncio.wait_for(
+                        db_manager.run_async(store_code, self._run_print_sp, store_code, query, params, state),
+                        timeout=settings.database.query_deadline
+                    )
+                except BaseException as e:
+                    with state['lock']:
+                        # Si el EXEC aún no salió, el hilo ya no lo enviará
+                        state['abandoned'] = True
+                        sent = state['sent']
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    if isinstance(e, StoreQueryError) and sent:
+                        return {'success': False, 'message': f'Error ejecutando stored procedure: {e.detail}'}
+                    if not sent:
+                        # Circuito abierto, pool sin conexiones, login o red: seguro no imprimió
+                        detail = getattr(e, 'detail', '') or str(e) or type(e).__name__
+                        return {'success': False, 'message': f'No se pudo ejecutar el stored procedure: {detail}'}
+                    # Timeout o conexión cortada con el EXEC ya enviado
+                    return {'success': False, 'uncertain': True,
+                            'message': f'Sin confirmación del stored procedure: {str(e) or type(e).__name__}'}
+
+                logger.info("✅ SP ejecutado exitosamente")
+                return {
+                    'success': True,
+                    'printer': 'Impresora por defecto'
+                }
 
-            logger.info("✅ SP ejecutado exitosamente")
-            return {
-                'success': True,
-                'printer': 'Impresora por defecto'
-            }
+            return await token.print_once('sp_directo', execute_sp)
 
         except Exception as e:
             logger.error(f"❌ Error en SP directo: {str(e)}")
@@ -186,22 +227,33 @@ class PrintService:
                 'message': f'Error ejecutando stored procedure: {str(e)}'
             }
 
+    @staticmethod
+    def _run_print_sp(store_code: str, query: str, params: tuple, state: Dict[str, Any]):
+        """
+        Ejecuta el SP de impresión (en el executor de BD). state['sent'] indica si el EXEC llegó
+        a enviarse: los errores anteriores (circuito, pool, login) son fallos seguros sin impresión.
+        """
+        with db_manager.get_connection(store_code) as conn:
+            conn.timeout = settings.database.timeout
+            cursor = conn.cursor()
+            with state['lock']:
+                if state['abandoned']:
+                    return
+                state['sent'] = True
+            cursor.execute(query, params)
+
     async def _analyze_print_failure(self, store_code: str, document_type: str, document_id: str) -> Dict[str, Any]:
         """Analizar por qué falló la impresión y dar mensaje claro"""
         try:
             logger.info(f"🔍 Analizando fallo de impresión para {document_type} {document_id}")
 
-            # Verificar si el documento existe
-            if document_type in ['factura', 'nota_credito']:
-                check_query = "SELECT TOP 1 cfac_id FROM Cabecera_Factura WHERE cfac_id = ?"
-            else:  # comanda
-                check_query = "SELECT TOP 1 cfac_id FROM Cabecera_Factura WHERE cfac_id = ?"
-
-            results = db_manager.execute_query(store_code, check_query, (document_id,))
+            # Verificar si el documento existe (misma resolución que usaron los intentos previos)
+            identity = await document_resolver.resolve_async(store_code, document_id)
 
-            if not results:
+            if identity is None:
                 return {
                     'success': False,
+                    'retryable': False,
                     'message': f"❌ *Documento no encontrado* 📭\n\n"
                                f"**Tipo:** {document_type.title()}\n"
                                f"**ID:** `{document_id}`\n"
@@ -212,26 +264,20 @@ class PrintService:
                                f"• Validar en sistema de facturación"
                 }
 
-            # Verificar datos en Canal_Movimiento
-            cm_query = """
-                SELECT TOP 1 imp_url, Canal_MovimientoVarchar1 
-                FROM Canal_Movimiento WITH(NOLOCK)
-                WHERE Canal_MovimientoVarchar3 LIKE ? 
-                AND imp_varchar1 LIKE ?
-            """
-
-            like_pattern = f'%{document_id}%'
-            doc_filter = f'%{document_type}%'
-
-            cm_results = db_manager.execute_query(
-                store_code,
-                cm_query,
-                (like_pattern, doc_filter)
-            )
+            # Verificar datos en Canal_Movimiento (clave exacta y, si no hay coincidencia, LIKE)
+            cm_results = None
+            tier = 'none'
+            for tier_name, cm_query, cm_params in print_lookup_plan(document_id, document_type):
+                cm_results = await db_manager.execute_query_async(store_code, cm_query, cm_params)
+                if cm_results:
+                    tier = tier_name
+                    break
+            record_print_lookup(document_id, tier)
 
             if not cm_results:
                 return {
                     'success': False,
+                    'retryable': False,
                     'message': f"❌ *Datos de impresión no encontrados* 📄\n\n"
                                f"**Tipo:** {document_type.title()}\n"
                                f"**ID:** `{document_id}`\n"
@@ -272,33 +318,33 @@ class PrintService:
         try:
             logger.info(f"🖨️ Iniciando re-impresión de {document_type} {document_id} en tienda {store_code}")
 
-            # PRIMER INTENTO: Generar JSON con SP y consumir API
-            logger.info("1️⃣ PRIMER INTENTO: Generando JSON con SP...")
-            json_result = await self._generate_json_with_sp(store_code, document_id)
-
-            if json_result['success']:
-                logger.info("✅ JSON generado exitosamente, enviando a API...")
-                api_result = await self._send_to_print_api(json_result['json_data'])
-                if api_result['success']:
-                    return {
-                        'success': True,
-                        'printer': api_result.get('printer', 'desconocida'),
-                        'message': f"✅ *Re-impresión exitosa* 🎉\n\n"
-                                   f"🧾 **Documento:** {document_type.title()}\n"
-                                   f"🔢 **ID:** `{document_id}`\n"
-                                   f"🏪 **Tienda:** `{store_code}`\n"
-                                   f"🖨️ **Impresora:** {api_result.get('printer', 'desconocida')}\n\n"
-                                   f"📋 *Por favor verifique la impresión*"
-                    }
-
-            # SEGUNDO INTENTO: Ejecutar SP directo de impresión
-            logger.info("2️⃣ SEGUNDO INTENTO: Ejecutando SP directo...")
-            sp_result = await self._execute_print_sp(store_code, document_type, document_id)
+            # JSON + API primero; el SP directo entra como respaldo o en paralelo si el primero tarda.
+            # La identidad del documento (odp_id de la comanda, análisis de fallo) se consulta desde ya.
+            strategies = [
+                ReprintStrategy('json_api', lambda token: self._reprint_via_api(token, store_code, document_id)),
+                ReprintStrategy('sp_directo', lambda token: self._execute_print_sp(
+                    store_code, document_type, document_id, token))
+            ]
+            prefetch = [lambda: document_resolver.resolve_async(store_code, document_id)]
+            key = ('reprint', store_code.strip().upper(), document_type, str(document_id).strip())
+            result = await reprint_orchestrator.run(key, strategies, prefetch)
+
+            if result.get('success') and result['strategy'] == 'json_api':
+                return {
+                    'success': True,
+                    'printer': result.get('printer', 'desconocida'),
+                    'message': f"✅ *Re-impresión exitosa* 🎉\n\n"
+                               f"🧾 **Documento:** {document_type.title()}\n"
+                               f"🔢 **ID:** `{document_id}`\n"
+                               f"🏪 **Tienda:** `{store_code}`\n"
+                               f"🖨️ **Impresora:** {result.get('printer', 'desconocida')}\n\n"
+                               f"📋 *Por favor verifique la impresión*"
+                }
 
-            if sp_result['success']:
+            if result.get('success'):
                 return {
                     'success': True,
-                    'printer': sp_result.get('printer', 'Impresora por defecto'),
+                    'printer': result.get('printer', 'Impresora por defecto'),
                     'message': f"✅ *Re-impresión enviada* 📤\n\n"
                                f"🧾 **Documento:** {document_type.title()}\n"
                                f"🔢 **ID:** `{document_id}`\n"
@@ -307,6 +353,16 @@ class PrintService:
                                f"📋 *Verifique la impresora por defecto*"
                 }
 
+            if result.get('uncertain'):
+                # Pudo haber impreso: no se intenta otra estrategia para no duplicar
+                return {
+                    'success': False,
+                    'uncertain': True,
+                    'message': f"⚠️ *Impresión sin confirmar*\n\n"
+                               f"**Detalle:** {result.get('message')}\n\n"
+                               f"🖨️ Verifique la impresora antes de volver a intentar"
+                }
+
             # TERCERA OPCIÓN: Análisis detallado del fallo
             logger.info("3️⃣ ANALIZANDO FALLO...")
             analysis = await self._analyze_print_failure(store_code, document_type, document_id)
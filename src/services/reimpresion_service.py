@@ -1,9 +1,13 @@
 # src/services/reimpresion_service.py
-import requests
+import asyncio
 import logging
 from typing import Dict, Any
-import pyodbc
+import aiohttp
 from src.config.settings import settings
+from src.database.connection import ConnectionLease, ConnectionLeaseGroup, db_manager
+from src.database.print_lookup import find_print_data, print_lookup_plan
+from src.services.http_client import RequestNotSentError, http_client
+from src.services.reprint_orchestrator import PrintToken, ReprintStrategy, reprint_orchestrator
 
 logger = logging.getLogger(__name__)
 
@@ -13,43 +17,40 @@ class ReimpresionService:
         self.url_api = settings.print.api_url
         self.db_config = settings.database
 
-    def get_db_connection(self):
-        """Crear conexión a la base de datos"""
-        try:
-            connection_string = (
-                f"DRIVER={self.db_config.driver};"
-                f"SERVER=10.101.2.20;"
-                f"DATABASE=MAXPOINT_Local;"
-                f"UID={self.db_config.user};"
-                f"PWD={self.db_config.password};"
-                f"Timeout={self.db_config.timeout};"
-            )
-            return pyodbc.connect(connection_string)
-        except Exception as e:
-            logger.error(f"Error creando conexión: {str(e)}")
-            return None
-
-    def reimprimir_documento(self, cfac_id: str, tipo_documento: str, ip_estacion: str = None) -> Dict[str, Any]:
+    async def reimprimir_documento(self, cfac_id: str, tipo_documento: str, ip_estacion: str = None) -> Dict[str, Any]:
         """
-        Sistema de reimpresión con fallbacks
+        Sistema de reimpresión con fallbacks.
+        Cada método arma los datos en un hilo (pyodbc es bloqueante) y el envío a la API es asíncrono.
         """
         try:
             logger.info(f"Iniciando reimpresión: {cfac_id} - {tipo_documento}")
 
-            # Método 1: Consulta directa
-            resultado = self._metodo_consulta_directa(cfac_id, tipo_documento)
-
-            if not resultado.get('success'):
-                logger.info("Método 1 falló, intentando Método 2...")
-                # Método 2: Stored Procedure
-                resultado = self._metodo_stored_procedure(cfac_id, tipo_documento, ip_estacion)
-
-            if not resultado.get('success'):
-                logger.info("Método 2 falló, intentando Método 3...")
-                # Método 3: USP final
-                resultado = self._metodo_usp_final(cfac_id, tipo_documento)
-
-            if not resultado.get('success'):
+            # Conexiones del pool de LOCAL para toda la cadena: los métodos en secuencia comparten
+            # una; un método lanzado en paralelo (hedging) toma otra para no esperar al lento
+            leases = db_manager.lease_group('LOCAL', reprint_orchestrator.max_parallel)
+            try:
+                # Métodos 1 -> 2 -> 3; si uno tarda, el siguiente arranca en paralelo y solo uno imprime
+                estrategias = [
+                    ReprintStrategy('consulta_directa', lambda token: self._intentar(
+                        token, 'consulta_directa', leases, self._metodo_consulta_directa, cfac_id, tipo_documento)),
+                    ReprintStrategy('stored_procedure', lambda token: self._intentar(
+                        token, 'stored_procedure', leases, self._metodo_stored_procedure, cfac_id, tipo_documento,
+                        ip_estacion)),
+                    ReprintStrategy('usp_final', lambda token: self._intentar(
+                        token, 'usp_final', leases, self._metodo_usp_final, cfac_id, tipo_documento))
+                ]
+                resultado = await reprint_orchestrator.run(
+                    ('reimpresion', str(cfac_id).strip(), tipo_documento), estrategias
+                )
+            finally:
+                # No espera a un método cancelado: su conexión la devuelve su hilo al terminar
+                await asyncio.get_running_loop().run_in_executor(None, leases.close)
+            logger.info(f"Cadena de reimpresión de {cfac_id}: {leases.uses} consultas con "
+                        f"{leases.connections} conexión(es)")
+
+            if resultado.get('uncertain'):
+                logger.warning(f"Reimpresión de {cfac_id} sin confirmar: no se reintenta para no duplicar")
+            elif not resultado.get('success'):
                 logger.error("Todos los métodos fallaron")
                 resultado = self._mensaje_soporte(cfac_id)
 
@@ -66,43 +67,33 @@ class ReimpresionService:
                 "requires_support": True
             }
 
-    def _metodo_consulta_directa(self, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
+    async def _intentar(self, token: PrintToken, nombre: str, leases: ConnectionLeaseGroup, metodo,
+                        *args) -> Dict[str, Any]:
+        """
+        Ejecuta la parte de BD de un método fuera del event loop con su propia conexión del grupo y,
+        si armó los datos, los envía solo si este método obtiene el token de impresión
+        """
+        resultado = await asyncio.get_running_loop().run_in_executor(
+            None, self._con_conexion, leases, metodo, *args
+        )
+        if not resultado.get('success'):
+            return resultado
+        return await token.print_once(nombre, lambda: self._enviar_a_impresora(resultado['datos']))
+
+    @staticmethod
+    def _con_conexion(leases: ConnectionLeaseGroup, metodo, *args) -> Dict[str, Any]:
+        with leases.acquire() as lease:
+            return metodo(lease, *args)
+
+    def _metodo_consulta_directa(self, lease: ConnectionLease, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
         """Método 1: Consulta directa"""
-        connection = None
         try:
-            connection = self.get_db_connection()
-            if not connection:
-                return {"success": False, "error": "No se pudo conectar a la base de datos"}
-
-            cursor = connection.cursor()
-
-            # Determinar query según tipo de documento
-            if tipo_documento == 'factura':
-                query = """
-                SELECT imp_url, Canal_MovimientoVarchar1 
-                FROM Canal_Movimiento 
-                WHERE Canal_MovimientoVarchar3 LIKE ? 
-                AND imp_varchar1 like '%factura%'
-                """
-            elif tipo_documento == 'nota_credito':
-                query = """
-                SELECT imp_url, Canal_MovimientoVarchar1 
-                FROM Canal_Movimiento 
-                WHERE Canal_MovimientoVarchar3 LIKE ? 
-                AND imp_varchar1 like '%nota_credito%'
-                """
-            elif tipo_documento == 'comanda':
-                query = """
-                SELECT imp_url, Canal_MovimientoVarchar1 
-                FROM Canal_Movimiento 
-                WHERE Canal_MovimientoVarchar3 LIKE ? 
-                AND imp_varchar1 like '%orden%'
-                """
-            else:
+            # Búsqueda escalonada: clave exacta primero, LIKE con comodines solo como respaldo
+            if not print_lookup_plan(cfac_id, tipo_documento):
                 return {"success": False, "error": "Tipo de documento no válido"}
 
-            cursor.execute(query, '%' + cfac_id + '%')
-            result = cursor.fetchone()
+            with lease.use() as connection:
+                result, _ = find_print_data(connection.cursor(), cfac_id, tipo_documento)
 
             if result:
                 imp_url, canal_movimiento = result
@@ -116,30 +107,21 @@ class ReimpresionService:
                     "reimpresion": True
                 }
 
-                return self._enviar_a_impresora(datos_impresion)
+                return {"success": True, "datos": datos_impresion}
             else:
                 return {"success": False, "error": "No se encontró registro en Canal_Movimiento"}
 
         except Exception as e:
             logger.error(f"Error en método 1 (consulta directa): {str(e)}")
             return {"success": False, "error": str(e)}
-        finally:
-            if connection:
-                connection.close()
 
-    def _metodo_stored_procedure(self, cfac_id: str, tipo_documento: str, ip_estacion: str) -> Dict[str, Any]:
+    def _metodo_stored_procedure(self, lease: ConnectionLease, cfac_id: str, tipo_documento: str,
+                                 ip_estacion: str) -> Dict[str, Any]:
         """Método 2: Stored Procedure"""
-        connection = None
         try:
             if not ip_estacion:
                 return {"success": False, "error": "IP de estación requerida para este método"}
 
-            connection = self.get_db_connection()
-            if not connection:
-                return {"success": False, "error": "No se pudo conectar a la base de datos"}
-
-            cursor = connection.cursor()
-
             sp_query = """
             DECLARE @impresiones TABLE
             (
@@ -159,8 +141,10 @@ class ReimpresionService:
             FROM @impresiones
             """
 
-            cursor.execute(sp_query, cfac_id, ip_estacion)
-            result = cursor.fetchone()
+            with lease.use() as connection:
+                cursor = connection.cursor()
+                cursor.execute(sp_query, cfac_id, ip_estacion)
+                result = cursor.fetchone()
 
             if result and result[0]:
                 datos_json = result[0]
@@ -173,27 +157,17 @@ class ReimpresionService:
                     "reimpresion": True
                 }
 
-                return self._enviar_a_impresora(datos_impresion)
+                return {"success": True, "datos": datos_impresion}
             else:
                 return {"success": False, "error": "SP no retornó datos"}
 
         except Exception as e:
             logger.error(f"Error en método 2 (stored procedure): {str(e)}")
             return {"success": False, "error": str(e)}
-        finally:
-            if connection:
-                connection.close()
 
-    def _metodo_usp_final(self, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
+    def _metodo_usp_final(self, lease: ConnectionLease, cfac_id: str, tipo_documento: str) -> Dict[str, Any]:
         """Método 3: USP final"""
-        connection = None
         try:
-            connection = self.get_db_connection()
-            if not connection:
-                return {"success": False, "error": "No se pudo conectar a la base de datos"}
-
-            cursor = connection.cursor()
-
             # Determinar tipo de comprobante
             tipo_comprobante = 'F'  # Factura por defecto
             if tipo_documento == 'nota_credito':
@@ -204,8 +178,10 @@ class ReimpresionService:
             # Ejecutar USP final
             usp_query = "EXEC [facturacion].[USP_impresiondinamica_factura] ?, ?"
 
-            cursor.execute(usp_query, cfac_id, tipo_comprobante)
-            result = cursor.fetchall()
+            with lease.use() as connection:
+                cursor = connection.cursor()
+                cursor.execute(usp_query, cfac_id, tipo_comprobante)
+                result = cursor.fetchall()
 
             if result:
                 logger.info("USP [facturacion].[USP_impresiondinamica_factura] ejecutado exitosamente")
@@ -227,30 +203,22 @@ class ReimpresionService:
                     "metodo": "usp_final"
                 }
 
-                return self._enviar_a_impresora(datos_impresion)
+                return {"success": True, "datos": datos_impresion}
             else:
                 return {"success": False, "error": "USP no retornó datos"}
 
         except Exception as e:
             logger.error(f"Error en método 3 (USP final): {str(e)}")
             return {"success": False, "error": str(e)}
-        finally:
-            if connection:
-                connection.close()
 
-    def _enviar_a_impresora(self, datos: Dict) -> Dict[str, Any]:
+    async def _enviar_a_impresora(self, datos: Dict) -> Dict[str, Any]:
         """Enviar a la API de impresión"""
         try:
             logger.info(f"Enviando a API de impresión: {self.url_api}")
 
-            response = requests.post(
-                self.url_api,
-                json=datos,
-                timeout=30,
-                headers={'Content-Type': 'application/json'}
-            )
+            response = await http_client.post_json(self.url_api, datos)
 
-            if response.status_code == 200:
+            if response.status == 200:
                 respuesta_api = response.json()
                 logger.info("✅ API de impresión respondió exitosamente")
                 return {
@@ -260,19 +228,27 @@ class ReimpresionService:
                     "constancia": "RE IMPRESIÓN DE DOCUMENTO"
                 }
             else:
-                logger.error(f"❌ Error API impresión: {response.status_code}")
+                logger.error(f"❌ Error API impresión: {response.status}")
                 return {
                     "success": False,
-                    "error": f"Error en API: {response.status_code}",
+                    "error": f"Error en API: {response.status}",
                     "api_response": response.text
                 }
 
-        except requests.exceptions.Timeout:
-            logger.error("⏰ Timeout en API de impresión")
-            return {"success": False, "error": "Timeout en conexión con API de impresión"}
-        except requests.exceptions.ConnectionError:
+        except (RequestNotSentError, aiohttp.ClientConnectorError):
+            # No llegó a enviarse: fallo seguro, los métodos siguientes pueden intentarlo
             logger.error("🔌 Error de conexión con API de impresión")
             return {"success": False, "error": "No se pudo conectar con API de impresión"}
+        except asyncio.TimeoutError:
+            # Plazo agotado con la petición ya enviada: la API pudo haber recibido el trabajo
+            logger.error("⏰ Timeout en API de impresión")
+            return {"success": False, "uncertain": True,
+                    "error": "Timeout en conexión con API de impresión; verifique la impresora antes de reintentar"}
+        except (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError, aiohttp.ClientPayloadError):
+            # Conexión cortada después de enviar la petición
+            logger.error("🔌 Conexión con API de impresión interrumpida")
+            return {"success": False, "uncertain": True,
+                    "error": "Conexión con API de impresión interrumpida; verifique la impresora antes de reintentar"}
         except Exception as e:
             logger.error(f"❌ Error inesperado en API: {str(e)}")
             return {"success": False, "error": f"Error de conexión: {str(e)}"}
@@ -0,0 +1,176 @@
+import asyncio
+import io
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from src.utils.logger import logger
+
+
+class RenderQueueFullError(Exception):
+    """La fila de renderizado está llena; el usuario debe reintentar más tarde"""
+
+
+class _RenderJob:
+    __slots__ = ('store_code', 'key', 'func', 'args', 'future')
+
+    def __init__(self, store_code: str, key: Hashable, func: Callable, args: tuple,
+                 future: asyncio.Future):
+        self.store_code = store_code
+        self.key = key
+        self.func = func
+        self.args = args
+        self.future = future
+
+
+class RenderScheduler:
+    """
+    Fila acotada para la generación de imágenes:
+    - límite global de renderizados simultáneos y límite por tienda
+    - reparto round-robin entre tiendas, para que una ráfaga de una tienda no acapare la fila
+    - peticiones idénticas en curso comparten el mismo resultado
+    - rechazo inmediato cuando la fila está llena
+    Vive en el event loop: todo el estado se modifica desde el loop, sin locks.
+    """
+
+    def __init__(self, global_limit: int, per_store_limit: int, max_queue: int):
+        self.global_limit = max(1, global_limit)
+        self.per_store_limit = max(1, per_store_limit)
+        self.max_queue = max(0, max_queue)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.global_limit, thread_name_prefix='render')
+        self._queues: "OrderedDict[str, Deque[_RenderJob]]" = OrderedDict()
+        self._running_by_store: Dict[str, int] = {}
+        self._running = 0
+        self._queued = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {'submitted': 0, 'deduped': 0, 'rejected': 0, 'queued': 0, 'completed': 0, 'failed': 0}
+
+    async def submit(self, store_code: str, key: Hashable, func: Callable, *args,
+                     on_queued: Optional[Callable[[int], Awaitable[Any]]] = None) -> Any:
+        """
+        Ejecuta func(*args) en un hilo de renderizado respetando los límites.
+        Si tiene que esperar turno, llama a on_queued(posición) (1 = el siguiente en salir).
+        """
+        existing = self._inflight.get(key)
+        if existing is not None:
+            self.stats['deduped'] += 1
+            logger.info(f"🔁 Renderizado {key} ya en curso, se comparte el resultado")
+            return self._own_copy(await asyncio.shield(existing))
+
+        if self._queued >= self.max_queue and not self._has_free_slot(store_code):
+            self.stats['rejected'] += 1
+            raise RenderQueueFullError(f"Fila de renderizado llena ({self._queued} en espera)")
+
+        loop = asyncio.get_running_loop()
+        job = _RenderJob(store_code, key, func, args, loop.create_future())
+        self._inflight[key] = job.future
+        self.stats['submitted'] += 1
+
+        self._queues.setdefault(store_code, deque()).append(job)
+        self._queued += 1
+        self._dispatch()
+
+        if not job.future.done() and self._is_queued(job):
+            self.stats['queued'] += 1
+            if on_queued is not None:
+                try:
+                    await on_queued(self.position(job))
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo notificar la posición en la fila: {str(e)}")
+
+        return self._own_copy(await asyncio.shield(job.future))
+
+    @staticmethod
+    def _own_copy(result: Any) -> Any:
+        """
+        Cada solicitante recibe su propio BytesIO: InputFile lee el stream hasta el final,
+        y con un buffer compartido el segundo usuario enviaría 0 bytes
+        """
+        if isinstance(result, io.BytesIO):
+            return io.BytesIO(result.getvalue())
+        return result
+
+    def position(self, job: _RenderJob) -> int:
+        """Posición estimada del trabajo según el orden round-robin entre tiendas"""
+        for index, queued_job in enumerate(self._dispatch_order(), start=1):
+            if queued_job is job:
+                return index
+        return 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = dict(self.stats)
+        data.update({
+            'running': self._running,
+            'waiting': self._queued,
+            'global_limit': self.global_limit,
+            'per_store_limit': self.per_store_limit,
+            'max_queue': self.max_queue
+        })
+        return data
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _has_free_slot(self, store_code: str) -> bool:
+        return (self._running < self.global_limit
+                and self._running_by_store.get(store_code, 0) < self.per_store_limit
+                and not self._queues.get(store_code))
+
+    def _is_queued(self, job: _RenderJob) -> bool:
+        return job in self._queues.get(job.store_code, ())
+
+    def _dispatch_order(self) -> List[_RenderJob]:
+        """Orden en el que saldrían los trabajos en espera: una de cada tienda por ronda"""
+        order = []
+        queues = [list(q) for q in self._queues.values() if q]
+        depth = 0
+        while queues:
+            queues = [q for q in queues if len(q) > depth]
+            order.extend(q[depth] for q in queues)
+            depth += 1
+        return order
+
+    def _dispatch(self):
+        """Arranca trabajos mientras haya cupo global, rotando entre tiendas con cupo propio"""
+        while self._running < self.global_limit and self._queued:
+            for store_code in list(self._queues):
+                queue = self._queues[store_code]
+                if queue and self._running_by_store.get(store_code, 0) < self.per_store_limit:
+                    # La tienda atendida pasa al final de la rotación
+                    self._queues.move_to_end(store_code)
+                    self._start(queue.popleft())
+                    break
+            else:
+                return  # las tiendas en espera ya están en su límite
+
+    def _start(self, job: _RenderJob):
+        self._queued -= 1
+        self._running += 1
+        self._running_by_store[job.store_code] = self._running_by_store.get(job.store_code, 0) + 1
+
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self._executor, job.func, *job.args)
+        task.add_done_callback(lambda done: self._finish(job, done))
+
+    def _finish(self, job: _RenderJob, done: asyncio.Future):
+        self._running -= 1
+        remaining = self._running_by_store.get(job.store_code, 1) - 1
+        if remaining > 0:
+            self._running_by_store[job.store_code] = remaining
+        else:
+            self._running_by_store.pop(job.store_code, None)
+            if not self._queues.get(job.store_code):
+                self._queues.pop(job.store_code, None)
+        self._inflight.pop(job.key, None)
+
+        if done.cancelled():
+            job.future.cancel()
+        elif done.exception() is not None:
+            self.stats['failed'] += 1
+            job.future.set_exception(done.exception())
+        else:
+            self.stats['completed'] += 1
+            job.future.set_result(done.result())
+
+        self._dispatch()
@@ -0,0 +1,52 @@
+import time
+from typing import Tuple
+
+from src.utils.metrics import HistogramFamily
+
+# Estado de la página que define si ya se puede capturar
+_READINESS_SCRIPT = """
+var body = document.body;
+return {
+    readyState: document.readyState,
+    pendingImages: Array.prototype.filter.call(document.images, function (img) {
+        return !img.complete;
+    }).length,
+    resources: window.performance ? performance.getEntriesByType('resource').length : 0,
+    height: Math.max(body ? body.scrollHeight : 0, document.documentElement.scrollHeight)
+};
+"""
+
+# Segundos de espera de renderizado por tienda
+render_wait_histograms = HistogramFamily(buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8))
+
+
+def wait_until_ready(driver, max_wait: float, poll_interval: float = 0.1,
+                     stable_polls: int = 2) -> Tuple[float, bool]:
+    """
+    Espera a que la página esté lista para la captura:
+    document.readyState completo, todas las imágenes cargadas, sin recursos de red nuevos
+    y la altura del DOM sin cambios durante `stable_polls` sondeos seguidos.
+    Retorna (segundos esperados, si se alcanzó la estabilidad antes de max_wait).
+    """
+    start = time.monotonic()
+    last_signature = None
+    stable = 0
+
+    while True:
+        state = driver.execute_script(_READINESS_SCRIPT) or {}
+        signature = (state.get('resources'), state.get('height'))
+        ready = state.get('readyState') == 'complete' and state.get('pendingImages') == 0
+
+        if ready and signature == last_signature:
+            stable += 1
+        else:
+            stable = 0
+        last_signature = signature
+
+        elapsed = time.monotonic() - start
+        if stable >= stable_polls:
+            return elapsed, True
+        if elapsed >= max_wait:
+            return elapsed, False
+
+        time.sleep(poll_interval)
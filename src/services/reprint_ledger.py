@@ -0,0 +1,320 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from src.config.settings import settings
+from src.utils.logger import logger
+
+
+class SqliteReprintBackend:
+    """
+    Contadores de reimpresión en un archivo SQLite (modo WAL). La reserva es una sola sentencia
+    UPSERT condicionada al límite, así que es atómica también entre procesos que comparten el archivo.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            # La clave primaria (tipo, id) es el índice de búsqueda; updated_at sirve para compactar
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reprint_ledger (
+                    document_type TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (document_type, document_id)
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_reprint_ledger_updated ON reprint_ledger (updated_at)')
+            self._conn = conn
+        return self._conn
+
+    def try_reserve(self, document_type: str, document_id: str, limit: int) -> Tuple[bool, int]:
+        now = time.time()
+        expired = now - self.ttl
+        with self._lock:
+            conn = self._connection()
+            # Un contador vencido (aún sin compactar) empieza de nuevo
+            cursor = conn.execute(
+                "INSERT INTO reprint_ledger (document_type, document_id, count, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (document_type, document_id) DO UPDATE SET "
+                "count = CASE WHEN updated_at < ? THEN 1 ELSE count + 1 END, updated_at = excluded.updated_at "
+                "WHERE count < ? OR updated_at < ?",
+                (document_type, document_id, now, expired, limit, expired)
+            )
+            allowed = cursor.rowcount == 1
+            row = conn.execute(
+                "SELECT count FROM reprint_ledger WHERE document_type = ? AND document_id = ?",
+                (document_type, document_id)
+            ).fetchone()
+        return allowed, row[0] if row else 0
+
+    def release(self, document_type: str, document_id: str):
+        with self._lock:
+            self._connection().execute(
+                "UPDATE reprint_ledger SET count = count - 1 "
+                "WHERE document_type = ? AND document_id = ? AND count > 0",
+                (document_type, document_id)
+            )
+
+    def count(self, document_type: str, document_id: str) -> int:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT count FROM reprint_ledger WHERE document_type = ? AND document_id = ? AND updated_at >= ?",
+                (document_type, document_id, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def compact(self) -> int:
+        with self._lock:
+            cursor = self._connection().execute(
+                "DELETE FROM reprint_ledger WHERE updated_at < ? OR count <= 0", (time.time() - self.ttl,)
+            )
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RedisReprintBackend:
+    """
+    Contadores compartidos en Redis para varias instancias del bot: una clave por documento,
+    reserva atómica con un script Lua y vencimiento nativo (EXPIRE) como compactación.
+    """
+
+    name = 'redis'
+
+    _RESERVE_SCRIPT = """
+        local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+        if current >= tonumber(ARGV[1]) then
+            return {0, current}
+        end
+        current = redis.call('INCR', KEYS[1])
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+        return {1, current}
+    """
+    _RELEASE_SCRIPT = """
+        local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+        if current > 0 then
+            return redis.call('DECR', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = 'kfc:reimpresiones'):
+        # Dependencia opcional: solo se importa si se configura este backend
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._client.ping()
+        self._reserve = self._client.register_script(self._RESERVE_SCRIPT)
+        self._release = self._client.register_script(self._RELEASE_SCRIPT)
+
+    def _key(self, document_type: str, document_id: str) -> str:
+        return f"{self.prefix}:{document_type}:{document_id}"
+
+    def try_reserve(self, document_type: str, document_id: str, limit: int) -> Tuple[bool, int]:
+        allowed, current = self._reserve(keys=[self._key(document_type, document_id)],
+                                         args=[limit, max(1, int(self.ttl))])
+        return bool(allowed), int(current)
+
+    def release(self, document_type: str, document_id: str):
+        self._release(keys=[self._key(document_type, document_id)])
+
+    def count(self, document_type: str, document_id: str) -> int:
+        return int(self._client.get(self._key(document_type, document_id)) or 0)
+
+    def compact(self) -> int:
+        # Redis vence las claves solo (EXPIRE)
+        return 0
+
+    def close(self):
+        self._client.close()
+
+
+class ReprintLedgerUnavailableError(Exception):
+    """El registro compartido (Redis) no responde: no se puede comprobar el límite de reimpresiones"""
+
+
+class ReprintLedger:
+    """
+    Registro persistente de reimpresiones por documento para aplicar PrintConfig.max_reprints.
+    - try_reserve comprueba el límite y suma la reimpresión en un solo paso atómico.
+    - release devuelve la reserva si la impresión falló de forma segura (no llegó a imprimir).
+    - Backend SQLite local por defecto; con backend 'redis' los contadores se comparten entre
+      instancias. Si Redis no está disponible no se cae a un contador local (cada instancia
+      permitiría su propio límite): las reservas fallan con ReprintLedgerUnavailableError y se
+      reintenta la conexión cada reconnect_interval segundos.
+    """
+
+    def __init__(self, backend: str, path: str, redis_url: str, ttl_days: float, compact_interval: float,
+                 reconnect_interval: float):
+        self.backend_name = backend.lower()
+        self.path = path
+        self.redis_url = redis_url
+        self.ttl = ttl_days * 86400
+        self.compact_interval = compact_interval
+        self.reconnect_interval = reconnect_interval
+
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self._retry_at = 0.0
+        self._last_compaction = 0.0
+        self.stats = {'reserved': 0, 'rejected': 0, 'released': 0, 'compacted': 0,
+                      'unavailable': 0, 'reconnects': 0}
+
+    def _get_backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    def _create_backend(self):
+        if self.backend_name != 'redis':
+            logger.info(f"🧮 Registro de reimpresiones en SQLite ({self.path})")
+            return SqliteReprintBackend(self.path, self.ttl)
+
+        if time.monotonic() < self._retry_at:
+            self.stats['unavailable'] += 1
+            raise ReprintLedgerUnavailableError("Registro de reimpresiones (Redis) no disponible")
+        try:
+            backend = RedisReprintBackend(self.redis_url, self.ttl)
+        except ImportError as e:
+            self._retry_at = time.monotonic() + self.reconnect_interval
+            self.stats['unavailable'] += 1
+            logger.error("❌ REPRINT_LEDGER_BACKEND=redis pero el paquete redis no está instalado "
+                         "(pip install .[redis]): las reimpresiones se rechazan")
+            raise ReprintLedgerUnavailableError("Paquete redis no instalado") from e
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.reconnect_interval
+            self.stats['unavailable'] += 1
+            logger.error(f"❌ Redis no disponible ({str(e)}): las reimpresiones se rechazan hasta reconectar")
+            raise ReprintLedgerUnavailableError(f"Redis no disponible: {str(e)}") from e
+
+        if self.stats['unavailable']:
+            self.stats['reconnects'] += 1
+        logger.info(f"🧮 Registro de reimpresiones en Redis ({self.redis_url})")
+        return backend
+
+    def _disconnect(self, backend, error: Exception):
+        """Redis dejó de responder: se descarta el cliente y se reconecta en la próxima llamada"""
+        with self._backend_lock:
+            if self._backend is backend:
+                self._backend = None
+                self._retry_at = time.monotonic() + self.reconnect_interval
+                self.stats['unavailable'] += 1
+                logger.error(f"❌ Error en Redis ({str(error)}): las reimpresiones se rechazan hasta reconectar")
+        try:
+            backend.close()
+        except Exception:
+            pass
+
+    def _call(self, method: str, *args):
+        backend = self._get_backend()
+        try:
+            return getattr(backend, method)(*args)
+        except Exception as e:
+            if not isinstance(backend, RedisReprintBackend):
+                raise
+            self._disconnect(backend, e)
+            raise ReprintLedgerUnavailableError(f"Redis no disponible: {str(e)}") from e
+
+    def _maybe_compact(self):
+        now = time.monotonic()
+        if now - self._last_compaction < self.compact_interval:
+            return
+        self._last_compaction = now
+        removed = self._call('compact')
+        if removed:
+            self.stats['compacted'] += removed
+            logger.info(f"🧹 {removed} contadores de reimpresión vencidos eliminados")
+
+    @staticmethod
+    def _key(document_type: str, document_id: str) -> Tuple[str, str]:
+        return document_type.strip().lower(), str(document_id).strip()
+
+    def try_reserve_sync(self, document_type: str, document_id: str, limit: int) -> Tuple[bool, int]:
+        """
+        (permitida, reimpresiones contadas). Si está permitida la reimpresión ya quedó sumada.
+        Lanza ReprintLedgerUnavailableError si el registro compartido no responde.
+        """
+        if limit <= 0:
+            self.stats['rejected'] += 1
+            return False, self.count_sync(document_type, document_id)
+
+        self._maybe_compact()
+        allowed, current = self._call('try_reserve', *self._key(document_type, document_id), limit)
+        self.stats['reserved' if allowed else 'rejected'] += 1
+        return allowed, current
+
+    def release_sync(self, document_type: str, document_id: str):
+        try:
+            self._call('release', *self._key(document_type, document_id))
+        except ReprintLedgerUnavailableError as e:
+            # La reserva queda contada: más estricto, nunca permite de más
+            logger.warning(f"⚠️ No se pudo devolver la reimpresión de {document_id}: {str(e)}")
+            return
+        self.stats['released'] += 1
+
+    def count_sync(self, document_type: str, document_id: str) -> int:
+        return self._call('count', *self._key(document_type, document_id))
+
+    async def try_reserve(self, document_type: str, document_id: str, limit: int) -> Tuple[bool, int]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.try_reserve_sync, document_type, document_id, limit
+        )
+
+    async def release(self, document_type: str, document_id: str):
+        await asyncio.get_running_loop().run_in_executor(None, self.release_sync, document_type, document_id)
+
+    async def count(self, document_type: str, document_id: str) -> int:
+        return await asyncio.get_running_loop().run_in_executor(None, self.count_sync, document_type, document_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = dict(self.stats)
+        if self._backend is not None:
+            data['backend'] = self._backend.name
+        elif self.backend_name == 'redis' and time.monotonic() < self._retry_at:
+            data['backend'] = 'redis (sin conexión)'
+        else:
+            data['backend'] = f'{self.backend_name} (sin abrir)'
+        return data
+
+    def close(self):
+        with self._backend_lock:
+            if self._backend is not None:
+                self._backend.close()
+                self._backend = None
+
+
+# Global reprint ledger
+reprint_ledger = ReprintLedger(
+    backend=settings.print.ledger_backend,
+    path=settings.print.ledger_db,
+    redis_url=settings.print.ledger_redis_url,
+    ttl_days=settings.print.ledger_ttl_days,
+    compact_interval=settings.print.ledger_compact_interval,
+    reconnect_interval=settings.print.ledger_reconnect_interval
+)
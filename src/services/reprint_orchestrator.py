@@ -0,0 +1,170 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from src.config.settings import settings
+from src.utils.logger import logger
+from src.utils.singleflight import AsyncSingleFlight
+
+
+class PrintToken:
+    """
+    Token de idempotencia de una reimpresión: solo la estrategia que lo adquiere puede imprimir.
+    Si su envío falla de forma segura (no llegó a imprimir) lo libera y otra puede intentarlo;
+    si imprimió, o no se sabe (timeout a mitad del envío), el token queda consumido.
+    """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.owner: Optional[str] = None
+        self.printed = False
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, strategy: str) -> bool:
+        """Espera a que nadie esté imprimiendo; False si otra estrategia ya consumió el token"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.printed or self.owner is None)
+            if self.printed:
+                return False
+            self.owner = strategy
+            return True
+
+    async def release(self, strategy: str, printed: bool):
+        async with self._condition:
+            if self.owner != strategy:
+                return
+            if printed:
+                self.printed = True
+            else:
+                self.owner = None
+            self._condition.notify_all()
+
+    async def print_once(self, strategy: str, send: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Envía la impresión solo si esta estrategia obtiene el token. Un resultado con
+        'uncertain' (o una cancelación a mitad del envío) consume el token igual que un éxito.
+        """
+        if not await self.acquire(strategy):
+            return {'success': False, 'skipped': True}
+
+        result: Dict[str, Any] = {'success': False, 'uncertain': True}
+        try:
+            result = await send()
+        finally:
+            await self.release(strategy, printed=bool(result.get('success') or result.get('uncertain')))
+        return result
+
+
+@dataclass
+class ReprintStrategy:
+    name: str
+    run: Callable[[PrintToken], Awaitable[Dict[str, Any]]]
+
+
+class ReprintOrchestrator:
+    """
+    Ejecuta la cadena de estrategias de reimpresión:
+    - lanza en paralelo las consultas previas (prefetch) que usarán las estrategias siguientes,
+    - si la estrategia en curso no termina en hedge_delay segundos arranca la siguiente a la par,
+    - gana el primer éxito; el PrintToken garantiza que como máximo una imprime,
+    - dos solicitudes idénticas simultáneas comparten la misma ejecución.
+    """
+
+    def __init__(self, hedge_delay: float, max_parallel: int):
+        self.hedge_delay = hedge_delay
+        self.max_parallel = max(1, max_parallel)
+        self._flights = AsyncSingleFlight()
+        self.stats = {'runs': 0, 'hedged': 0, 'fallback_wins': 0, 'uncertain': 0, 'failed': 0}
+
+    async def run(self, key: Hashable, strategies: List[ReprintStrategy],
+                  prefetch: Iterable[Callable[[], Awaitable[Any]]] = ()) -> Dict[str, Any]:
+        """Retorna el resultado ganador con 'strategy'; si ninguna imprimió, el último fallo"""
+        return await self._flights.do(key, lambda: self._run(key, strategies, prefetch))
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = dict(self.stats)
+        # Solicitudes idénticas que se unieron a una reimpresión en curso en vez de imprimir otra vez
+        data['joined'] = self._flights.stats['shared']
+        return data
+
+    async def _run(self, key: Hashable, strategies: List[ReprintStrategy],
+                   prefetch: Iterable[Callable[[], Awaitable[Any]]]) -> Dict[str, Any]:
+        self.stats['runs'] += 1
+        token = PrintToken(key)
+        start_time = time.monotonic()
+
+        # Consultas previas: solo calientan cachés compartidas, su error lo reportará quien las use
+        for factory in prefetch:
+            asyncio.create_task(factory()).add_done_callback(
+                lambda task: task.cancelled() or task.exception()
+            )
+
+        pending = list(strategies)
+        running: Dict[asyncio.Task, ReprintStrategy] = {}
+        first_name = pending[0].name if pending else None
+        result: Dict[str, Any] = {'success': False, 'message': 'Sin estrategias de reimpresión'}
+
+        def start_next():
+            strategy = pending.pop(0)
+            running[asyncio.create_task(self._run_strategy(strategy, token))] = strategy
+
+        try:
+            if pending:
+                start_next()
+            while running:
+                can_hedge = self.hedge_delay > 0 and pending and len(running) < self.max_parallel
+                done, _ = await asyncio.wait(running, timeout=self.hedge_delay if can_hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.stats['hedged'] += 1
+                    logger.info(f"⏩ {', '.join(s.name for s in running.values())} sin respuesta en "
+                                f"{self.hedge_delay:g}s: se lanza {pending[0].name} en paralelo")
+                    start_next()
+                    continue
+
+                for task in done:
+                    strategy = running.pop(task)
+                    outcome = task.result()
+                    if outcome.get('skipped'):
+                        continue
+                    result = dict(outcome, strategy=strategy.name)
+                    if outcome.get('success') or outcome.get('uncertain'):
+                        # Resuelta por una estrategia posterior (respaldo o lanzada en paralelo)
+                        if outcome.get('success') and strategy.name != first_name:
+                            self.stats['fallback_wins'] += 1
+                        if outcome.get('uncertain'):
+                            self.stats['uncertain'] += 1
+                        logger.info(f"🏁 Reimpresión {key} resuelta por {strategy.name} "
+                                    f"en {time.monotonic() - start_time:.2f}s")
+                        return result
+                    logger.info(f"↪️ Estrategia {strategy.name} falló: "
+                                f"{outcome.get('message') or outcome.get('error')}")
+
+                if not running and pending:
+                    start_next()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        self.stats['failed'] += 1
+        return result
+
+    @staticmethod
+    async def _run_strategy(strategy: ReprintStrategy, token: PrintToken) -> Dict[str, Any]:
+        try:
+            return await strategy.run(token)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error en estrategia {strategy.name}: {str(e)}")
+            return {'success': False, 'message': str(e)}
+
+
+# Global reprint orchestrator
+reprint_orchestrator = ReprintOrchestrator(
+    hedge_delay=settings.print.hedge_delay,
+    max_parallel=settings.print.max_parallel_strategies
+)
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from src.config.settings import settings
+from src.database.connection import db_manager
+from src.utils.logger import logger
+
+
+@dataclass
+class StoreHealth:
+    store_code: str
+    reachable: bool
+    latency: float  # segundos de la última verificación
+    checked_at: float  # time.monotonic()
+    error: str = ''
+
+    def age(self) -> float:
+        return time.monotonic() - self.checked_at
+
+
+class StoreHealthMonitor:
+    """
+    Sondeo periódico en segundo plano de las tiendas usadas recientemente.
+    Mantiene un mapa de alcanzabilidad/latencia para responder la selección de tienda al instante.
+    """
+
+    def __init__(self, interval: float, max_age: float, concurrency: int, recent_window: float):
+        self.interval = interval
+        self.max_age = max_age
+        self.concurrency = max(1, concurrency)
+        self.recent_window = recent_window
+
+        self._health: Dict[str, StoreHealth] = {}
+        self._last_used: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'rounds': 0, 'probes': 0, 'cache_answers': 0, 'live_checks': 0}
+
+    def touch(self, store_code: str):
+        """Marca la tienda como usada: entra (o sigue) en el conjunto que se sondea"""
+        self._last_used[store_code] = time.monotonic()
+
+    def get(self, store_code: str) -> Optional[StoreHealth]:
+        """Última verificación si aún está vigente; None si no se conoce o está vencida"""
+        health = self._health.get(store_code)
+        if health is None or health.age() > self.max_age:
+            return None
+        self.stats['cache_answers'] += 1
+        return health
+
+    async def check(self, store_code: str) -> StoreHealth:
+        """Verificación en vivo (TCP + login, la conexión queda en el pool) y actualiza el mapa"""
+        start_time = time.monotonic()
+        try:
+            await db_manager.run_async(store_code, db_manager.connect_store, store_code)
+            health = StoreHealth(store_code, True, time.monotonic() - start_time, time.monotonic())
+        except Exception as e:
+            health = StoreHealth(store_code, False, time.monotonic() - start_time, time.monotonic(),
+                                 getattr(e, 'detail', '') or str(e))
+
+        previous = self._health.get(store_code)
+        if previous is not None and previous.reachable != health.reachable:
+            icon = '✅' if health.reachable else '📴'
+            logger.info(f"{icon} {store_code} pasó a {'alcanzable' if health.reachable else 'inalcanzable'}")
+
+        self._health[store_code] = health
+        return health
+
+    async def live_check(self, store_code: str) -> StoreHealth:
+        self.stats['live_checks'] += 1
+        return await self.check(store_code)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name='store-health')
+            logger.info(f"🩺 Monitor de tiendas iniciado (cada {self.interval:g}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> List[StoreHealth]:
+        return sorted(self._health.values(), key=lambda h: (h.reachable, -h.latency))
+
+    def recently_used(self) -> List[str]:
+        """Tiendas usadas recientemente, la más reciente primero"""
+        return sorted(self._last_used, key=self._last_used.get, reverse=True)
+
+    def _recent_stores(self) -> List[str]:
+        cutoff = time.monotonic() - self.recent_window
+        for store_code in [code for code, used in self._last_used.items() if used < cutoff]:
+            del self._last_used[store_code]
+            self._health.pop(store_code, None)
+        return list(self._last_used)
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(store_code: str):
+            async with semaphore:
+                self.stats['probes'] += 1
+                await self.check(store_code)
+
+        while True:
+            await asyncio.sleep(self.interval)
+            stores = self._recent_stores()
+            if not stores:
+                continue
+            try:
+                await asyncio.gather(*(probe(store_code) for store_code in stores))
+                self.stats['rounds'] += 1
+            except Exception as e:
+                logger.error(f"❌ Error en ronda del monitor de tiendas: {str(e)}")
+
+
+# Global store health monitor
+store_health = StoreHealthMonitor(
+    interval=settings.database.health_interval,
+    max_age=settings.database.health_max_age,
+    concurrency=settings.database.health_concurrency,
+    recent_window=settings.database.health_recent_window
+)
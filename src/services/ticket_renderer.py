@@ -0,0 +1,451 @@
+import base64
+import io
+import re
+from html.parser import HTMLParser
+from typing import Callable, List, Optional
+from urllib.parse import urljoin
+
+import requests
+from PIL import Image, ImageDraw, ImageFont
+
+from src.utils.logger import logger
+
+
+class TicketRenderError(Exception):
+    """La página no se puede dibujar sin navegador (se debe usar Selenium)"""
+
+
+# Etiquetas cuyo contenido no se dibuja
+_SKIP_TAGS = {'head', 'script', 'style', 'title', 'noscript', 'template'}
+# Contenido que solo un navegador puede pintar
+_UNSUPPORTED_TAGS = {'canvas', 'iframe', 'svg', 'object', 'embed', 'video'}
+_BLOCK_TAGS = {'p', 'div', 'center', 'table', 'tbody', 'thead', 'tfoot', 'ul', 'ol', 'li',
+               'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'form', 'section', 'body'}
+# Etiquetas sin cierre que no abren contexto
+_VOID_TAGS = {'meta', 'link', 'input', 'col', 'wbr', 'area', 'base', 'param', 'source'}
+_HEADING_SCALE = {'h1': 1.5, 'h2': 1.3, 'h3': 1.15}
+_ALIGN_RE = re.compile(r'text-align\s*:\s*(left|center|right)', re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+
+
+class _Span:
+    """Trozo de texto con su estilo"""
+    __slots__ = ('text', 'bold', 'scale')
+
+    def __init__(self, text: str, bold: bool, scale: float):
+        self.text = text
+        self.bold = bold
+        self.scale = scale
+
+
+class _Block:
+    """Elemento vertical del ticket: párrafo, fila de tabla, separador o imagen"""
+
+    def __init__(self, kind: str, align: str = 'left'):
+        self.kind = kind  # 'text' | 'row' | 'rule' | 'image'
+        self.align = align
+        self.spans: List[_Span] = []
+        self.cells: List['_Block'] = []
+        self.image: Optional[Image.Image] = None
+        # Celda de maquetación: su contenido fluye como bloques normales
+        self.promoted = False
+
+    def has_content(self) -> bool:
+        if self.kind == 'text':
+            return any(span.text.strip() for span in self.spans)
+        if self.kind == 'row':
+            return any(cell.has_content() for cell in self.cells)
+        return True
+
+
+class _TicketParser(HTMLParser):
+    """Convierte el HTML del ticket en una lista de bloques"""
+
+    def __init__(self, image_loader: Callable[[str], Image.Image]):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[_Block] = []
+        self._image_loader = image_loader
+        self._skip_depth = 0
+        self._bold_depth = 0
+        self._scale_stack: List[float] = [1.0]
+        self._align_stack: List[str] = ['left']
+        self._tag_stack: List[str] = []
+        self._pre_depth = 0
+        self._row: Optional[_Block] = None
+        self._cell: Optional[_Block] = None
+        self._current: Optional[_Block] = None
+        # Fila/celda externa mientras se recorre una tabla anidada
+        self._table_stack: List[tuple] = []
+
+    # -- estructura ---------------------------------------------------------
+
+    def _in_data_cell(self) -> bool:
+        return self._cell is not None and not self._cell.promoted
+
+    def _flush(self):
+        if self._current is not None and self._current.has_content():
+            self.blocks.append(self._current)
+        self._current = None
+
+    def _promote_cell(self):
+        """
+        Una celda con párrafos, separadores, imágenes o tablas dentro es de maquetación
+        (típico de las páginas PHP): lo acumulado se emite como bloque y el resto fluye normal.
+        """
+        if not self._in_data_cell():
+            return
+        cell = self._cell
+        if cell.has_content():
+            block = _Block('text', cell.align)
+            block.spans = cell.spans
+            self.blocks.append(block)
+        cell.spans = []
+        cell.promoted = True
+
+    def _start_block(self):
+        self._promote_cell()
+        self._flush()
+
+    def _target(self) -> _Block:
+        """Bloque de texto donde se agrega el contenido en curso"""
+        if self._in_data_cell():
+            return self._cell
+        if self._current is None:
+            self._current = _Block('text', self._align_stack[-1])
+        return self._current
+
+    def _append_text(self, text: str):
+        block = self._target()
+        block.spans.append(_Span(text, self._bold_depth > 0, self._scale_stack[-1]))
+
+    @staticmethod
+    def _align_from(attrs: dict, default: str) -> str:
+        align = (attrs.get('align') or '').lower()
+        if align in ('left', 'center', 'right'):
+            return align
+        match = _ALIGN_RE.search(attrs.get('style') or '')
+        return match.group(1).lower() if match else default
+
+    # -- eventos del parser -------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        if tag in _UNSUPPORTED_TAGS:
+            raise TicketRenderError(f"Etiqueta <{tag}> requiere navegador")
+
+        if tag == 'br':
+            self._target().spans.append(_Span('\n', False, 1.0))
+            return
+        if tag == 'hr':
+            self._start_block()
+            self.blocks.append(_Block('rule'))
+            return
+        if tag == 'img':
+            self._handle_image(attrs)
+            return
+        if tag in _VOID_TAGS:
+            return
+
+        self._tag_stack.append(tag)
+        default_align = 'center' if tag == 'center' else self._align_stack[-1]
+        self._align_stack.append(self._align_from(attrs, default_align))
+        self._scale_stack.append(_HEADING_SCALE.get(tag, self._scale_stack[-1]))
+        if tag in ('b', 'strong', 'th') or tag in _HEADING_SCALE:
+            self._bold_depth += 1
+        if tag == 'pre':
+            self._pre_depth += 1
+
+        if tag == 'table':
+            self._start_block()
+            self._table_stack.append((self._row, self._cell))
+            self._row = None
+            self._cell = None
+        elif tag == 'tr':
+            self._flush()
+            self._row = _Block('row')
+        elif tag in ('td', 'th'):
+            if self._row is None:
+                self._flush()
+                self._row = _Block('row')
+            self._cell = _Block('text', self._align_stack[-1])
+        elif tag in _BLOCK_TAGS:
+            self._start_block()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth or tag not in self._tag_stack:
+            return
+
+        # Cerrar también las etiquetas que quedaron abiertas dentro (HTML mal formado)
+        while self._tag_stack:
+            open_tag = self._tag_stack.pop()
+            self._close(open_tag)
+            if open_tag == tag:
+                break
+
+    def _close(self, tag: str):
+        self._align_stack.pop()
+        self._scale_stack.pop()
+        if tag in ('b', 'strong', 'th') or tag in _HEADING_SCALE:
+            self._bold_depth -= 1
+        if tag == 'pre':
+            self._pre_depth -= 1
+
+        if tag == 'table':
+            self._emit_row()
+            self._flush()
+            self._row, self._cell = self._table_stack.pop() if self._table_stack else (None, None)
+        elif tag in ('td', 'th'):
+            if self._in_data_cell():
+                if self._row is not None:
+                    self._row.cells.append(self._cell)
+            else:
+                self._flush()
+            self._cell = None
+        elif tag == 'tr':
+            self._emit_row()
+        elif tag in _BLOCK_TAGS and not self._in_data_cell():
+            self._flush()
+
+    def _emit_row(self):
+        if self._row is not None and self._row.has_content():
+            self.blocks.append(self._row)
+        self._row = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._pre_depth:
+            self._append_text(data)
+            return
+        text = _SPACES_RE.sub(' ', data)
+        if text.strip() or (text and self._target().spans):
+            self._append_text(text)
+
+    def close(self):
+        super().close()
+        self._emit_row()
+        self._flush()
+
+    def _handle_image(self, attrs: dict):
+        src = attrs.get('src')
+        if not src:
+            return
+        try:
+            image = self._image_loader(src)
+        except Exception as e:
+            raise TicketRenderError(f"No se pudo cargar imagen {src[:60]}: {e}")
+
+        self._start_block()
+        block = _Block('image', self._align_from(attrs, self._align_stack[-1]))
+        block.image = image
+        self.blocks.append(block)
+
+
+class TicketRenderer:
+    """Dibuja con Pillow los tickets térmicos de MaxPoint (factura, nota de crédito, comanda)"""
+
+    # Ancho imprimible en puntos (203 dpi) por ancho de papel en mm
+    PAPER_WIDTHS = {58: 384, 80: 576}
+    _FONT_CANDIDATES = {
+        False: ('DejaVuSansMono.ttf', 'consola.ttf', 'cour.ttf', 'LiberationMono-Regular.ttf'),
+        True: ('DejaVuSansMono-Bold.ttf', 'consolab.ttf', 'courbd.ttf', 'LiberationMono-Bold.ttf'),
+    }
+
+    def __init__(self, paper_mm: int = 80, font_size: int = 20, margin: int = 12, timeout: float = 5):
+        if paper_mm not in self.PAPER_WIDTHS:
+            raise ValueError(f"Ancho de papel no soportado: {paper_mm}mm")
+        self.width = self.PAPER_WIDTHS[paper_mm]
+        self.font_size = font_size
+        self.margin = margin
+        self.timeout = timeout
+        self._fonts = {}
+
+    def render_url(self, url: str) -> io.BytesIO:
+        """Descarga la página de impresión y la dibuja"""
+        response = requests.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        if 'charset' not in response.headers.get('Content-Type', '').lower():
+            response.encoding = response.apparent_encoding
+        return self.render(response.text, base_url=url)
+
+    def render(self, html: str, base_url: Optional[str] = None) -> io.BytesIO:
+        """Convierte el HTML del ticket en PNG; lanza TicketRenderError si necesita navegador"""
+        parser = _TicketParser(lambda src: self._load_image(src, base_url))
+        parser.feed(html)
+        parser.close()
+
+        if not any(block.kind in ('text', 'row') for block in parser.blocks):
+            # Sin texto visible: el contenido lo genera JavaScript
+            raise TicketRenderError("El HTML no tiene texto visible")
+
+        content_width = self.width - 2 * self.margin
+        laid_out = [(block, self._measure(block, content_width)) for block in parser.blocks]
+        height = 2 * self.margin + sum(h for _, h in laid_out)
+
+        image = Image.new('RGB', (self.width, height), color='white')
+        draw = ImageDraw.Draw(image)
+        y = self.margin
+        for block, block_height in laid_out:
+            self._draw(draw, image, block, self.margin, y, content_width)
+            y += block_height
+
+        buf = io.BytesIO()
+        image.save(buf, format='PNG', optimize=True)
+        buf.seek(0)
+        return buf
+
+    # -- fuentes y texto ----------------------------------------------------
+
+    def _font(self, bold: bool, scale: float):
+        size = int(round(self.font_size * scale))
+        key = (bold, size)
+        if key not in self._fonts:
+            font = None
+            for candidate in self._FONT_CANDIDATES[bold] + self._FONT_CANDIDATES[False]:
+                try:
+                    font = ImageFont.truetype(candidate, size)
+                    break
+                except OSError:
+                    continue
+            if font is None:
+                logger.warning("⚠️ Sin fuente monoespaciada TrueType, se usa la fuente por defecto")
+                font = ImageFont.load_default()
+            self._fonts[key] = font
+        return self._fonts[key]
+
+    def _line_height(self, scale: float) -> int:
+        return int(round(self.font_size * scale * 1.3))
+
+    def _wrap(self, block: _Block, max_width: int) -> List[List[_Span]]:
+        """Parte los spans del bloque en líneas que caben en max_width"""
+        lines: List[List[_Span]] = [[]]
+        line_width = 0.0
+
+        for span in block.spans:
+            font = self._font(span.bold, span.scale)
+            for part in re.split(r'(\n)', span.text):
+                if part == '\n':
+                    lines.append([])
+                    line_width = 0.0
+                    continue
+                for word in re.split(r'(\s+)', part):
+                    if not word:
+                        continue
+                    word_width = font.getlength(word)
+                    if line_width + word_width > max_width and lines[-1] and not word.isspace():
+                        lines.append([])
+                        line_width = 0.0
+                    if word.isspace() and not lines[-1]:
+                        continue
+                    # Palabras más largas que la línea se cortan por caracteres
+                    while word_width > max_width and len(word) > 1:
+                        cut = len(word)
+                        while cut > 1 and font.getlength(word[:cut]) > max_width:
+                            cut -= 1
+                        lines[-1].append(_Span(word[:cut], span.bold, span.scale))
+                        lines.append([])
+                        word = word[cut:]
+                        word_width = font.getlength(word)
+                    lines[-1].append(_Span(word, span.bold, span.scale))
+                    line_width += word_width
+
+        # Quitar espacios al final de cada línea y líneas vacías en los bordes
+        for line in lines:
+            while line and line[-1].text.isspace():
+                line.pop()
+        while lines and not lines[-1]:
+            lines.pop()
+        while lines and not lines[0]:
+            lines.pop(0)
+        return lines
+
+    def _lines_height(self, lines: List[List[_Span]]) -> int:
+        return sum(self._line_height(max((s.scale for s in line), default=1.0)) for line in lines)
+
+    def _column_widths(self, block: _Block, content_width: int) -> List[int]:
+        count = len(block.cells) or 1
+        return [content_width // count] * count
+
+    def _measure(self, block: _Block, content_width: int) -> int:
+        if block.kind == 'rule':
+            return self._line_height(1.0) // 2
+        if block.kind == 'image':
+            scale = min(1.0, content_width / block.image.width)
+            return int(block.image.height * scale) + 4
+        if block.kind == 'row':
+            widths = self._column_widths(block, content_width)
+            return max((self._lines_height(self._wrap(cell, w - 4)) for cell, w in zip(block.cells, widths)),
+                       default=0)
+        return self._lines_height(self._wrap(block, content_width))
+
+    # -- dibujo ---------------------------------------------------------------
+
+    def _draw(self, draw: ImageDraw.ImageDraw, image: Image.Image, block: _Block, x: int, y: int,
+              content_width: int):
+        if block.kind == 'rule':
+            mid = y + self._line_height(1.0) // 4
+            draw.line((x, mid, x + content_width, mid), fill='black', width=1)
+        elif block.kind == 'image':
+            self._draw_image(image, block, x, y, content_width)
+        elif block.kind == 'row':
+            cell_x = x
+            for cell, width in zip(block.cells, self._column_widths(block, content_width)):
+                self._draw_text(draw, cell, cell_x + 2, y, width - 4)
+                cell_x += width
+        else:
+            self._draw_text(draw, block, x, y, content_width)
+
+    def _draw_text(self, draw: ImageDraw.ImageDraw, block: _Block, x: int, y: int, max_width: int):
+        for line in self._wrap(block, max_width):
+            line_width = sum(self._font(s.bold, s.scale).getlength(s.text) for s in line)
+            if block.align == 'center':
+                cursor = x + (max_width - line_width) / 2
+            elif block.align == 'right':
+                cursor = x + max_width - line_width
+            else:
+                cursor = x
+            for span in line:
+                font = self._font(span.bold, span.scale)
+                draw.text((cursor, y), span.text, fill='black', font=font)
+                cursor += font.getlength(span.text)
+            y += self._line_height(max((s.scale for s in line), default=1.0))
+
+    @staticmethod
+    def _draw_image(image: Image.Image, block: _Block, x: int, y: int, content_width: int):
+        picture = block.image
+        if picture.width > content_width:
+            ratio = content_width / picture.width
+            picture = picture.resize((content_width, max(1, int(picture.height * ratio))))
+        if block.align == 'center':
+            x += (content_width - picture.width) // 2
+        elif block.align == 'right':
+            x += content_width - picture.width
+        if picture.mode in ('RGBA', 'LA', 'P'):
+            picture = picture.convert('RGBA')
+            image.paste(picture, (x, y + 2), picture)
+        else:
+            image.paste(picture.convert('RGB'), (x, y + 2))
+
+    def _load_image(self, src: str, base_url: Optional[str]) -> Image.Image:
+        """Carga imágenes embebidas (data:) o servidas por la misma página (logo, QR)"""
+        if src.startswith('data:'):
+            header, _, payload = src.partition(',')
+            data = base64.b64decode(payload) if ';base64' in header else payload.encode()
+        else:
+            url = urljoin(base_url or '', src)
+            if not url.startswith(('http://', 'https://')):
+                raise TicketRenderError(f"URL de imagen no soportada: {src[:60]}")
+            response = requests.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.content
+        picture = Image.open(io.BytesIO(data))
+        picture.load()
+        return picture
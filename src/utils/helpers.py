@@ -35,7 +35,7 @@ def truncate_text(text: str, max_length: int = 100) -> str:
         return text
     return text[:max_length-3] + "..."
 
-def build_server_name(store_code: str) -> str:
-    """Build server name from store code"""
-    store_number = ''.join(filter(str.isdigit, store_code))
-    return f"10.101.{store_number}.20"
\ No newline at end of file
+def normalize_document_key(document_id: str) -> str:
+    """Normaliza un cfac_id al formato guardado en Canal_MovimientoVarchar3 (sin espacios, en mayúsculas)"""
+    key = re.sub(r'\s+', '', str(document_id or ''))
+    return key.strip('\'"{}').upper()
@@ -0,0 +1,63 @@
+import bisect
+import threading
+from typing import Dict, Sequence
+
+
+class Histogram:
+    """Histograma acumulativo thread-safe con cubetas fijas"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # última cubeta: +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def percentile(self, p: float) -> float:
+        """Percentil aproximado: límite superior de la cubeta que lo contiene"""
+        with self._lock:
+            if not self._count:
+                return 0.0
+            target = p / 100 * self._count
+            running = 0
+            for i, count in enumerate(self._counts):
+                running += count
+                if running >= target:
+                    return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            labels = [f"<={b:g}" for b in self.buckets] + ['+Inf']
+            return {
+                'count': self._count,
+                'sum': self._sum,
+                'avg': self._sum / self._count if self._count else 0.0,
+                'buckets': dict(zip(labels, self._counts))
+            }
+
+
+class HistogramFamily:
+    """Un histograma por etiqueta (por ejemplo, por código de tienda)"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label: str, value: float):
+        histogram = self._histograms.get(label)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(label, Histogram(self._buckets))
+        histogram.observe(value)
+
+    def items(self):
+        with self._lock:
+            return list(self._histograms.items())
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+
+class TTLCache:
+    """
+    Caché LRU thread-safe con expiración por entrada.
+    Cada entrada puede llevar etiquetas para invalidar en bloque (por ejemplo, todo lo de un cfac_id).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_items: int):
+        self.max_items = max(1, max_items)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at, tags)
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'invalidated': 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is self._MISSING:
+                self.stats['misses'] += 1
+                return default
+            value, expires_at, _ = item
+            if time.monotonic() >= expires_at:
+                self._remove_locked(key)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float, tags: Iterable[Hashable] = ()):
+        if ttl <= 0:
+            return
+        tags = frozenset(tag for tag in tags if tag is not None)
+        with self._lock:
+            if key in self._data:
+                self._remove_locked(key)
+            self._data[key] = (value, time.monotonic() + ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_items:
+                oldest = next(iter(self._data))
+                self._remove_locked(oldest)
+                self.stats['evicted'] += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._remove_locked(key)
+            self.stats['invalidated'] += 1
+            return True
+
+    def invalidate_tag(self, tag: Hashable) -> List[Hashable]:
+        """Elimina todas las entradas con la etiqueta y retorna sus claves"""
+        with self._lock:
+            removed = list(self._tags.get(tag, ()))
+            for key in removed:
+                self._remove_locked(key)
+            self.stats['invalidated'] += len(removed)
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self.stats)
+            lookups = data['hits'] + data['misses']
+            data.update({
+                'size': len(self._data),
+                'max_items': self.max_items,
+                'hit_rate': data['hits'] / lookups if lookups else 0.0
+            })
+        return data
+
+    def _remove_locked(self, key: Hashable) -> Optional[Any]:
+        value, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return value
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Los módulos crean carpetas de logs y bases SQLite con rutas de Windows por defecto:
+# en las pruebas todo va a un directorio temporal (antes de importar src)
+_TMP = tempfile.mkdtemp(prefix='kfcbot-tests-')
+os.environ.setdefault('LOG_DIR', os.path.join(_TMP, 'logs'))
+os.environ.setdefault('REPRINTS_DIR', os.path.join(_TMP, 'reimpresiones'))
+os.environ.setdefault('PRINT_QUEUE_DB', os.path.join(_TMP, 'impresiones.db'))
+os.environ.setdefault('REPRINT_LEDGER_DB', os.path.join(_TMP, 'reimpresiones.db'))
+os.environ.setdefault('RENDER_CACHE_DIR', os.path.join(_TMP, 'cache'))
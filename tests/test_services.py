@@ -0,0 +1,341 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.database.circuit_breaker import CircuitBreaker
+from src.database.exceptions import StoreOfflineError, network_error
+from src.database.pool import PoolTimeoutError, StoreConnectionPool
+from src.services.print_queue import (DEAD, DONE, FAILED, PENDING, RUNNING, UNCERTAIN, PrintJobQueue,
+                                      PrintJobStore)
+from src.services.reprint_ledger import ReprintLedger, ReprintLedgerUnavailableError, SqliteReprintBackend
+from src.services.reprint_orchestrator import PrintToken, ReprintOrchestrator, ReprintStrategy
+from src.utils.singleflight import AsyncSingleFlight, SingleFlight
+
+
+# --- Cola de impresión (outbox SQLite) ---
+
+@pytest.fixture
+def job_store(tmp_path):
+    store = PrintJobStore(str(tmp_path / 'cola.db'))
+    yield store
+    store.close()
+
+
+def _enqueue(store, document_id, printer_key='K001:caja', kind='reprint', max_attempts=3):
+    return store.enqueue(kind, 'K001', 'factura', document_id, printer_key, max_attempts)
+
+
+def test_enqueue_deduplicates_active_jobs(job_store):
+    job, created = _enqueue(job_store, 'F1')
+    again, created_again = _enqueue(job_store, 'F1')
+    assert created and not created_again
+    assert again.id == job.id
+
+    # Terminado, el mismo documento puede volver a encolarse
+    job_store.finish(job.id, DONE, {'success': True})
+    other, created_other = _enqueue(job_store, 'F1')
+    assert created_other and other.id != job.id
+
+
+def test_claim_skips_busy_printers(job_store):
+    caja, _ = _enqueue(job_store, 'F1', 'K001:caja')
+    cocina, _ = _enqueue(job_store, 'F2', 'K001:cocina')
+
+    claimed = job_store.claim({'K001:caja'})
+    assert claimed.id == cocina.id
+    assert claimed.status == RUNNING and claimed.attempts == 1
+    # Con ambas impresoras ocupadas no se toma nada
+    assert job_store.claim({'K001:caja', 'K001:cocina'}) is None
+    assert job_store.claim(set()).id == caja.id
+
+
+def test_recover_marks_running_jobs_uncertain(tmp_path):
+    path = str(tmp_path / 'cola.db')
+    store = PrintJobStore(path)
+    running, _ = _enqueue(store, 'F1')
+    pending, _ = _enqueue(store, 'F2')
+    store.claim({'K001:cocina'})
+    store.close()  # el proceso se detiene con el trabajo en curso
+
+    restarted = PrintJobStore(path)
+    recovered = restarted.recover()
+    assert [job.id for job in recovered] == [running.id]
+    assert restarted.get(running.id).status == UNCERTAIN
+    assert restarted.get(pending.id).status == PENDING
+    restarted.close()
+
+
+def _run_queue_job(queue, result):
+    async def handler(job):
+        return result
+
+    async def run():
+        queue.register('reprint', handler)
+        job = await queue._call(queue.store.claim, set())
+        await queue._process(job)
+        return await queue.get(job.id)
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    queue = PrintJobQueue(str(tmp_path / 'cola.db'), workers=1, max_attempts=2, retry_base_delay=0,
+                          retry_max_delay=0, poll_interval=0.05, retention_days=0)
+    yield queue
+    queue.store.close()
+
+
+def test_failed_job_is_retried_then_dead_lettered(job_queue):
+    _enqueue(job_queue.store, 'F1', max_attempts=2)
+
+    job = _run_queue_job(job_queue, {'success': False, 'message': 'API caída'})
+    assert job.status == PENDING and job.attempts == 1 and job.error == 'API caída'
+
+    job = _run_queue_job(job_queue, {'success': False, 'message': 'API caída'})
+    assert job.status == DEAD and job.attempts == 2
+    assert job_queue.stats['retries'] == 1 and job_queue.stats['dead'] == 1
+
+
+@pytest.mark.parametrize('result, status', [
+    ({'success': True}, DONE),
+    ({'success': False, 'uncertain': True, 'message': 'timeout'}, UNCERTAIN),
+    ({'success': False, 'retryable': False, 'message': 'no existe'}, FAILED),
+])
+def test_job_outcome_is_final(job_queue, result, status):
+    _enqueue(job_queue.store, 'F1')
+    assert _run_queue_job(job_queue, result).status == status
+
+
+# --- Registro de reimpresiones ---
+
+def test_ledger_rejects_reservation_at_limit(tmp_path):
+    backend = SqliteReprintBackend(str(tmp_path / 'ledger.db'), ttl=3600)
+    assert backend.try_reserve('factura', 'F1', 2) == (True, 1)
+    assert backend.try_reserve('factura', 'F1', 2) == (True, 2)
+    assert backend.try_reserve('factura', 'F1', 2) == (False, 2)
+
+    # Una reserva devuelta (no imprimió) deja pasar otra
+    backend.release('factura', 'F1')
+    assert backend.try_reserve('factura', 'F1', 2) == (True, 2)
+    backend.close()
+
+
+def test_ledger_counter_expires_after_ttl(tmp_path):
+    backend = SqliteReprintBackend(str(tmp_path / 'ledger.db'), ttl=0.05)
+    assert backend.try_reserve('factura', 'F1', 1) == (True, 1)
+    assert backend.try_reserve('factura', 'F1', 1) == (False, 1)
+    time.sleep(0.1)
+    assert backend.try_reserve('factura', 'F1', 1) == (True, 1)
+    backend.close()
+
+
+def test_ledger_fails_closed_without_redis(tmp_path, monkeypatch):
+    monkeypatch.setitem(__import__('sys').modules, 'redis', None)
+    ledger = ReprintLedger('redis', str(tmp_path / 'ledger.db'), 'redis://localhost:6379/0',
+                           ttl_days=1, compact_interval=3600, reconnect_interval=60)
+    with pytest.raises(ReprintLedgerUnavailableError):
+        ledger.try_reserve_sync('factura', 'F1', 2)
+    # Sigue rechazando (no cae a un contador local)
+    with pytest.raises(ReprintLedgerUnavailableError):
+        ledger.try_reserve_sync('factura', 'F1', 2)
+
+
+# --- Circuito por tienda ---
+
+def test_breaker_open_half_open_closed():
+    probe_started = threading.Event()
+    probe_release = threading.Event()
+
+    def probe():
+        probe_started.set()
+        probe_release.wait(2)
+
+    breaker = CircuitBreaker('K001', probe, failure_threshold=2, reset_timeout=0.05, max_reset_timeout=1)
+    breaker.record_failure(network_error('K001', 'sin ruta'))
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure(network_error('K001', 'sin ruta'))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(StoreOfflineError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    with pytest.raises(StoreOfflineError):
+        breaker.before_call()  # lanza el único sondeo
+    assert probe_started.wait(1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    probe_release.set()
+    for _ in range(100):
+        if breaker.state == CircuitBreaker.CLOSED:
+            break
+        time.sleep(0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()  # vuelve a dejar pasar llamadas
+
+
+def test_breaker_reopens_when_probe_fails():
+    def probe():
+        raise OSError('sigue caída')
+
+    breaker = CircuitBreaker('K001', probe, failure_threshold=1, reset_timeout=0.02, max_reset_timeout=1)
+    breaker.record_failure(network_error('K001', 'sin ruta'))
+    time.sleep(0.03)
+    with pytest.raises(StoreOfflineError):
+        breaker.before_call()
+    for _ in range(100):
+        if breaker.state == CircuitBreaker.OPEN:
+            break
+        time.sleep(0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()['trips'] == 2
+
+
+# --- Pool de conexiones ---
+
+class _FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_and_bounds_connections():
+    created = []
+
+    def factory():
+        created.append(_FakeConnection())
+        return created[-1]
+
+    pool = StoreConnectionPool('K001', factory, max_size=1, idle_timeout=60, wait_timeout=0.05,
+                               health_check_after=60)
+    entry = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    pool.release(entry)
+    again = pool.acquire()
+    assert again.connection is entry.connection and again.reused
+    assert len(created) == 1
+
+    # Una conexión dudosa se descarta y la siguiente es nueva
+    pool.release(again, discard=True)
+    assert created[0].closed
+    assert pool.acquire().connection is created[1]
+    assert pool.snapshot()['discarded'] == 1
+
+
+# --- Coalescencia de llamadas ---
+
+def test_async_single_flight_shares_one_execution():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return ['fila']
+
+    async def run():
+        flights = AsyncSingleFlight()
+        results = await asyncio.gather(*[flights.do(('K001', 'q', (1,)), fetch) for _ in range(5)])
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [['fila']] * 5
+    assert flights.stats == {'executed': 1, 'shared': 4}
+
+
+def test_single_flight_propagates_error_to_waiters():
+    flights = SingleFlight()
+    gate = threading.Event()
+    errors = []
+
+    def fail():
+        gate.wait(1)
+        raise ValueError('falló')
+
+    def call():
+        try:
+            flights.do('k', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert flights.stats['executed'] == 1
+
+
+# --- Token de impresión y cadena de reimpresión ---
+
+@pytest.mark.parametrize('result, consumed', [
+    ({'success': True}, True),
+    ({'success': False, 'uncertain': True}, True),
+    ({'success': False, 'message': 'no se pudo conectar'}, False),
+])
+def test_print_token_consumed_only_on_success_or_uncertain(result, consumed):
+    async def run():
+        token = PrintToken('F1')
+
+        async def send():
+            return result
+
+        await token.print_once('api', send)
+        second = await token.print_once('sp', send)
+        return token, second
+
+    token, second = asyncio.run(run())
+    assert token.printed is consumed
+    assert second.get('skipped', False) is consumed
+
+
+def test_orchestrator_falls_back_after_safe_failure():
+    sent = []
+
+    def strategy(name, result):
+        async def run(token):
+            async def send():
+                sent.append(name)
+                return result
+            return await token.print_once(name, send)
+        return ReprintStrategy(name, run)
+
+    orchestrator = ReprintOrchestrator(hedge_delay=0, max_parallel=1)
+    result = asyncio.run(orchestrator.run('F1', [
+        strategy('api', {'success': False, 'message': 'API caída'}),
+        strategy('sp', {'success': True}),
+        strategy('usp', {'success': True}),
+    ]))
+    assert result['success'] and result['strategy'] == 'sp'
+    assert sent == ['api', 'sp']
+    assert orchestrator.stats['fallback_wins'] == 1
+
+
+def test_orchestrator_stops_on_uncertain_result():
+    sent = []
+
+    def strategy(name, result):
+        async def run(token):
+            async def send():
+                sent.append(name)
+                return result
+            return await token.print_once(name, send)
+        return ReprintStrategy(name, run)
+
+    orchestrator = ReprintOrchestrator(hedge_delay=0, max_parallel=1)
+    result = asyncio.run(orchestrator.run('F1', [
+        strategy('api', {'success': False, 'uncertain': True}),
+        strategy('sp', {'success': True}),
+    ]))
+    assert result.get('uncertain') and result['strategy'] == 'api'
+    assert sent == ['api']